@@ -33,14 +33,120 @@ class Settings(BaseSettings):
     # Server settings
     WEB_CONCURRENCY: int = 1  # 默认并发数
     
+    # Script annotation settings
+    SCRIPT_ANNOTATION_MODE: str = "diff"  # diff: 只让大模型返回bg/bgm插入点; rewrite: 旧的整段重写模式
+    
+    # Speculative generation settings
+    SPECULATIVE_NEXT_CHAPTER: bool = False  # 游戏完成后是否在后台预生成下一章
+    SPECULATIVE_INCLUDE_MEDIA: bool = False  # 预生成是否包括场景图与语音
+    SPECULATIVE_MAX_PER_USER: int = 1  # 每个用户同时进行的预生成数量上限
+    
+    # Content classifier settings
+    CONTENT_CLASSIFIER_ENABLED: bool = True  # 创建游戏时先用本地分类器判断内容类型，不确定时再调用大模型
+    CONTENT_CLASSIFIER_CONFIDENCE: float = 0.9  # 本地分类概率达到该值才直接采用
+    CONTENT_CLASSIFIER_MAX_CHARS: int = 5000  # 本地分类检查的最大字符数
+    
+    # Duplicate submission settings
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # Idempotency-Key 记录的保留时间（秒）
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0  # 重复请求等待首个请求完成的最长时间（秒），超时返回 409
+    GENERATION_LOCK_TTL_SECONDS: float = 120.0  # 游戏生成锁的过期时间（秒），持有期间每 1/3 过期时间续期一次
+    GENERATION_LOCK_PREEMPT_CHECK_SECONDS: float = 2.0  # 可抢占的锁（下一章预生成）续期并检查是否被请求抢占的间隔（秒）
+    GENERATION_LOCK_PREEMPT_WAIT_SECONDS: float = 15.0  # 抢占预生成的锁时等待其退出的最长时间（秒），超时后锁过期
+    GAME_REUSE_ENABLED: bool = True  # 创建游戏时复用相同小说文本与设置的已完成游戏，跳过全部生成步骤
+    
+    # Progress streaming settings
+    PROGRESS_STREAM_QUEUE_SIZE: int = 100  # 每个进度订阅缓存的最大事件数，客户端消费过慢时丢弃最旧的
+    PROGRESS_STREAM_HEARTBEAT_SECONDS: float = 15.0  # 没有事件时发送 SSE 心跳的间隔（秒），防止代理断开空闲连接
+    PROGRESS_CHANGE_STREAM_ENABLED: bool = False  # 用 MongoDB change stream 推送所有 worker 写入的进度（需副本集）
+    PROGRESS_CHANGE_STREAM_RETRY_SECONDS: float = 60.0  # change stream 不可用时重新尝试的间隔（秒）
+    
+    # Generation timeline settings
+    TIMELINE_ENABLED: bool = True  # 记录每个游戏各工作流、章节、媒体条目、大模型调用与上传的耗时
+    TIMELINE_TTL_DAYS: int = 30  # 时间线记录的保留天数
+    TIMELINE_FLUSH_SIZE: int = 200  # 单个游戏缓存的时间段达到该数量时提前写入数据库
+    TIMELINE_FLUSH_SECONDS: float = 30.0  # 游戏缓存中最早的时间段超过该时间未写入时提前写入数据库（秒）
+    TIMELINE_BREAKDOWN_MAX_DAYS: float = 7.0  # 跨游戏耗时汇总最多统计的天数
+    
+    # Metrics settings
+    METRICS_ENABLED: bool = False  # 是否提供 Prometheus 格式的 /metrics 接口
+    METRICS_ALLOWED_HOSTS: str = "127.0.0.1,::1"  # 允许访问 /metrics 的地址或网段（逗号分隔），* 表示不限制
+    METRICS_MULTIPROCESS_DIR: str = ""  # 多个 uvicorn worker 共享指标的目录，为空时只导出处理该请求的进程
+    METRICS_FLUSH_SECONDS: float = 10.0  # 每个 worker 写入指标文件的间隔（秒）
+    METRICS_STALE_SECONDS: float = 60.0  # worker 的指标文件超过该时间未更新时不再导出其仪表值（秒）
+    
+    # Provider scheduling settings
+    SCHEDULER_ENABLED: bool = True  # 服务商调用是否按优先级与用户公平排队
+    SCHEDULER_LLM_CONCURRENCY: int = 16  # 各服务商同时进行的调用数量上限
+    SCHEDULER_IMAGE_CONCURRENCY: int = 4
+    SCHEDULER_TTS_CONCURRENCY: int = 8
+    SCHEDULER_MUSIC_CONCURRENCY: int = 4
+    SCHEDULER_STARVATION_SECONDS: float = 600.0  # 低优先级请求等待超过该时间后提前调度，避免饿死
+    
+    # Admission control settings
+    ADMISSION_MAX_IN_FLIGHT: int = 8  # 同时进行的生成流水线上限，超出后排队
+    ADMISSION_MAX_QUEUED: int = 32  # 等待队列上限，超出后拒绝新游戏
+    ADMISSION_MAX_PROVIDER_QUEUE: int = 200  # 服务商调度器排队请求超过该值时新游戏排队
+    ADMISSION_DEFAULT_FIRST_PLAYABLE_SECONDS: float = 180.0  # 尚无统计时的首章可玩耗时估计（秒）
+    ADMISSION_DEFAULT_DURATION_SECONDS: float = 600.0  # 尚无统计时的整局生成耗时估计（秒）
+    ADMISSION_RETRY_SECONDS: float = 5.0  # 等待队列不为空时重新检查能否出队的间隔（秒），服务商排队回落后无需等流水线结束
+    ADMISSION_RECOVERY_INTERVAL_SECONDS: float = 60.0  # 检查无人处理的排队与暂停游戏（如进程重启后）的间隔（秒），0 表示不检查
+    GENERATION_DEADLINE_SECONDS: float = 0.0  # 单次生成流水线的最长时间（秒），超出后取消；0 表示不限
+    
+    # Media retry settings
+    MEDIA_RETRY_MAX_ATTEMPTS: int = 3  # 单个场景图、语音或BGM的最多尝试次数
+    MEDIA_RETRY_BASE_DELAY: float = 2.0  # 首次重试前的最长等待（秒），之后指数增长并加随机抖动
+    MEDIA_RETRY_MAX_DELAY: float = 60.0  # 单次重试等待上限（秒）
+    MEDIA_FAILURE_TOLERANCE: float = 0.0  # 阶段内失败条目占比不超过该值时仍视为成功，失败条目留在死信列表
+    
+    # Circuit breaker settings
+    CIRCUIT_WINDOW_SECONDS: float = 60.0  # 统计错误率与慢调用率的滚动窗口（秒）
+    CIRCUIT_MIN_CALLS: int = 10  # 窗口内调用数达到该值才判断是否熔断
+    CIRCUIT_ERROR_RATE_THRESHOLD: float = 0.5  # 错误率达到该值时熔断
+    CIRCUIT_SLOW_CALL_RATE_THRESHOLD: float = 0.8  # 慢调用率达到该值时熔断
+    CIRCUIT_IMAGE_SLOW_CALL_SECONDS: float = 180.0  # 各服务商的慢调用耗时（秒）
+    CIRCUIT_TTS_SLOW_CALL_SECONDS: float = 20.0
+    CIRCUIT_MUSIC_SLOW_CALL_SECONDS: float = 480.0
+    CIRCUIT_OPEN_SECONDS: float = 30.0  # 熔断后快速失败的时间（秒），之后半开探测
+    CIRCUIT_HALF_OPEN_PROBES: int = 2  # 半开时放行的探测调用数，全部成功后关闭
+    
+    # Adaptive rate limit settings
+    RATE_LIMIT_IMAGE_RATE: float = 0.5  # 各服务商的初始请求速率（次/秒），音乐服务商取 MUSIC_API_RATE_LIMIT_*
+    RATE_LIMIT_IMAGE_MAX_RATE: float = 2.0  # 各服务商的速率上限（次/秒）
+    RATE_LIMIT_TTS_RATE: float = 5.0
+    RATE_LIMIT_TTS_MAX_RATE: float = 20.0
+    RATE_LIMIT_MUSIC_MAX_RATE: float = 5.0
+    RATE_LIMIT_MIN_RATE: float = 0.05  # 限流降速的下限（次/秒）
+    RATE_LIMIT_ADDITIVE_INCREASE: float = 0.05  # 持续成功时每秒增加的速率（次/秒）
+    RATE_LIMIT_MULTIPLICATIVE_DECREASE: float = 0.5  # 收到 429/503 时速率乘以该值
+    RATE_LIMIT_BURST_SECONDS: float = 2.0  # 令牌桶容量（按当前速率计的秒数）
+    RATE_LIMIT_MAX_RETRY_AFTER: float = 300.0  # 遵守 Retry-After 的最长暂停（秒）
+    RATE_LIMIT_SHARED_ENABLED: bool = True  # 多个 worker 进程通过 MongoDB 共享请求配额
+    RATE_LIMIT_SHARED_WINDOW_SECONDS: float = 10.0  # 共享配额的时间窗口（秒）
+    RATE_LIMIT_SHARED_PREFETCH_SECONDS: float = 1.0  # 每次从数据库批量领取的配额（按当前速率计的秒数）
+    
+    # Hedged request settings
+    TTS_HEDGING_ENABLED: bool = False  # TTS 调用超过阈值未返回时发出对冲请求
+    HEDGE_PERCENTILE: float = 0.95  # 对冲阈值取近期调用耗时的该分位数，与对冲预算相当，避免预算被略慢的请求耗尽
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5  # 对冲阈值下限（秒）
+    HEDGE_MIN_SAMPLES: int = 20  # 样本数达到该值才开始对冲
+    HEDGE_SAMPLE_SIZE: int = 200  # 保留的近期耗时样本数
+    HEDGE_BUDGET_RATIO: float = 0.05  # 对冲请求占总请求的上限比例
+    
     # TTS API settings
+    TTS_API_URL: str = "https://gsv.ai-lab.top/infer_single"  # 可指向本地故障注入服务测试熔断
     TTS_ACCESS_TOKEN: str = ""
+    DIALOGUE_TTS_MODE: str = "eager"  # eager: 生成阶段合成全部对话; lazy: 游玩时按需合成
+    DIALOGUE_TTS_PREFETCH_LINES: int = 3  # 按需合成时预取当前分支后续对话的数量
+    LAZY_TTS_USER_LINES_PER_MINUTE: int = 30  # 每个用户每分钟最多按需合成的对话数（包括预取）
     
     # Music API settings
     MUSIC_API_URL: str
     MUSIC_API_TOKEN: str
-    MUSIC_API_RATE_LIMIT_MAX_REQUESTS: int
+    MUSIC_API_RATE_LIMIT_MAX_REQUESTS: int  # 初始速率：时间窗口内的请求数，之后自适应调整
     MUSIC_API_RATE_LIMIT_WINDOW: int
+    MUSIC_LIBRARY_ENABLED: bool = True  # 是否从曲库复用相似提示词的曲目
+    MUSIC_LIBRARY_SIMILARITY_THRESHOLD: float = 0.6  # TF-IDF 余弦相似度达到该值才复用
+    MUSIC_LIBRARY_REFRESH_SECONDS: int = 300  # 本地索引从数据库增量刷新的间隔（秒）
     
     # Image Generation API
     IMAGE_API_URL: str
@@ -48,6 +154,10 @@ class Settings(BaseSettings):
     IMAGE_API_PRIVATE_KEY: str
     IMAGE_DEFAULT_TIMEOUT: float = 300.0  # 默认的超时时间（秒）
     IMAGE_DEFAULT_POLL_INTERVAL: float = 5.0  # 默认的轮询间隔（秒）
+    IMAGE_CACHE_SCOPE: str = "game"  # off: 不复用; game: 同一游戏内跨章节复用; global: 跨游戏复用
+    CHARACTER_IMAGE_CACHE_SCOPE: str = "game"  # 角色立绘的复用范围，取值同 IMAGE_CACHE_SCOPE
+    IMAGE_MAX_BATCH_COUNT: int = 4  # 单个文生图任务最多生成的图片数（INPUT_INITIALIZE.count）
+    IMAGE_CACHE_MAX_ENTRIES: int = 10000  # 缓存索引最大条数，超出后按最近使用时间淘汰
     
     # Aliyun OSS Configuration
     OSS_ACCESS_KEY_ID: str
@@ -10,6 +10,13 @@ from models.credits_history import DBCreditsHistory
 from config import get_settings
 from core.database import db_lifespan
 from repositories.credits_repository import CreditsRepository
+from repositories.image_cache_repository import ImageCacheRepository
+from repositories.music_library_repository import MusicLibraryRepository
+from repositories.rate_limit_repository import RateLimitRepository
+from repositories.idempotency_repository import IdempotencyRepository
+from repositories.generation_lock_repository import GenerationLockRepository
+from repositories.game_repository import GameRepository
+from repositories.timeline_repository import TimelineRepository
 from functools import lru_cache
 
 settings = get_settings()
@@ -61,11 +68,40 @@ class Container(containers.DeclarativeContainer):
         db=database
     )
     
+    image_cache_collection = providers.Singleton(
+        lambda db: db.get_collection("image_cache"),
+        db=database
+    )
+    
+    music_library_collection = providers.Singleton(
+        lambda db: db.get_collection("music_library"),
+        db=database
+    )
+    
+    rate_limits_collection = providers.Singleton(
+        lambda db: db.get_collection("rate_limits"),
+        db=database
+    )
+    
+    idempotency_keys_collection = providers.Singleton(
+        lambda db: db.get_collection("idempotency_keys"),
+        db=database
+    )
+    
+    generation_locks_collection = providers.Singleton(
+        lambda db: db.get_collection("generation_locks"),
+        db=database
+    )
+
+    game_timelines_collection = providers.Singleton(
+        lambda db: db.get_collection("game_timelines"),
+        db=database
+    )
+    
     # Repositories
     game_repository = providers.Singleton(
-        MongoRepository[DBGame],
-        collection=games_collection,
-        model_class=DBGame
+        GameRepository,
+        collection=games_collection
     )
 
     runtime_game_repository = providers.Singleton(
@@ -92,6 +128,36 @@ class Container(containers.DeclarativeContainer):
         model_class=DBCreditsHistory
     )
 
+    image_cache_repository = providers.Singleton(
+        ImageCacheRepository,
+        collection=image_cache_collection
+    )
+
+    music_library_repository = providers.Singleton(
+        MusicLibraryRepository,
+        collection=music_library_collection
+    )
+
+    rate_limit_repository = providers.Singleton(
+        RateLimitRepository,
+        collection=rate_limits_collection
+    )
+
+    idempotency_repository = providers.Singleton(
+        IdempotencyRepository,
+        collection=idempotency_keys_collection
+    )
+
+    generation_lock_repository = providers.Singleton(
+        GenerationLockRepository,
+        collection=generation_locks_collection
+    )
+
+    timeline_repository = providers.Singleton(
+        TimelineRepository,
+        collection=game_timelines_collection
+    )
+
 # 创建全局容器实例
 container = Container()
 
@@ -100,7 +166,7 @@ def get_container() -> Container:
     return container
 
 # 获取仓库的依赖函数
-def get_game_repository() -> BaseRepository[DBGame]:
+def get_game_repository() -> GameRepository:
     return container.game_repository()
 
 def get_runtime_game_repository() -> BaseRepository[DBRuntimeGame]:
@@ -115,6 +181,24 @@ def get_credits_repository() -> CreditsRepository:
 def get_credits_history_repository() -> BaseRepository[DBCreditsHistory]:
     return container.credits_history_repository()
 
+def get_image_cache_repository() -> ImageCacheRepository:
+    return container.image_cache_repository()
+
+def get_music_library_repository() -> MusicLibraryRepository:
+    return container.music_library_repository()
+
+def get_rate_limit_repository() -> RateLimitRepository:
+    return container.rate_limit_repository()
+
+def get_idempotency_repository() -> IdempotencyRepository:
+    return container.idempotency_repository()
+
+def get_generation_lock_repository() -> GenerationLockRepository:
+    return container.generation_lock_repository()
+
+def get_timeline_repository() -> TimelineRepository:
+    return container.timeline_repository()
+
 
 # 获取数据库生命周期管理器
 def get_database_lifespan():
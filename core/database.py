@@ -1,11 +1,64 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from contextlib import asynccontextmanager
 import logging
 from config import get_settings
+from utils.metrics import MONGODB_COMMAND_DURATION, MONGODB_POOL_CONNECTIONS
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """记录 MongoDB 命令耗时（在驱动的线程中回调）"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGODB_COMMAND_DURATION.observe(event.duration_micros / 1e6, event.command_name, "success")
+
+    def failed(self, event):
+        MONGODB_COMMAND_DURATION.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """记录 MongoDB 连接池中已建立与已借出的连接数"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGODB_POOL_CONNECTIONS.inc("open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGODB_POOL_CONNECTIONS.dec("open")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        MONGODB_POOL_CONNECTIONS.inc("checked_out")
+
+    def connection_checked_in(self, event):
+        MONGODB_POOL_CONNECTIONS.dec("checked_out")
+
+
 class DatabaseLifespan:
     """数据库生命周期管理器"""
     
@@ -36,7 +89,8 @@ class DatabaseLifespan:
                     mongodb_url,
                     maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
                     minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
-                    serverSelectionTimeoutMS=5000  
+                    serverSelectionTimeoutMS=5000,
+                    event_listeners=[CommandMetricsListener(), PoolMetricsListener()]
                 )
                 self._db = self._client[settings.MONGODB_DB_NAME]
                 
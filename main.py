@@ -1,4 +1,5 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import logging
@@ -7,9 +8,13 @@ from routers.games import games_router
 from routers.user import user_router
 from routers.admin import admin_router
 from config import get_settings
-from core.container import container, get_database_lifespan
+from core.container import container, get_database_lifespan, get_game_repository, get_runtime_game_repository
+from workflows.generation_recovery import GenerationRecovery
+from utils.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, MetricsRegistry, client_allowed
+from contextlib import asynccontextmanager
 import datetime
 import os
+import time
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -28,11 +33,22 @@ container.config.from_dict({
 # 获取数据库生命周期管理器
 db_lifespan = get_database_lifespan()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """连接数据库，并重新提交进程重启前排队或暂停的游戏"""
+    async with db_lifespan.lifespan(app):
+        recovery = GenerationRecovery(get_game_repository(), get_runtime_game_repository())
+        recovery.start()
+        try:
+            yield
+        finally:
+            await recovery.stop()
+
 app = FastAPI(
     title="Gala API", 
     description="FastAPI project", 
     version="1.0.0",
-    lifespan=db_lifespan.lifespan  # 使用新的生命周期管理器
+    lifespan=lifespan  # 使用新的生命周期管理器
 )
 
 # 配置 CORS
@@ -52,6 +68,27 @@ app.add_middleware(
     https_only=True
 )
 
+# 记录接口耗时，路由按模板路径分组（如 /api/games/{game_id}）
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    MetricsRegistry().ensure_flusher()
+    started = time.monotonic()
+    status_code = 500
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.monotonic() - started,
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status_code)
+        )
+
 # 注册路由
 app.include_router(auth_router)
 app.include_router(games_router)
@@ -95,6 +132,17 @@ async def health_check():
             detail=f"Service unavailable: {str(e)}"
         )
 
+# Prometheus 指标端点
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # 未开启或请求方不在 METRICS_ALLOWED_HOSTS 中时按不存在处理
+    if not settings.METRICS_ENABLED or not client_allowed(request.client.host if request.client else None):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(
+        await MetricsRegistry().render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get("/")
 async def root():
     """测试端点"""
@@ -5,7 +5,6 @@ from models.types import PyObjectId
 from models.game import DBGame, Character, CharacterResource
 from schemas.script_commands import (
     CommandType,
-    BaseCommand,
     Command
 )
 import json
@@ -38,6 +37,7 @@ class DBRuntimeChapter(BaseModel):
     title: str = Field(..., min_length=1, max_length=100, description="章节标题")
     branches: List[DBRuntimeBranch] = Field(default_factory=list, description="游戏分支列表")
     characters: List[DBRuntimeCharacterImage] = Field(default_factory=list, description="章节涉及的角色立绘")
+    is_playable: bool = Field(default=True, description="是否可游玩，为False时章节仍在生成中，不含脚本内容")
 
 class DBRuntimeUserInfo(BaseModel):
     """用户信息"""
@@ -250,11 +250,11 @@ class DBRuntimeGame(BaseModel):
             else:
                 # 如果之前有选项，先添加选项命令
                 if choices:
-                    result.append(cls._convert_command(BaseCommand(
+                    result.append(DBGameCommand(
                         type=CommandType.CHOICE,
-                        text=json.dumps(choices, ensure_ascii=False),
+                        content=json.dumps(choices, ensure_ascii=False),
                         name=None
-                    ), game, protagonist_name))
+                    ))
                     choices = []
                 # 添加当前命令
                 result.append(cls._convert_command(cmd, game, protagonist_name))
@@ -317,6 +317,16 @@ class DBRuntimeGame(BaseModel):
                 None
             )
             
+            # 仍在生成中的章节只发布占位信息
+            if not chapter.is_playable:
+                runtime_chapters.append(DBRuntimeChapter(
+                    id=str(chapter.id),
+                    index=chapter.index,
+                    title=chapter.title or f"第{chapter.index + 1}章",
+                    is_playable=False
+                ))
+                continue
+
             # 构建分支列表
             runtime_branches = []
             for branch in chapter.branches:
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from enum import Enum
 from bson import ObjectId
 from models.types import PyObjectId
@@ -33,6 +33,16 @@ class ChapterGenerationStatus(str, Enum):
     BACKGROUND_GENERATED = "background_generated"  # 已生成背景圖
     BGM_GENERATED = "bgm_generated"  # 已生成背景音樂（生成完畢）
 
+class ScriptGraphReport(BaseModel):
+    """章节分支图分析报告"""
+    unreachable_branches: List[str] = Field(default_factory=list, description="从main不可达而被裁剪的分支")
+    dangling_targets: List[str] = Field(default_factory=list, description="指向不存在分支的跳转（分支->目标）")
+    cycles: List[List[str]] = Field(default_factory=list, description="分支环")
+    trapped_branches: List[str] = Field(default_factory=list, description="无法到达end的可达分支")
+    skipped_scene_images: int = Field(default=0, ge=0, description="因裁剪跳过的场景图数量")
+    skipped_dialogue_lines: int = Field(default=0, ge=0, description="因裁剪跳过的对话语音数量")
+    skipped_bgm: int = Field(default=0, ge=0, description="因裁剪跳过的背景音乐数量")
+
 class GameChapter(BaseModel):
     """游戏章节模型"""
     id: PyObjectId = Field(default_factory=PyObjectId, description="章节ID")
@@ -44,6 +54,8 @@ class GameChapter(BaseModel):
     title: Optional[str] = Field(default=None, max_length=100, description="章节标题")
     branches: List[Branch] = Field(default_factory=list, description="章节脚本分支")
     generation_status: ChapterGenerationStatus = Field(default=ChapterGenerationStatus.NOT_GENERATED, description="章节生成状态")
+    graph_report: Optional[ScriptGraphReport] = Field(default=None, description="分支图分析报告，生成媒体前写入")
+    is_playable: bool = Field(default=False, description="场景图、角色立绘与语音已就绪，可单独发布游玩")
 
     @field_validator("chapter_end_line")
     @classmethod
@@ -62,10 +74,36 @@ class GameChapter(BaseModel):
 
 class GameStatus(str, Enum):
     """游戏生成状态枚举"""
+    QUEUED = "queued"
     GENERATING = "generating"
+    PARKED = "parked"  # 服务商熔断，等待恢复后继续生成
     COMPLETED = "completed"
     FAILED = "failed"
 
+def derive_legacy_playable(game: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    补全逐章发布之前保存的章节的 is_playable
+
+    这些章节没有 is_playable 字段；已生成完成的游戏中，已生成到背景音乐且在生成位置之前的章节
+    媒体已就绪，视为可游玩，避免重新发布时重新生成或在进度中显示为没有可玩章节。
+
+    Args:
+        game: 游戏文档（或只含 status、generate_chapter_index、chapters 的投影）
+
+    Returns:
+        Dict[str, Any]: 同一文档
+    """
+    if game.get("status") != GameStatus.COMPLETED:
+        return game
+    generate_chapter_index = game.get("generate_chapter_index", 0)
+    for chapter in game.get("chapters") or []:
+        if isinstance(chapter, dict) and "is_playable" not in chapter:
+            chapter["is_playable"] = (
+                chapter.get("generation_status") == ChapterGenerationStatus.BGM_GENERATED
+                and chapter.get("index", generate_chapter_index) < generate_chapter_index
+            )
+    return game
+
 class GameGenerationProgress(BaseModel):
     """游戏生成进度"""
     current_workflow: str = Field(..., description="当前执行的工作流")
@@ -96,6 +134,16 @@ class SceneImageResource(BaseModel):
     scene_name: str = Field(..., min_length=1, max_length=100, description="场景名称")
     image_url: str = Field(..., description="图片URL")
 
+class FailedItem(BaseModel):
+    """重试后仍失败的媒体条目（死信），重新生成时只重新提交这些条目"""
+    stage: str = Field(..., description="工作流名称: scene_image, dialogue_tts, background_music")
+    chapter_index: int = Field(..., ge=0, description="章节索引")
+    key: str = Field(..., description="条目标识: 场景名、对话文本或音乐名称")
+    error: str = Field(..., description="最后一次错误信息")
+    retryable: bool = Field(default=True, description="是否为暂时性错误")
+    attempts: int = Field(default=1, ge=1, description="尝试次数")
+    failed_at: datetime = Field(default_factory=datetime.now, description="失败时间")
+
 class BackgroundMusicResource(BaseModel):
     """背景音乐资源数据"""
     chapter_index: int = Field(..., ge=0, description="章节索引")
@@ -135,6 +183,8 @@ class DBGame(BaseModel):
     title: str = Field(..., min_length=0, max_length=100, description="游戏标题")
     novel_text: str = Field(..., description="小说文本")
     settings: dict = Field(default_factory=dict, description="游戏生成设置")
+    content_hash: Optional[str] = Field(default=None, description="规范化小说文本与生成设置的哈希，用于复用相同输入的游戏")
+    cloned_from: Optional[PyObjectId] = Field(default=None, description="复用生成结果的来源游戏ID")
     story_character_info: Optional[StoryCharacterInfo] = Field(default=None, description="角色信息")
     chapters: List[GameChapter] = Field(default_factory=list, description="游戏章节")
     total_chapters: Optional[int] = Field(default=None, ge=0, description="总章节数")
@@ -143,6 +193,7 @@ class DBGame(BaseModel):
     dialogue_tts_resources: List[DialogueTTSResource] = Field(default_factory=list, description="对话TTS资源")
     scene_image_resources: List[SceneImageResource] = Field(default_factory=list, description="场景图资源")
     background_music_resources: List[BackgroundMusicResource] = Field(default_factory=list, description="背景音乐资源")
+    failed_items: List[FailedItem] = Field(default_factory=list, description="重试后仍失败的媒体条目")
     status: GameStatus = Field(default=GameStatus.GENERATING, description="生成状态")
     error: Optional[str] = Field(default=None, description="错误信息")
     progress: GameGenerationProgress = Field(
@@ -159,6 +210,14 @@ class DBGame(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.now, description="更新时间")
     deleted_at: Optional[datetime] = Field(default=None, description="删除时间")
 
+    @model_validator(mode="before")
+    @classmethod
+    def derive_playable_chapters(cls, data: Any) -> Any:
+        """从数据库读取逐章发布之前的游戏时补全章节的 is_playable"""
+        if isinstance(data, dict):
+            derive_legacy_playable(data)
+        return data
+
     class Config:
         arbitrary_types_allowed = True
         json_encoders = {
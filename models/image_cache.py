@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import List
+from pydantic import BaseModel, Field
+from bson import ObjectId
+from models.types import PyObjectId
+
+class DBImageCache(BaseModel):
+    """图片缓存索引，按规范化提示词、模型、采样器与尺寸复用已生成的图片"""
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id", description="缓存记录ID")
+    cache_key: str = Field(..., description="缓存键（规范化参数的哈希）")
+    kind: str = Field(default="scene", description="图片类型，如 scene")
+    prompt: str = Field(..., description="规范化后的提示词")
+    sd_model: str = Field(..., description="模型ID")
+    sampler: str = Field(..., description="采样器")
+    width: int = Field(..., gt=0, description="图片宽度")
+    height: int = Field(..., gt=0, description="图片高度")
+    urls: List[str] = Field(default_factory=list, description="OSS图片地址")
+    game_ids: List[PyObjectId] = Field(default_factory=list, description="使用过该图片的游戏ID")
+    hit_count: int = Field(default=0, ge=0, description="命中次数")
+    last_used_at: datetime = Field(default_factory=datetime.now, description="最后使用时间，用于LRU淘汰")
+    created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
+        populate_by_name = True
@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from bson import ObjectId
+from models.types import PyObjectId
+
+class DBMusicTrack(BaseModel):
+    """背景音乐曲库条目，保存每首生成过的曲目以便按提示词相似度复用"""
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id", description="曲目ID")
+    prompt: str = Field(..., description="生成时使用的提示词")
+    tags: List[str] = Field(default_factory=list, description="从提示词中提取的标签")
+    audio_url: str = Field(..., description="OSS音频地址")
+    title: Optional[str] = Field(default=None, description="曲目标题")
+    duration: Optional[float] = Field(default=None, ge=0, description="时长（秒）")
+    use_count: int = Field(default=0, ge=0, description="被复用次数")
+    created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
+    last_used_at: datetime = Field(default_factory=datetime.now, description="最后使用时间")
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {
+            ObjectId: str,
+            datetime: lambda dt: dt.isoformat()
+        }
+        populate_by_name = True
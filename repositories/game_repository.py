@@ -0,0 +1,158 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING
+from models.game import DBGame, GameStatus, derive_legacy_playable
+from models.types import PyObjectId
+from repositories.mongo_repository import MongoRepository
+from utils.progress_bus import ProgressBus
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 进度推送所需的字段（不含小说原文与章节内容）
+PROGRESS_PROJECTION = {
+    "user_id": 1,
+    "is_deleted": 1,
+    "status": 1,
+    "progress": 1,
+    "error": 1,
+    "generate_chapter_index": 1,
+    "chapters.index": 1,
+    "chapters.is_playable": 1,
+    "chapters.generation_status": 1,
+}
+
+class GameRepository(MongoRepository[DBGame]):
+    """游戏数据仓库"""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection, DBGame)
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index(
+            [("content_hash", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)],
+            sparse=True
+        )
+        self._indexes_ready = True
+
+    async def create(self, model: DBGame) -> Optional[DBGame]:
+        """创建游戏并记录归属用户，之后的进度事件同时推送到用户频道"""
+        created = await super().create(model)
+        if created:
+            ProgressBus().track(model.id, model.user_id)
+        return created
+
+    async def update(self, id: PyObjectId, fields: Dict[str, Any]) -> bool:
+        """更新游戏，涉及状态、进度或章节时发布进度事件"""
+        updated = await super().update(id, fields)
+        if updated:
+            ProgressBus().publish_update(id, fields)
+        return updated
+
+    async def update_if(self, id: PyObjectId, conditions: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        """
+        仅在游戏满足条件时更新，用于不能覆盖其他流水线写入的字段的场景
+
+        Args:
+            id: 游戏ID
+            conditions: 追加到查询条件中的字段条件
+            fields: 要更新的字段
+        """
+        try:
+            result = await self.collection.update_one(
+                {"_id": id, **conditions},
+                {"$set": self._prepare_update_data(fields)}
+            )
+        except Exception as e:
+            logger.error(f"Failed to conditionally update game: {str(e)}")
+            return False
+        if result.modified_count > 0:
+            ProgressBus().publish_update(id, fields)
+            return True
+        return False
+
+    async def get_progress(self, id: PyObjectId) -> Optional[Dict[str, Any]]:
+        """只读取进度推送所需的字段（不含小说原文与章节内容）"""
+        try:
+            doc = await self.collection.find_one({"_id": id}, PROGRESS_PROJECTION)
+            return derive_legacy_playable(doc) if doc else None
+        except Exception as e:
+            logger.error(f"Failed to get game progress: {str(e)}")
+            return None
+
+    async def list_progress(
+        self,
+        user_id: PyObjectId,
+        statuses: List[GameStatus],
+        include_ids: List[PyObjectId],
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        读取用户处于指定状态的游戏以及 include_ids 中的游戏的进度字段
+
+        Args:
+            user_id: 用户ID
+            statuses: 游戏状态，如生成中、排队、暂停
+            include_ids: 无论状态如何都读取的游戏（如上次还在生成中的游戏，用于发现其结束状态）
+            limit: 最多返回的数量
+        """
+        try:
+            cursor = self.collection.find(
+                {
+                    "user_id": user_id,
+                    "is_deleted": {"$ne": True},
+                    "$or": [{"status": {"$in": statuses}}, {"_id": {"$in": include_ids}}],
+                },
+                PROGRESS_PROJECTION
+            ).limit(limit)
+            return [derive_legacy_playable(doc) for doc in await cursor.to_list(length=None)]
+        except Exception as e:
+            logger.error(f"Failed to list game progress: {str(e)}")
+            return []
+
+    async def find_waiting(self, limit: int = 100) -> List[DBGame]:
+        """
+        查找等待生成的游戏：排队中与暂停中的游戏，按创建时间排序
+
+        Args:
+            limit: 最多返回的数量
+        """
+        try:
+            cursor = self.collection.find({
+                "is_deleted": False,
+                "status": {"$in": [GameStatus.QUEUED, GameStatus.PARKED]},
+            }).sort("created_at", ASCENDING).limit(limit)
+            return [DBGame.model_validate(doc) async for doc in cursor]
+        except Exception as e:
+            logger.error(f"Failed to find waiting games: {str(e)}")
+            return []
+
+    async def find_reusable(self, content_hash: str) -> Optional[DBGame]:
+        """
+        查找可复用的游戏：内容哈希相同、已生成完成、未删除且没有失败的媒体条目，取最新的一个
+
+        Args:
+            content_hash: 规范化小说文本与生成设置的哈希
+
+        Returns:
+            Optional[DBGame]: 可复用的游戏，没有时返回None
+        """
+        try:
+            await self._ensure_indexes()
+            doc = await self.collection.find_one(
+                {
+                    "content_hash": content_hash,
+                    "status": GameStatus.COMPLETED,
+                    "is_deleted": False,
+                    "failed_items": {"$size": 0},
+                },
+                sort=[("created_at", DESCENDING)]
+            )
+            return DBGame.model_validate(doc) if doc else None
+        except Exception as e:
+            logger.error(f"Failed to find reusable game: {str(e)}")
+            return None
@@ -0,0 +1,147 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+class GenerationLockRepository:
+    """
+    游戏生成锁
+
+    每个游戏最多一条记录（_id 为游戏ID），持有者定期续期，
+    进程退出未释放的锁在 expires_at 后可被抢占，并由 TTL 索引清理。
+    可抢占的锁（下一章预生成）被请求抢占后不再续期，持有者检测到后退出并释放。
+    其他进程取消游戏生成时在锁上记录 cancel_reason，持有者续期时读取并取消本进程中的流水线。
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建 TTL 索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        self._indexes_ready = True
+
+    async def acquire(self, game_id: str, owner: str, ttl_seconds: float, preemptible: bool = False) -> Optional[bool]:
+        """
+        获取锁，已过期的锁可以被抢占
+
+        Args:
+            preemptible: 是否允许其他请求通过 request_preempt 抢占
+
+        Returns:
+            Optional[bool]: 是否获取成功，数据库不可用时返回None
+        """
+        try:
+            await self._ensure_indexes()
+            now = datetime.now(timezone.utc)
+            expires_at = now + timedelta(seconds=ttl_seconds)
+            try:
+                await self.collection.insert_one({
+                    "_id": game_id, "owner": owner, "preemptible": preemptible,
+                    "acquired_at": now, "expires_at": expires_at
+                })
+                return True
+            except DuplicateKeyError:
+                result = await self.collection.update_one(
+                    {"_id": game_id, "expires_at": {"$lt": now}},
+                    {
+                        "$set": {"owner": owner, "preemptible": preemptible, "acquired_at": now, "expires_at": expires_at},
+                        "$unset": {"preempt_requested": "", "cancel_reason": ""}
+                    }
+                )
+                return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Failed to acquire generation lock: {str(e)}")
+            return None
+
+    async def renew(self, game_id: str, owner: str, ttl_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        续期
+
+        Returns:
+            Optional[Dict[str, Any]]: 续期后的锁（含 cancel_reason），锁已被抢占或被请求抢占时返回None，
+                数据库不可用时返回空字典（视为仍持有）
+        """
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": game_id, "owner": owner, "preempt_requested": {"$ne": True}},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)}},
+                projection={"_id": 0, "cancel_reason": 1},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Failed to renew generation lock: {str(e)}")
+            return {}
+
+    async def request_cancel(self, game_id: str, reason: str) -> bool:
+        """
+        在未过期的锁上记录取消请求，由持有锁的进程取消生成
+
+        Returns:
+            bool: 是否有进程持有该游戏的锁
+        """
+        try:
+            result = await self.collection.update_one(
+                {"_id": game_id, "expires_at": {"$gte": datetime.now(timezone.utc)}},
+                {"$set": {"cancel_reason": reason}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to request generation cancellation: {str(e)}")
+            return False
+
+    async def cancel_reason(self, game_id: str) -> Optional[str]:
+        """锁上记录的取消原因，没有时返回None"""
+        try:
+            doc = await self.collection.find_one({"_id": game_id}, {"cancel_reason": 1})
+            return doc.get("cancel_reason") if doc else None
+        except Exception as e:
+            logger.error(f"Failed to read generation cancellation: {str(e)}")
+            return None
+
+    async def request_preempt(self, game_id: str, grace_seconds: float) -> bool:
+        """
+        请求抢占可抢占的锁，并把过期时间缩短到 grace_seconds 之后，持有者已退出时也能按时获取
+
+        Returns:
+            bool: 是否存在未过期的可抢占锁
+        """
+        try:
+            now = datetime.now(timezone.utc)
+            result = await self.collection.update_one(
+                {"_id": game_id, "preemptible": True, "expires_at": {"$gte": now}},
+                [{"$set": {
+                    "preempt_requested": True,
+                    "expires_at": {"$min": ["$expires_at", now + timedelta(seconds=grace_seconds)]}
+                }}]
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to preempt generation lock: {str(e)}")
+            return False
+
+    async def release(self, game_id: str, owner: str) -> bool:
+        try:
+            result = await self.collection.delete_one({"_id": game_id, "owner": owner})
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Failed to release generation lock: {str(e)}")
+            return False
+
+    async def is_locked(self, game_id: str) -> bool:
+        """是否有未过期的锁"""
+        try:
+            doc = await self.collection.find_one(
+                {"_id": game_id, "expires_at": {"$gte": datetime.now(timezone.utc)}}, {"_id": 1}
+            )
+            return doc is not None
+        except Exception as e:
+            logger.error(f"Failed to check generation lock: {str(e)}")
+            return False
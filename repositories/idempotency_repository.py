@@ -0,0 +1,80 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyRepository:
+    """
+    幂等键存储
+
+    每个用户、接口与 Idempotency-Key 一条记录，首个请求插入 pending 记录后执行，
+    完成后保存响应；重复请求读取已保存的响应。记录过期后由 TTL 索引清理。
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建 TTL 索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        self._indexes_ready = True
+
+    async def begin(self, record_id: str, fingerprint: str, ttl_seconds: float) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        登记一次请求
+
+        Returns:
+            Tuple[bool, Optional[Dict]]: (是否为首个请求, 已存在的记录)，数据库不可用时返回 (True, None)
+        """
+        try:
+            await self._ensure_indexes()
+            now = datetime.now(timezone.utc)
+            await self.collection.insert_one({
+                "_id": record_id,
+                "fingerprint": fingerprint,
+                "status": "pending",
+                "response": None,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=ttl_seconds),
+            })
+            return True, None
+        except DuplicateKeyError:
+            return False, await self.get(record_id)
+        except Exception as e:
+            logger.error(f"Failed to begin idempotent request: {str(e)}")
+            return True, None
+
+    async def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.collection.find_one({"_id": record_id})
+        except Exception as e:
+            logger.error(f"Failed to get idempotency record: {str(e)}")
+            return None
+
+    async def complete(self, record_id: str, response: Dict[str, Any]) -> bool:
+        """保存首个请求的响应"""
+        try:
+            result = await self.collection.update_one(
+                {"_id": record_id},
+                {"$set": {"status": "done", "response": response}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Failed to complete idempotent request: {str(e)}")
+            return False
+
+    async def release(self, record_id: str) -> bool:
+        """删除记录，之后相同键的请求会重新执行"""
+        try:
+            result = await self.collection.delete_one({"_id": record_id})
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Failed to release idempotency record: {str(e)}")
+            return False
@@ -0,0 +1,116 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReturnDocument
+from models.image_cache import DBImageCache
+from models.types import PyObjectId
+from repositories.mongo_repository import MongoRepository
+from typing import List, Optional
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ImageCacheRepository(MongoRepository[DBImageCache]):
+    """图片缓存数据仓库"""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection, DBImageCache)
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index([("cache_key", ASCENDING)], unique=True)
+        await self.collection.create_index([("last_used_at", ASCENDING)])
+        self._indexes_ready = True
+
+    async def get_by_key(self, cache_key: str, game_id: Optional[PyObjectId] = None) -> Optional[DBImageCache]:
+        """
+        按缓存键查找，命中后更新命中次数与最后使用时间
+
+        Args:
+            cache_key: 缓存键
+            game_id: 指定时只查找该游戏生成或使用过的图片
+
+        Returns:
+            Optional[DBImageCache]: 命中的缓存记录
+        """
+        try:
+            await self._ensure_indexes()
+            query = {"cache_key": cache_key, "urls.0": {"$exists": True}}
+            if game_id is not None:
+                query["game_ids"] = game_id
+            update = {
+                "$inc": {"hit_count": 1},
+                "$set": {"last_used_at": datetime.now()}
+            }
+            doc = await self.collection.find_one_and_update(
+                query, update, return_document=ReturnDocument.AFTER
+            )
+            return DBImageCache.model_validate(doc) if doc else None
+        except Exception as e:
+            logger.error(f"Failed to get image cache: {str(e)}")
+            return None
+
+    async def add_usage(self, cache_key: str, game_id: PyObjectId) -> bool:
+        """记录某个游戏使用了该缓存图片"""
+        try:
+            result = await self.collection.update_one(
+                {"cache_key": cache_key},
+                {"$addToSet": {"game_ids": game_id}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error(f"Failed to add image cache usage: {str(e)}")
+            return False
+
+    async def put(self, entry: DBImageCache, urls: List[str], game_id: Optional[PyObjectId] = None) -> bool:
+        """
+        写入缓存：不存在时创建，存在时追加图片地址（同一提示词可有多个变体）
+
+        Args:
+            entry: 缓存记录（用于新建时的元数据）
+            urls: 新生成的图片地址
+            game_id: 生成该图片的游戏ID
+        """
+        try:
+            await self._ensure_indexes()
+            now = datetime.now()
+            add_to_set = {"urls": {"$each": urls}}
+            if game_id is not None:
+                add_to_set["game_ids"] = game_id
+            await self.collection.update_one(
+                {"cache_key": entry.cache_key},
+                {
+                    "$addToSet": add_to_set,
+                    "$set": {"last_used_at": now},
+                    "$setOnInsert": entry.model_dump(
+                        by_alias=True,
+                        exclude={"cache_key", "urls", "game_ids", "last_used_at"}
+                    )
+                },
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to put image cache: {str(e)}")
+            return False
+
+    async def evict(self, max_entries: int) -> int:
+        """
+        LRU淘汰：保留最近使用的 max_entries 条记录
+
+        Returns:
+            int: 淘汰的记录数
+        """
+        try:
+            overflow = await self.collection.estimated_document_count() - max_entries
+            if overflow <= 0:
+                return 0
+            cursor = self.collection.find({}, {"_id": 1}).sort("last_used_at", ASCENDING).limit(overflow)
+            ids = [doc["_id"] async for doc in cursor]
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to evict image cache: {str(e)}")
+            return 0
@@ -89,6 +89,45 @@ class MongoRepository(BaseRepository[T], Generic[T]):
             logger.error(f"Failed to update document: {str(e)}")
             return False
 
+    async def upsert(self, id: PyObjectId, fields: Dict[str, Any], insert_fields: Dict[str, Any] = None) -> bool:
+        """
+        更新记录，不存在时创建
+        
+        Args:
+            id: 记录ID
+            fields: 每次都会写入的字段
+            insert_fields: 仅在创建时写入的字段（如计数、创建时间）
+        """
+        try:
+            update = {"$set": self._prepare_update_data(fields)}
+            if insert_fields:
+                update["$setOnInsert"] = self._prepare_update_data(insert_fields)
+            result = await self.collection.update_one({"_id": id}, update, upsert=True)
+            return result.matched_count > 0 or result.upserted_id is not None
+        except Exception as e:
+            logger.error(f"Failed to upsert document: {str(e)}")
+            return False
+
+    async def push(self, id: PyObjectId, field: str, value: Any) -> bool:
+        """
+        向数组字段追加一个元素（原子操作，适合并发追加资源）
+        
+        Args:
+            id: 记录ID
+            field: 数组字段名
+            value: 要追加的值，支持Pydantic模型
+        """
+        try:
+            update_data = self._prepare_update_data({field: value})
+            result = await self.collection.update_one(
+                {"_id": id},
+                {"$push": update_data}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Failed to push to document: {str(e)}")
+            return False
+
     async def delete(self, id: PyObjectId) -> bool:
         """删除记录"""
         try:
@@ -0,0 +1,34 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from models.music_library import DBMusicTrack
+from models.types import PyObjectId
+from repositories.mongo_repository import MongoRepository
+from typing import List
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MusicLibraryRepository(MongoRepository[DBMusicTrack]):
+    """背景音乐曲库数据仓库"""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        super().__init__(collection, DBMusicTrack)
+
+    async def list_since(self, since: datetime) -> List[DBMusicTrack]:
+        """获取指定时间之后入库的曲目，用于增量刷新本地索引"""
+        return await self.list({"created_at": {"$gt": since}})
+
+    async def record_use(self, id: PyObjectId) -> bool:
+        """记录一次复用"""
+        try:
+            result = await self.collection.update_one(
+                {"_id": id},
+                {
+                    "$inc": {"use_count": 1},
+                    "$set": {"last_used_at": datetime.now()}
+                }
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Failed to record music track use: {str(e)}")
+            return False
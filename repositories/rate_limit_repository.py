@@ -0,0 +1,76 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, ReturnDocument
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RateLimitRepository:
+    """
+    跨进程共享的服务商请求配额
+
+    每个服务商每个时间窗口一条记录（_id 为 "服务商:窗口序号"），保存该窗口的配额与用量，
+    各进程通过原子更新批量领取配额，记录在窗口结束后由 TTL 索引清理。
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建 TTL 索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        self._indexes_ready = True
+
+    async def claim(
+        self,
+        name: str,
+        window: int,
+        window_seconds: float,
+        count: int,
+        quota: int,
+        lower: bool = False
+    ) -> Optional[int]:
+        """
+        在指定窗口内领取最多 count 个请求配额
+
+        窗口的配额保存在记录中，由首个领取的进程写入，之后按记录中的配额计算，所有进程执行同一个配额；
+        lower 为True时（领取的进程被限流后）把记录中的配额降到 quota。
+        计数先原子增加 count 再按增加前的用量计算实际领取数，
+        超出配额的部分不退回（只会让该窗口更保守），保证所有进程合计不超过配额。
+
+        Args:
+            name: 服务商名称
+            window: 窗口序号（Unix 时间 // window_seconds）
+            window_seconds: 窗口长度（秒）
+            count: 希望领取的数量
+            quota: 记录中还没有配额时写入的配额；lower 为True时配额的上限
+            lower: 是否把记录中的配额降到 quota
+
+        Returns:
+            Optional[int]: 实际领取的数量，数据库不可用时返回None
+        """
+        try:
+            await self._ensure_indexes()
+            window_end = datetime.fromtimestamp((window + 1) * window_seconds, timezone.utc)
+            current_quota = {"$ifNull": ["$quota", quota]}
+            doc = await self.collection.find_one_and_update(
+                {"_id": f"{name}:{window}"},
+                [{"$set": {
+                    "name": name,
+                    "window_start": datetime.fromtimestamp(window * window_seconds, timezone.utc),
+                    "expires_at": window_end + timedelta(seconds=window_seconds),
+                    "quota": {"$min": [current_quota, quota]} if lower else current_quota,
+                    "used": {"$add": [{"$ifNull": ["$used", 0]}, count]},
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            used_before = doc["used"] - count
+            return max(0, min(count, doc["quota"] - used_before))
+        except Exception as e:
+            logger.error(f"Failed to claim rate limit quota: {str(e)}")
+            return None
@@ -0,0 +1,137 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 耗时分位数（名称 -> 分位）
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+def _percentile(field: str) -> Dict[str, Any]:
+    """$group 中按近似算法计算各分位数的累加器（MongoDB 7.0+），内存占用不随记录数增长"""
+    return {"$percentile": {"input": f"${field}", "p": list(PERCENTILES.values()), "method": "approximate"}}
+
+
+def _percentile_fields(array_field: str, prefix: str) -> Dict[str, Any]:
+    """把 $percentile 返回的数组展开为各分位数字段的 $project 表达式"""
+    return {
+        f"{prefix}_{name}": {"$arrayElemAt": [f"${array_field}", i]}
+        for i, name in enumerate(PERCENTILES)
+    }
+
+
+class TimelineRepository:
+    """
+    游戏生成时间线
+
+    每条记录是一个时间段（span）：工作流、逐章工作流的一个章节、一个媒体条目、一次大模型调用或一次上传，
+    记录起止时间、排队等待、服务商耗时、重试次数与上传字节数。记录在 expires_at 后由 TTL 索引清理。
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        """首次使用时创建索引"""
+        if self._indexes_ready:
+            return
+        await self.collection.create_index([("game_id", ASCENDING), ("started_at", ASCENDING)])
+        await self.collection.create_index([("started_at", ASCENDING), ("kind", ASCENDING)])
+        await self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+        self._indexes_ready = True
+
+    async def insert_spans(self, spans: Sequence[Dict[str, Any]]) -> bool:
+        """批量写入时间段"""
+        if not spans:
+            return True
+        try:
+            await self._ensure_indexes()
+            await self.collection.insert_many(list(spans), ordered=False)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to insert timeline spans: {str(e)}")
+            return False
+
+    async def list_for_game(self, game_id: Any, limit: int = 5000) -> List[Dict[str, Any]]:
+        """按开始时间获取游戏的全部时间段"""
+        try:
+            await self._ensure_indexes()
+            cursor = self.collection.find(
+                {"game_id": game_id},
+                {"_id": 0, "game_id": 0, "expires_at": 0}
+            ).sort("started_at", ASCENDING).limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to list timeline spans: {str(e)}")
+            return []
+
+    async def breakdown(
+        self,
+        since: datetime,
+        kind: Optional[str] = None,
+        per_game: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        按 (kind, name) 汇总各时间段的耗时分位数、排队等待分位数、失败与重试次数、上传字节数
+
+        分位数使用 $percentile 近似计算（需要 MongoDB 7.0+），调用方应限制 since 的范围。
+
+        Args:
+            since: 只统计此时间之后开始的时间段
+            kind: 只统计该类型，如 workflow、item、llm、upload
+            per_game: 为True时先按游戏累加，分位数反映单个游戏在该环节花费的总时间
+
+        Returns:
+            List[Dict[str, Any]]: 按总耗时倒序排列的汇总
+        """
+        match: Dict[str, Any] = {"started_at": {"$gte": since}}
+        if kind:
+            match["kind"] = kind
+        pipeline: List[Dict[str, Any]] = [{"$match": match}]
+        if per_game:
+            pipeline.append({"$group": {
+                "_id": {"game_id": "$game_id", "kind": "$kind", "name": "$name"},
+                "duration_seconds": {"$sum": "$duration_seconds"},
+                "queue_wait_seconds": {"$sum": "$queue_wait_seconds"},
+                "failed": {"$sum": {"$cond": ["$succeeded", 0, 1]}},
+                "retries": {"$sum": "$retries"},
+                "bytes": {"$sum": "$bytes"},
+            }})
+            pipeline.append({"$addFields": {"kind": "$_id.kind", "name": "$_id.name"}})
+        pipeline += [
+            {"$group": {
+                "_id": {"kind": "$kind", "name": "$name"},
+                "count": {"$sum": 1},
+                "failed": {"$sum": "$failed"} if per_game else {"$sum": {"$cond": ["$succeeded", 0, 1]}},
+                "retries": {"$sum": "$retries"},
+                "bytes": {"$sum": "$bytes"},
+                "total_seconds": {"$sum": "$duration_seconds"},
+                "total_queue_wait_seconds": {"$sum": "$queue_wait_seconds"},
+                "durations": _percentile("duration_seconds"),
+                "queue_waits": _percentile("queue_wait_seconds"),
+            }},
+            {"$project": {
+                "_id": 0,
+                "kind": "$_id.kind",
+                "name": "$_id.name",
+                "count": 1,
+                "failed": 1,
+                "retries": 1,
+                "bytes": 1,
+                "total_seconds": 1,
+                "total_queue_wait_seconds": 1,
+                **_percentile_fields("durations", "duration"),
+                **_percentile_fields("queue_waits", "queue_wait"),
+            }},
+            {"$sort": {"total_seconds": -1}},
+        ]
+        try:
+            await self._ensure_indexes()
+            return await self.collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to aggregate timeline breakdown: {str(e)}")
+            return []
@@ -1,8 +1,10 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorCollection
 from math import ceil
 
+from config import get_settings
 from models.user import DBUser
 from models.types import PyObjectId
 from models.credits import DBCredits, DBCreditsHistory
@@ -12,8 +14,25 @@ from schemas.admin.user import AdminUserListItem
 from schemas.common import PaginatedResponse, PaginationParams
 from core.auth import get_current_user
 from repositories.base_repository import BaseRepository
-from core.container import get_user_repository, get_credits_repository, get_credits_history_repository
+from core.container import get_user_repository, get_credits_repository, get_credits_history_repository, get_timeline_repository
+from repositories.timeline_repository import TimelineRepository
 from constant.credits import INITIAL_CREDITS
+from utils.llm_usage import LLMUsageTracker
+from utils.single_flight import SingleFlight
+from utils.image_cache import ImageCache
+from utils.music_library import MusicLibrary
+from utils.speculation import SpeculationRegistry
+from utils.scheduler import FairScheduler
+from utils.admission import AdmissionController
+from utils.cancellation import CancellationRegistry
+from utils.retry import retry_snapshot
+from utils.circuit_breaker import CircuitBreaker, ParkingLot
+from utils.rate_limiter import AdaptiveRateLimiter
+from utils.hedging import Hedger
+from utils.content_classifier import ContentClassifier
+from utils.game_reuse import GameReuse
+from utils.progress_bus import ProgressBus
+from utils.timeline import GenerationTimeline
 
 admin_router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -119,3 +138,236 @@ async def update_user_credits(
     await credits_history_repo.create(history)
     
     return CreditsResponse(credits=new_amount, updated_at=now)
+
+
+@admin_router.get("/llm/usage", response_model=dict)
+async def get_llm_usage(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取各提示词的大模型 token 用量及上下文缓存命中率（当前进程）
+    """
+    return LLMUsageTracker().snapshot()
+
+
+@admin_router.get("/single_flight", response_model=dict)
+async def get_single_flight_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取各服务商的单飞去重统计，saved 为合并后节省的调用次数（当前进程）
+    """
+    return SingleFlight.snapshot()
+
+
+@admin_router.get("/image_cache", response_model=dict)
+async def get_image_cache_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取图片缓存命中统计（当前进程）
+    """
+    return ImageCache.stats()
+
+
+@admin_router.get("/music_library", response_model=dict)
+async def get_music_library_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取背景音乐曲库的复用命中统计（当前进程）
+    """
+    return (await MusicLibrary.get_instance()).stats()
+
+
+@admin_router.get("/speculation", response_model=dict)
+async def get_speculation_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取下一章预生成任务统计（当前进程）
+    """
+    return SpeculationRegistry().snapshot()
+
+
+@admin_router.get("/scheduler", response_model=dict)
+async def get_scheduler_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取各服务商调度器的槽位占用、排队数量及各优先级平均等待时间（当前进程）
+    """
+    return FairScheduler.snapshot()
+
+
+@admin_router.get("/admission", response_model=dict)
+async def get_admission_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取生成准入统计：进行中与排队的流水线、耗时估计及拒绝次数（当前进程）
+    """
+    return AdmissionController().snapshot()
+
+
+@admin_router.post("/games/{game_id}/cancel", response_model=dict)
+async def cancel_game_generation(
+    game_id: str,
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    取消游戏正在进行、排队、暂停或预生成中的生成任务，游戏标记为失败，可重新生成
+
+    生成在其他 worker 进程中进行时，取消请求记录在游戏的生成锁上，由该进程在续期时取消（forwarded 为 true）
+    """
+    report = await CancellationRegistry().cancel(game_id, "admin")
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No generation in progress for this game"
+        )
+    return report.to_dict()
+
+
+@admin_router.get("/cancellation", response_model=dict)
+async def get_cancellation_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取进行中的生成流水线及最近的取消报告（当前进程）
+    """
+    return CancellationRegistry().snapshot()
+
+
+@admin_router.get("/retry", response_model=dict)
+async def get_retry_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取媒体条目的重试统计：重试次数、重试后成功、重试耗尽及永久性错误（当前进程）
+    """
+    return retry_snapshot()
+
+
+@admin_router.get("/circuit_breakers", response_model=dict)
+async def get_circuit_breaker_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取各服务商熔断器状态及因熔断暂停的游戏（当前进程）
+    """
+    return {
+        "breakers": CircuitBreaker.snapshot(),
+        "parked": ParkingLot().snapshot(),
+    }
+
+
+@admin_router.get("/rate_limits", response_model=dict)
+async def get_rate_limit_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取各服务商自适应限速器的当前速率（当前进程）
+    """
+    return AdaptiveRateLimiter.snapshot()
+
+
+@admin_router.get("/hedging", response_model=dict)
+async def get_hedging_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取对冲请求统计：当前阈值、对冲比例与对冲胜出次数（当前进程）
+    """
+    return Hedger.snapshot()
+
+
+@admin_router.get("/content_classifier", response_model=dict)
+async def get_content_classifier_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取创建游戏时内容类型本地分类与回退大模型的统计（当前进程）
+    """
+    return ContentClassifier().snapshot()
+
+
+@admin_router.get("/game_reuse", response_model=dict)
+async def get_game_reuse_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取创建游戏时复用相同输入的已完成游戏的命中统计（当前进程）
+    """
+    return GameReuse().snapshot()
+
+
+@admin_router.get("/progress_stream", response_model=dict)
+async def get_progress_stream_stats(
+    admin: DBUser = Depends(get_admin_user)
+):
+    """
+    获取生成进度推送的订阅数与事件统计（当前进程）
+    """
+    return ProgressBus().snapshot()
+
+
+@admin_router.get("/games/{game_id}/timeline", response_model=dict)
+async def get_game_timeline(
+    game_id: str,
+    admin: DBUser = Depends(get_admin_user),
+    timeline_repo: TimelineRepository = Depends(get_timeline_repository)
+):
+    """
+    获取游戏的生成时间线：各工作流、章节、媒体条目、大模型调用与上传的时间段，
+    以及按 (kind, name) 汇总的耗时、排队等待、服务商耗时、重试与上传字节数
+    """
+    game_pid = PyObjectId(game_id)
+    # 生成中的游戏先写入本进程缓存的时间段
+    await GenerationTimeline().flush(game_pid)
+    spans = await timeline_repo.list_for_game(game_pid)
+    if not spans:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No timeline recorded for this game"
+        )
+
+    summary = defaultdict(lambda: defaultdict(float))
+    for span in spans:
+        stage = summary[f"{span['kind']}:{span['name']}"]
+        stage["count"] += 1
+        stage["failed"] += 0 if span["succeeded"] else 1
+        for name in ("duration_seconds", "queue_wait_seconds", "provider_seconds", "retries", "bytes"):
+            stage[name] += span.get(name) or 0
+    return {
+        "started_at": spans[0]["started_at"],
+        "ended_at": max(span["ended_at"] for span in spans),
+        "summary": {
+            key: {name: round(value, 3) for name, value in stage.items()}
+            for key, stage in sorted(summary.items(), key=lambda item: -item[1]["duration_seconds"])
+        },
+        "spans": spans,
+    }
+
+
+@admin_router.get("/timelines/breakdown", response_model=dict)
+async def get_timeline_breakdown(
+    days: float = Query(7, gt=0, description="统计最近多少天"),
+    kind: str = Query(None, description="只统计该类型: workflow, chapter, item, llm, upload, speculative"),
+    per_game: bool = Query(False, description="先按游戏累加，分位数为单个游戏在该环节的总耗时"),
+    admin: DBUser = Depends(get_admin_user),
+    timeline_repo: TimelineRepository = Depends(get_timeline_repository)
+):
+    """
+    跨游戏的耗时分位数（p50/p90/p99）与排队等待分位数，用于容量规划
+
+    统计天数不超过 TIMELINE_BREAKDOWN_MAX_DAYS。
+    """
+    days = min(days, get_settings().TIMELINE_BREAKDOWN_MAX_DAYS)
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return {
+        "since": since,
+        "days": days,
+        "timeline": GenerationTimeline().snapshot(),
+        "breakdown": await timeline_repo.breakdown(since, kind=kind, per_game=per_game),
+    }
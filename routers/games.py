@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel
 from enum import Enum
@@ -12,12 +14,23 @@ from models.db_runtime_game import DBRuntimeGame
 from workflows.game_generation import GameGenerationWorkflow
 from core.auth import get_current_user
 from core.container import get_game_repository, get_runtime_game_repository, get_credits_repository
+from repositories.game_repository import GameRepository
 from schemas.game_runtime import GameRuntimeSchema
 from schemas.game_list import GameListItemSchema
 from utils.text import TextUtils
 from utils.llm_tool import LLMTool
+from utils.content_classifier import ContentClassifier
 from repositories.credits_repository import CreditsRepository
 from repositories.base_repository import BaseRepository
+from utils.lazy_tts import LazyDialogueTTS, LazyTTSError, LazyTTSQuotaExceeded, LazyTTSUnavailable
+from utils.speculation import SpeculationRegistry
+from utils.scheduler import Priority, set_job_context
+from utils.admission import AdmissionController, AdmissionDecision
+from utils.generation_lock import GenerationLocks
+from utils.idempotency import run_idempotent
+from utils.single_flight import make_key
+from utils.game_reuse import GameReuse, content_hash
+from utils.progress_bus import SSE_HEADERS, ProgressBus, game_channel, progress_event, sse_events
 
 logger = logging.getLogger(__name__)
 
@@ -27,10 +40,13 @@ class CreateGameRequest(BaseModel):
     title: str
     novel_text: str
     settings: dict = {}
+    fresh: bool = False  # 不复用相同输入的已完成游戏，重新生成
 
 
 class CreateGameStatus(str, Enum):
     SUCCESS = "success"
+    QUEUED = "queued"  # 已创建，排队等待生成
+    REJECTED = "rejected"  # 生成服务繁忙，未扣除次数
     FAILED = "failed"
 
 class CreateGameResponse(BaseModel):
@@ -38,22 +54,123 @@ class CreateGameResponse(BaseModel):
     task_id: Optional[str]
     status: CreateGameStatus
     error: Optional[str] = None
+    estimated_wait_seconds: Optional[float] = None  # 预计多久后首章可玩（秒）
+
+
+class DialogueTTSRequest(BaseModel):
+    """按需合成对话语音请求模型"""
+    chapter_index: int
+    branch_name: str
+    command_index: int
+
+
+class DialogueTTSResponse(BaseModel):
+    """按需合成对话语音响应模型"""
+    oss_url: Optional[str] = None
 
 
 # 创建路由
 games_router = APIRouter(prefix="/api/games", tags=["games"])
 
 
+async def _start_generation(
+    game: DBGame,
+    game_repo: BaseRepository[DBGame],
+    runtime_game_repo: BaseRepository[DBRuntimeGame],
+    lock_token: Optional[str] = None
+) -> CreateGameResponse:
+    """
+    提交游戏生成流水线，无空闲名额时排队，并返回预计等待时间
+
+    Args:
+        lock_token: 接口已获取的生成锁持有者标识，交给流水线沿用并在结束时释放；
+            为空时（新创建的游戏）在提交前获取，排队期间同样持有
+    """
+    if lock_token is None:
+        lock_token = await GenerationLocks().acquire(game.id)
+        if lock_token is None:
+            return _existing_task_response(game)
+
+    admission = AdmissionController()
+    workflow = GameGenerationWorkflow(game_repo, runtime_game_repo)
+    decision = admission.submit(game.id, lambda: workflow.generate_game(game, lock_token=lock_token))
+
+    if decision == AdmissionDecision.QUEUE:
+        if game.status != GameStatus.QUEUED:
+            game.status = GameStatus.QUEUED
+            await game_repo.update(
+                id=game.id,
+                fields={"status": GameStatus.QUEUED}
+            )
+        position = admission.queue_position(game.id) or 0
+        return CreateGameResponse(
+            task_id=str(game.id),
+            status=CreateGameStatus.QUEUED,
+            estimated_wait_seconds=round(admission.estimate_wait(position), 1)
+        )
+
+    return CreateGameResponse(
+        task_id=str(game.id),
+        status=CreateGameStatus.SUCCESS,
+        estimated_wait_seconds=round(admission.first_playable_seconds, 1)
+    )
+
+
+def _existing_task_response(game: DBGame) -> CreateGameResponse:
+    """游戏已有生成任务（重复提交）时返回该任务，不再扣除次数或启动新的流水线"""
+    admission = AdmissionController()
+    position = admission.queue_position(game.id)
+    if position is not None or game.status == GameStatus.QUEUED:
+        return CreateGameResponse(
+            task_id=str(game.id),
+            status=CreateGameStatus.QUEUED,
+            estimated_wait_seconds=round(admission.estimate_wait(position or 0), 1)
+        )
+    return CreateGameResponse(task_id=str(game.id), status=CreateGameStatus.SUCCESS)
+
+
+def _started(response: CreateGameResponse) -> bool:
+    """请求是否产生了生成任务；没有时不保存幂等记录，客户端可以用同一个键重试"""
+    return response.task_id is not None
+
+
+# 正在生成或等待继续生成的状态，重复提交时返回现有任务
+IN_PROGRESS_STATUSES = (GameStatus.GENERATING, GameStatus.QUEUED, GameStatus.PARKED)
+
+
 @games_router.post("/create", response_model=CreateGameResponse)
 async def create_game(
     request: CreateGameRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: DBUser = Depends(get_current_user),
-    game_repo: BaseRepository[DBGame] = Depends(get_game_repository),
+    game_repo: GameRepository = Depends(get_game_repository),
     runtime_game_repo: BaseRepository[DBRuntimeGame] = Depends(get_runtime_game_repository),
     credits_repo: CreditsRepository = Depends(get_credits_repository)
 ):
+    """创建新游戏，带相同 Idempotency-Key 的重复请求返回首次创建的游戏"""
+    return await run_idempotent(
+        str(current_user.id),
+        "create",
+        idempotency_key,
+        make_key(title=request.title, novel_text=request.novel_text, settings=request.settings, fresh=request.fresh),
+        lambda: _create_game(request, current_user, game_repo, runtime_game_repo, credits_repo),
+        CreateGameResponse,
+        should_store=_started
+    )
+
+
+async def _create_game(
+    request: CreateGameRequest,
+    current_user: DBUser,
+    game_repo: GameRepository,
+    runtime_game_repo: BaseRepository[DBRuntimeGame],
+    credits_repo: CreditsRepository
+) -> CreateGameResponse:
     """创建新游戏"""
     try:
+        # 前台生成优先，取消该用户的下一章预生成
+        await SpeculationRegistry().preempt_user(current_user.id)
+
         # 检查用户是否有足够的credits
         user_credits = await credits_repo.get_by_user_id(current_user.id)
         if not user_credits or user_credits.amount <= 0:
@@ -63,27 +180,54 @@ async def create_game(
                 error="您的游戏生成次数已用完"
             )
 
+        # 相同小说文本与设置的游戏已生成完成时直接复用，不调用大模型也不占用生成名额
+        text_to_generate = TextUtils.truncate_by_complete_lines(request.novel_text, 10000)
+        game_hash = content_hash(text_to_generate, request.settings)
+        source = await GameReuse().find_source(game_repo, game_hash, fresh=request.fresh)
+        if source:
+            return await _clone_game(
+                source, request, current_user, text_to_generate, game_hash,
+                game_repo, runtime_game_repo, credits_repo
+            )
+
+        # 负载过高时直接拒绝，不调用大模型也不扣除次数
+        admission = AdmissionController()
+        ticket = admission.evaluate()
+        if ticket.decision == AdmissionDecision.REJECT:
+            admission.reject()
+            return CreateGameResponse(
+                task_id=None,
+                status=CreateGameStatus.REJECTED,
+                error=ticket.reason,
+                estimated_wait_seconds=ticket.estimated_wait_seconds
+            )
+
+        # 内容分类决定用户多久能开始游玩，按首章优先级调度
+        set_job_context(current_user.id, priority=Priority.FIRST_CHAPTER)
+
         # 截取一定长度的文本
         text_to_analyze = TextUtils.truncate_by_complete_lines(request.novel_text, 5000)
-        
 
-        # 先调用大模型检查内容类型
-        llm_tool = LLMTool()
-        content_type_result = await llm_tool.generate(
-            system_prompt="analyze_content_types_system",
-            user_prompt="analyze_content_types_user",
-            prompt_replacements={"content": text_to_analyze}
-        )
-        
-        # 提取类型并映射到 InputTextType
+        # 先用本地分类器判断内容类型，不确定时再调用大模型
+        classification = ContentClassifier().classify(text_to_analyze)
+        if classification.confident:
+            content_type_match = classification.label.value
+        else:
+            llm_tool = LLMTool()
+            content_type_result = await llm_tool.generate(
+                system_prompt="analyze_content_types_system",
+                user_prompt="analyze_content_types_user",
+                prompt_replacements={"content": text_to_analyze}
+            )
+            # 从结果中提取类型
+            content_type_match = content_type_result.split("分类结果:")[-1].strip()
+
+        # 类型映射到 InputTextType
         type_mapping = {
             "想法": InputTextType.IDEA,
             "小说": InputTextType.NOVEL,
             "无意义": None  # 无意义内容将抛出异常
         }
-        
-        # 从结果中提取类型
-        content_type_match = content_type_result.split("分类结果:")[-1].strip()
         input_type = type_mapping.get(content_type_match)
         
         if input_type is None:
@@ -102,7 +246,6 @@ async def create_game(
             )
 
         # 创建游戏记录
-        text_to_generate = TextUtils.truncate_by_complete_lines(request.novel_text, 10000)
         game = DBGame(
             user_id=current_user.id,
             user_info=UserInfo(
@@ -114,8 +257,9 @@ async def create_game(
             input_text=request.novel_text,
             novel_text=text_to_generate,
             settings=request.settings,
+            content_hash=game_hash,
             progress=GameGenerationProgress(current_workflow="", progress=0),
-            status=GameStatus.GENERATING,
+            status=GameStatus.QUEUED if ticket.decision == AdmissionDecision.QUEUE else GameStatus.GENERATING,
             generate_chapter_index=1
         )
 
@@ -124,13 +268,7 @@ async def create_game(
             raise HTTPException(status_code=500, detail="Failed to create game")
         
         # 启动游戏生成工作流
-        workflow = GameGenerationWorkflow(game_repo, runtime_game_repo)
-        asyncio.create_task(workflow.generate_game(game))
-        
-        return CreateGameResponse(
-            task_id=str(game.id),
-            status=CreateGameStatus.SUCCESS
-        )
+        return await _start_generation(game, game_repo, runtime_game_repo)
         
     except Exception as e:
         logger.error(f"Failed to create game: {str(e)}")
@@ -141,13 +279,81 @@ async def create_game(
         )
 
 
+async def _clone_game(
+    source: DBGame,
+    request: CreateGameRequest,
+    current_user: DBUser,
+    text_to_generate: str,
+    game_hash: str,
+    game_repo: GameRepository,
+    runtime_game_repo: BaseRepository[DBRuntimeGame],
+    credits_repo: CreditsRepository
+) -> CreateGameResponse:
+    """以相同输入的已完成游戏的中间产物创建新游戏并直接发布"""
+    if not await credits_repo.deduct_credits(current_user.id):
+        return CreateGameResponse(
+            task_id=None,
+            status=CreateGameStatus.FAILED,
+            error="扣除游戏生成次数失败"
+        )
+
+    reuse = GameReuse()
+    game = reuse.clone(
+        source,
+        user_id=current_user.id,
+        user_info=UserInfo(
+            name=current_user.name,
+            avatar_url=current_user.avatar
+        ),
+        title=request.title,
+        input_text=request.novel_text,
+        novel_text=text_to_generate,
+        settings=request.settings,
+        content_hash=game_hash
+    )
+    if not await game_repo.create(game):
+        raise HTTPException(status_code=500, detail="Failed to create game")
+
+    workflow = GameGenerationWorkflow(game_repo, runtime_game_repo)
+    if await workflow.publish_clone(game):
+        return CreateGameResponse(
+            task_id=str(game.id),
+            status=CreateGameStatus.SUCCESS,
+            estimated_wait_seconds=0.0
+        )
+
+    # 发布失败时按正常流程续跑，已完成的工作流会被跳过
+    reuse.record_failure()
+    return await _start_generation(game, game_repo, runtime_game_repo)
+
+
 @games_router.post("/{game_id}/regenerate", response_model=CreateGameResponse)
 async def generate_game(
     game_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: DBUser = Depends(get_current_user),
     game_repo: BaseRepository[DBGame] = Depends(get_game_repository),
     runtime_game_repo: BaseRepository[DBRuntimeGame] = Depends(get_runtime_game_repository)
 ):
+    return await run_idempotent(
+        str(current_user.id),
+        f"regenerate:{game_id}",
+        idempotency_key,
+        game_id,
+        lambda: _regenerate_game(game_id, current_user, game_repo, runtime_game_repo),
+        CreateGameResponse,
+        should_store=_started
+    )
+
+
+async def _regenerate_game(
+    game_id: str,
+    current_user: DBUser,
+    game_repo: BaseRepository[DBGame],
+    runtime_game_repo: BaseRepository[DBRuntimeGame]
+) -> CreateGameResponse:
+    locks = GenerationLocks()
+    lock_token = None
     try:
         #game_id转成ObjectId
         game_id = PyObjectId(game_id)
@@ -156,16 +362,28 @@ async def generate_game(
         if not game:
             raise HTTPException(status_code=404, detail="Game not found")
 
-        # 验证游戏状态
-        if game.status != GameStatus.FAILED:
-            raise HTTPException(status_code=400, detail="Game is not in failed state")
-
         # 验证用户权限
         if str(game.user_id) != str(current_user.id):
             raise HTTPException(
                 status_code=403, detail="Not authorized to regenerate this game"
             )
+
+        # 重复提交时返回正在进行的生成任务
+        if game.status in IN_PROGRESS_STATUSES:
+            return _existing_task_response(game)
+
+        # 验证游戏状态
+        if game.status != GameStatus.FAILED:
+            raise HTTPException(status_code=400, detail="Game is not in failed state")
+
+        # 已取消的流水线可能尚未退出，持有生成锁时不启动新的流水线
+        lock_token = await locks.acquire(game.id)
+        if lock_token is None:
+            return _existing_task_response(game)
         
+        # 前台生成优先，取消该用户的下一章预生成
+        await SpeculationRegistry().preempt_user(current_user.id)
+
         # 更新状态为生成中
         await game_repo.update(
             id=game.id,
@@ -173,46 +391,80 @@ async def generate_game(
         )
         game.status = GameStatus.GENERATING
 
-        # 启动游戏生成工作流
-        workflow = GameGenerationWorkflow(game_repo, runtime_game_repo)
-        asyncio.create_task(workflow.generate_game(game))
-
-        return CreateGameResponse(
-            task_id=str(game.id),
-            status=CreateGameStatus.SUCCESS
-        )
+        # 启动游戏生成工作流，流水线沿用本次获取的锁
+        response = await _start_generation(game, game_repo, runtime_game_repo, lock_token)
+        lock_token = None
+        return response
 
+    except HTTPException:
+        raise
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid game id")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to regenerate game: {str(e)}"
         )
+    finally:
+        # 未交给流水线的生成锁在此释放
+        await locks.release(game_id, lock_token)
 
 
 @games_router.post("/{game_id}/next_chapter", response_model=CreateGameResponse)
 async def generate_next_chapter(
     game_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: DBUser = Depends(get_current_user),
     game_repo: BaseRepository[DBGame] = Depends(get_game_repository),
     runtime_game_repo: BaseRepository[DBRuntimeGame] = Depends(get_runtime_game_repository),
     credits_repo: CreditsRepository = Depends(get_credits_repository)
 ):
+    return await run_idempotent(
+        str(current_user.id),
+        f"next_chapter:{game_id}",
+        idempotency_key,
+        game_id,
+        lambda: _generate_next_chapter(game_id, current_user, game_repo, runtime_game_repo, credits_repo),
+        CreateGameResponse,
+        should_store=_started
+    )
+
+
+async def _generate_next_chapter(
+    game_id: str,
+    current_user: DBUser,
+    game_repo: BaseRepository[DBGame],
+    runtime_game_repo: BaseRepository[DBRuntimeGame],
+    credits_repo: CreditsRepository
+) -> CreateGameResponse:
+    locks = GenerationLocks()
+    lock_token = None
     try:
-
-
         # 查找游戏记录
-        game = await game_repo.get(game_id)
+        game = await game_repo.get(PyObjectId(game_id))
         if not game:
             raise HTTPException(status_code=404, detail="Game not found")
 
-        # 验证游戏状态
-        if game.status != GameStatus.COMPLETED:
-            raise HTTPException(status_code=400, detail="Game is not in completed state")
-
         # 验证用户权限
         if str(game.user_id) != str(current_user.id):
             raise HTTPException(
                 status_code=403, detail="Not authorized to generate next chapter"
             )
+
+        # 重复提交时返回正在进行的生成任务
+        if game.status in IN_PROGRESS_STATUSES:
+            return _existing_task_response(game)
+
+        # 验证游戏状态
+        if game.status != GameStatus.COMPLETED:
+            raise HTTPException(status_code=400, detail="Game is not in completed state")
+
+        # 扣除次数前获取生成锁，并发的重复请求只有一个能继续；
+        # 下一章的预生成（可能在其他 worker 上）持有可抢占的锁，停止并释放后才继续
+        await SpeculationRegistry().cancel(game.id)
+        lock_token = await locks.acquire(game.id, preempt=True)
+        if lock_token is None:
+            return _existing_task_response(game)
+
         # 检查用户是否有足够的credits
         user_credits = await credits_repo.get_by_user_id(current_user.id)
         if not user_credits or user_credits.amount <= 0:
@@ -230,23 +482,32 @@ async def generate_next_chapter(
                 error="扣除游戏生成次数失败"
             )
 
-        # 增加 generate_chapter_index
+        # 重新读取已预生成的章节内容
+        game = await game_repo.get(game.id)
+
+        # 增加 generate_chapter_index，并从章节切分之后重新执行各工作流
+        # （已预生成或已完成的部分会按章节状态跳过）
         game.generate_chapter_index += 1
         game.status = GameStatus.GENERATING
+        game.progress = GameGenerationProgress(current_workflow="chapter_split", progress=10)
         await game_repo.update(
             id=game.id,
-            fields={"generate_chapter_index": game.generate_chapter_index, "status": GameStatus.GENERATING}
+            fields={
+                "generate_chapter_index": game.generate_chapter_index,
+                "status": GameStatus.GENERATING,
+                "progress": game.progress
+            }
         )
         
-        # 启动游戏生成工作流
-        workflow = GameGenerationWorkflow(game_repo, runtime_game_repo)
-        asyncio.create_task(workflow.generate_game(game))
-
-        return CreateGameResponse(
-            task_id=str(game.id),
-            status=CreateGameStatus.SUCCESS
-        )
-
+        # 启动游戏生成工作流，流水线沿用本次获取的锁
+        response = await _start_generation(game, game_repo, runtime_game_repo, lock_token)
+        lock_token = None
+        return response
+
+    except HTTPException:
+        raise
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid game id")
     except Exception as e:
         logger.error(f"Failed to generate next chapter: {str(e)}")
         return CreateGameResponse(
@@ -254,6 +515,92 @@ async def generate_next_chapter(
             status=CreateGameStatus.FAILED,
             error="生成下一章节失败"
         )
+    finally:
+        # 未交给流水线的生成锁在此释放
+        await locks.release(game_id, lock_token)
+
+
+@games_router.post("/{game_id}/tts", response_model=DialogueTTSResponse)
+async def synthesize_dialogue_tts(
+    game_id: str,
+    request: DialogueTTSRequest,
+    current_user: DBUser = Depends(get_current_user),
+    game_repo: BaseRepository[DBGame] = Depends(get_game_repository),
+    runtime_game_repo: BaseRepository[DBRuntimeGame] = Depends(get_runtime_game_repository)
+):
+    """按需合成一句已发布游戏中对话的语音，并在后台预取当前分支接下来的对话"""
+    try:
+        game_pid = PyObjectId(game_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid game id")
+
+    try:
+        lazy_tts = LazyDialogueTTS(game_repo, runtime_game_repo)
+        oss_url = await lazy_tts.synthesize(
+            game_id=game_pid,
+            chapter_index=request.chapter_index,
+            branch_name=request.branch_name,
+            command_index=request.command_index,
+            user_id=str(current_user.id)
+        )
+        return DialogueTTSResponse(oss_url=oss_url)
+
+    except LazyTTSUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LazyTTSQuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except LazyTTSError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to synthesize dialogue TTS: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to synthesize dialogue TTS: {str(e)}")
+
+
+# 游戏进度推送在这些状态后结束
+TERMINAL_STATUS_NAMES = ("published", "failed")
+
+@games_router.get("/{game_id}/events")
+async def stream_game_progress(
+    game_id: str,
+    request: Request,
+    current_user: DBUser = Depends(get_current_user),
+    game_repo: GameRepository = Depends(get_game_repository)
+):
+    """
+    以 Server-Sent Events 推送游戏生成进度，代替轮询游戏列表
+
+    首个事件为当前进度，之后推送状态、进度、可玩章节变化（progress 事件）
+    与媒体条目完成情况（item 事件），游戏生成完成或失败后结束。
+    """
+    game_pid = PyObjectId(game_id)
+    doc = await game_repo.get_progress(game_pid)
+    if not doc or doc.get("is_deleted"):
+        raise HTTPException(status_code=404, detail="Game not found")
+    if str(doc["user_id"]) != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized to view this game")
+    ProgressBus().track(game_pid, current_user.id)
+
+    async def initial():
+        latest = await game_repo.get_progress(game_pid)
+        if not latest:
+            return None
+        return {**progress_event(latest), "game_id": game_id}
+
+    async def poll():
+        event = await initial()
+        return [event] if event else []
+
+    return StreamingResponse(
+        sse_events(
+            request,
+            game_channel(game_pid),
+            initial=initial,
+            until=lambda event: event.get("status") in TERMINAL_STATUS_NAMES,
+            poll=poll
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @games_router.get("/{game_id}", response_model=GameRuntimeSchema)
@@ -1,15 +1,17 @@
 from typing import List
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 
 from models.user import DBUser
-from models.game import DBGame
+from models.game import DBGame, GameStatus
 from models.types import PyObjectId
 from models.credits import DBCredits, DBCreditsHistory
 from schemas.game import GameListItemSchema
 from schemas.credits import CreditsResponse, CreditsHistoryResponse
 from core.auth import get_current_user
 from repositories.base_repository import BaseRepository
+from repositories.game_repository import GameRepository
 from core.container import (
     get_game_repository,
     get_runtime_game_repository,
@@ -17,9 +19,14 @@ from core.container import (
     get_credits_history_repository
 )
 from constant.credits import INITIAL_CREDITS
+from utils.cancellation import CancellationRegistry
+from utils.progress_bus import SSE_HEADERS, progress_event, sse_events, user_channel
 
 user_router = APIRouter(prefix="/api/user", tags=["user"])
 
+# 生成中、排队或暂停的游戏，进度推送时定期读取
+IN_PROGRESS_STATUSES = (GameStatus.GENERATING, GameStatus.QUEUED, GameStatus.PARKED)
+
 @user_router.get("/me/games", response_model=List[GameListItemSchema])
 async def get_user_games(
     current_user: DBUser = Depends(get_current_user),
@@ -41,6 +48,31 @@ async def get_user_games(
     
     return [GameListItemSchema.from_db_game(game) for game in games]
 
+@user_router.get("/me/games/events")
+async def stream_user_games_progress(
+    request: Request,
+    current_user: DBUser = Depends(get_current_user),
+    game_repo: GameRepository = Depends(get_game_repository)
+):
+    """
+    以 Server-Sent Events 推送当前用户所有游戏的生成进度
+
+    客户端先获取一次游戏列表，之后按事件中的 game_id 更新对应游戏，无需再轮询列表。
+    """
+    # 上次读取时仍在生成的游戏，下次读取时无论状态如何都读取，以推送其结束状态
+    generating = []
+
+    async def poll():
+        docs = await game_repo.list_progress(current_user.id, list(IN_PROGRESS_STATUSES), generating)
+        generating[:] = [doc["_id"] for doc in docs if doc.get("status") in IN_PROGRESS_STATUSES]
+        return [{**progress_event(doc), "game_id": str(doc["_id"])} for doc in docs]
+
+    return StreamingResponse(
+        sse_events(request, user_channel(current_user.id), poll=poll),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @user_router.delete("/me/games/{game_id}", response_model=dict)
 async def delete_user_game(
     game_id: str,
@@ -99,6 +131,9 @@ async def delete_user_game(
                 detail="Failed to delete game"
             )
         
+        # 停止仍在进行、排队或预生成中的生成任务
+        await CancellationRegistry().cancel(game_id, "deleted")
+        
         # 如果存在运行时游戏，也标记为删除
         if game.runtime_id:
             await runtime_repo.update(game.runtime_id, {
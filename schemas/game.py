@@ -3,13 +3,22 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 from models.game import DBGame, GameStatus
 
+# 游戏状态 -> 返回给客户端的状态名
+STATUS_NAMES = {
+    GameStatus.QUEUED: "queued",
+    GameStatus.GENERATING: "generating",
+    GameStatus.PARKED: "parked",
+    GameStatus.COMPLETED: "published",
+    GameStatus.FAILED: "failed"
+}
+
 class GameListItemSchema(BaseModel):
     """游戏列表项响应模型"""
     id: str
     runtime_id: Optional[str] = None
     title: str
     cover_image: Optional[str] = None
-    status: str = Field(description="游戏状态: generating, published, failed")
+    status: str = Field(description="游戏状态: queued, generating, parked, published, failed")
     progress: float = Field(description="生成进度, 0-100", ge=0, le=100)
     current_chapter: int = Field(description="当前章节数")
     chapter_count: int = Field(description="章节数量")
@@ -20,19 +29,12 @@ class GameListItemSchema(BaseModel):
         """从数据库模型转换为响应模型"""
         progress = game.progress.progress
         
-        # 转换状态
-        status_map = {
-            GameStatus.GENERATING: "generating",
-            GameStatus.COMPLETED: "published",
-            GameStatus.FAILED: "failed"
-        }
-        
         return cls(
             id=str(game.id),
             runtime_id=str(game.runtime_id) if game.runtime_id else None,
             title=game.title,
             cover_image=game.settings.get("cover_image"),
-            status=status_map[game.status],
+            status=STATUS_NAMES[game.status],
             progress=progress,
             current_chapter=game.generate_chapter_index,
             chapter_count=len(game.chapters),
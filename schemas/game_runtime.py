@@ -34,6 +34,7 @@ class GameChapterSchema(BaseModel):
     title: str = Field(..., min_length=1, max_length=100, description="章节标题")
     branches: List[GameBranchSchema] = Field(default_factory=list, description="游戏分支列表")
     characters: List[GameCharacterImageSchema] = Field(default_factory=list, description="章节涉及的角色立绘")
+    is_playable: bool = Field(default=True, description="是否可游玩，为False时章节仍在生成中")
 
 class GameRuntimeSchema(BaseModel):
     """游戏运行时响应模型"""
@@ -111,7 +112,8 @@ class GameRuntimeSchema(BaseModel):
                     GameRuntimeSchema._convert_game_branch(branch)
                     for branch in chapter.branches
                 ],
-                characters=GameRuntimeSchema._convert_character_images(chapter.characters)
+                characters=GameRuntimeSchema._convert_character_images(chapter.characters),
+                is_playable=chapter.is_playable
             )
             return result
         except Exception as e:
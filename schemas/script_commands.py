@@ -1,7 +1,7 @@
 from enum import Enum
-from typing import List, Union, Optional, Dict, Any
+from typing import List, Union, Optional, Dict, Any, Annotated
 from dataclasses import dataclass, asdict
-from pydantic import BaseModel
+from pydantic import BaseModel, Discriminator, Tag
 
 class CommandType(str, Enum):
     """指令类型枚举"""
@@ -12,7 +12,10 @@ class CommandType(str, Enum):
     BG = "bg"
     BGM = "bgm"
 
-@dataclass
+# 指令类均使用 __slots__，长章节中大量指令对象不再携带 __dict__；
+# 子类的 __init__ 需显式调用 BaseCommand.__init__（slots 数据类不支持无参 super()）
+
+@dataclass(slots=True)
 class BaseCommand:
     """基础指令类"""
     type: CommandType
@@ -23,16 +26,16 @@ class BaseCommand:
         data['type'] = self.type.value
         return data
 
-@dataclass
+@dataclass(slots=True, init=False)
 class NarrationCommand(BaseCommand):
     """旁白指令"""
     text: str
 
     def __init__(self, text: str):
-        super().__init__(CommandType.NARRATION)
+        BaseCommand.__init__(self, CommandType.NARRATION)
         self.text = text
 
-@dataclass
+@dataclass(slots=True, init=False)
 class DialogueCommand(BaseCommand):
     """对话指令"""
     character: str
@@ -41,59 +44,79 @@ class DialogueCommand(BaseCommand):
     target: Optional[str] = None
 
     def __init__(self, character: str, emotion: str, text: str, target: Optional[str] = None):
-        super().__init__(CommandType.DIALOGUE)
+        BaseCommand.__init__(self, CommandType.DIALOGUE)
         self.character = character
         self.emotion = emotion
         self.text = text
         self.target = target
 
-@dataclass
+@dataclass(slots=True, init=False)
 class ChoiceCommand(BaseCommand):
     """选项指令"""
     text: str
     target: str
 
     def __init__(self, text: str, target: str):
-        super().__init__(CommandType.CHOICE)
+        BaseCommand.__init__(self, CommandType.CHOICE)
         self.text = text
         self.target = target
 
-@dataclass
+@dataclass(slots=True, init=False)
 class JumpCommand(BaseCommand):
     """跳转指令"""
     target: str
 
     def __init__(self, target: str):
-        super().__init__(CommandType.JUMP)
+        BaseCommand.__init__(self, CommandType.JUMP)
         self.target = target
 
-@dataclass
+@dataclass(slots=True, init=False)
 class BackgroundCommand(BaseCommand):
     """背景指令"""
     name: str
     prompt: str
 
     def __init__(self, name: str, prompt: str):
-        super().__init__(CommandType.BG)
+        BaseCommand.__init__(self, CommandType.BG)
         self.name = name
         self.prompt = prompt
 
-@dataclass
+@dataclass(slots=True, init=False)
 class BGMCommand(BaseCommand):
     """背景音乐指令"""
     name: str
     prompt: str
 
     def __init__(self, name: str, prompt: str):
-        super().__init__(CommandType.BGM)
+        BaseCommand.__init__(self, CommandType.BGM)
         self.name = name
         self.prompt = prompt
 
-@dataclass
+def _command_discriminator(value: Any) -> Optional[str]:
+    """根据 type 字段区分指令类型（bg 与 bgm 字段相同，必须按 type 区分）"""
+    command_type = value.get("type") if isinstance(value, dict) else getattr(value, "type", None)
+    if command_type is None:
+        return None
+    return CommandType(command_type).value
+
+# 类型别名
+Command = Annotated[
+    Union[
+        Annotated[NarrationCommand, Tag(CommandType.NARRATION.value)],
+        Annotated[DialogueCommand, Tag(CommandType.DIALOGUE.value)],
+        Annotated[ChoiceCommand, Tag(CommandType.CHOICE.value)],
+        Annotated[JumpCommand, Tag(CommandType.JUMP.value)],
+        Annotated[BackgroundCommand, Tag(CommandType.BG.value)],
+        Annotated[BGMCommand, Tag(CommandType.BGM.value)],
+    ],
+    Discriminator(_command_discriminator)
+]
+
+@dataclass(slots=True)
 class Branch:
     """分支数据类"""
     name: str
-    commands: List[Union[NarrationCommand, DialogueCommand, ChoiceCommand, JumpCommand, BackgroundCommand, BGMCommand]]
+    commands: List[Command]
 
     def model_dump(self) -> Dict[str, Any]:
         """转换为字典，用于MongoDB序列化"""
@@ -102,9 +125,6 @@ class Branch:
             "commands": [cmd.model_dump() for cmd in self.commands]
         }
 
-# 类型别名
-Command = Union[NarrationCommand, DialogueCommand, ChoiceCommand, JumpCommand, BackgroundCommand, BGMCommand]
-
 # 错误类定义
 class ScriptValidationError(Exception):
     """脚本验证基础错误类"""
@@ -0,0 +1,134 @@
+import argparse
+import random
+import sys
+import os
+import time
+import tracemalloc
+import logging
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.script_coder import parse_script, serialize_script
+from schemas.script_commands import ScriptValidationError
+
+# 解析错误行会输出大量警告，压测时关闭
+logging.disable(logging.WARNING)
+
+CHARACTERS = ["艾琳", "妮可", "小红", "小明", "利奥", "莎拉"]
+EMOTIONS = ["中性", "开心", "生气", "难过", "平静"]
+WORDS = ["黄昏", "咖啡馆", "雨夜", "街道", "我们", "必须", "决定", "风险", "秘密", "离开", "，", "。", "…"]
+GARBAGE = ["", "   ", "// 注释", "# 注释", '"""', "branch", "dialogue", "choice 缺少目标",
+           "bg", "jump", "dialogue 只有一个字段", "随便的一行文字", "\t\t", "bgm only_name",
+           "narration", "->", ",,,", "branch  ", "dialogue a, b, c -> d -> e"]
+
+
+def _sentence(rng: random.Random) -> str:
+    return "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+
+
+def generate_script(rng: random.Random, branch_count: int, commands_per_branch: int) -> str:
+    """生成一个合法的大型脚本"""
+    names = ["main"] + [f"branch_{i}" for i in range(branch_count - 2)] + ["end"]
+    lines = []
+    for index, name in enumerate(names):
+        lines.append(f"branch {name}")
+        lines.append(f"bg scene_{index} cinematic scene {index}, soft lighting")
+        if index % 3 == 0:
+            lines.append(f"bgm theme_{index} calm piano, strings, slow tempo")
+        for _ in range(commands_per_branch):
+            if rng.random() < 0.4:
+                lines.append(f"narration {_sentence(rng)}")
+            else:
+                line = f"dialogue {rng.choice(CHARACTERS)}, {rng.choice(EMOTIONS)}, {_sentence(rng)}"
+                if rng.random() < 0.3:
+                    line += f" -> {rng.choice(CHARACTERS)}"
+                lines.append(line)
+        if name == "end":
+            continue
+        targets = rng.sample(names[index + 1:], min(2, len(names) - index - 1))
+        if len(targets) > 1:
+            for target in targets:
+                lines.append(f"choice {_sentence(rng)}, {target}")
+        else:
+            lines.append(f"jump {targets[0]}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def mutate_script(rng: random.Random, script: str) -> str:
+    """对脚本做随机变异：插入垃圾行、截断行、打乱字符"""
+    lines = script.split("\n")
+    for _ in range(rng.randint(1, max(1, len(lines) // 10))):
+        position = rng.randrange(len(lines) + 1)
+        operation = rng.random()
+        if operation < 0.4:
+            lines.insert(position, rng.choice(GARBAGE))
+        elif operation < 0.7 and position < len(lines):
+            lines[position] = lines[position][:rng.randint(0, len(lines[position]))]
+        elif position < len(lines) and lines[position]:
+            chars = list(lines[position])
+            chars[rng.randrange(len(chars))] = rng.choice([",", "#", "/", "-", ">", " ", "\r", "　"])
+            lines[position] = "".join(chars)
+    return "\n".join(lines)
+
+
+def run_benchmark(rng: random.Random, branch_count: int, commands_per_branch: int, rounds: int) -> None:
+    script = generate_script(rng, branch_count, commands_per_branch)
+    line_count = script.count("\n") + 1
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        branches = parse_script(script)
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    branches = parse_script(script)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    command_count = sum(len(branch.commands) for branch in branches)
+
+    print(f"脚本行数: {line_count}, 分支数: {len(branches)}, 指令数: {command_count}")
+    print(f"平均解析耗时: {elapsed * 1000:.2f} ms ({line_count / elapsed:,.0f} 行/秒)")
+    print(f"解析结果内存: {current / 1024:.1f} KiB ({current / max(command_count, 1):.0f} B/指令)")
+
+
+def run_fuzz(rng: random.Random, iterations: int) -> int:
+    """模糊测试：变异脚本不得抛出非 ScriptValidationError 异常，合法脚本必须可往返序列化"""
+    failures = 0
+    for iteration in range(iterations):
+        script = generate_script(rng, rng.randint(2, 12), rng.randint(1, 30))
+
+        branches = parse_script(script)
+        if parse_script(serialize_script(branches)) != branches:
+            failures += 1
+            print(f"[{iteration}] 往返序列化结果不一致")
+
+        mutated = mutate_script(rng, script)
+        errors = []
+        try:
+            parse_script(mutated, errors)
+        except ScriptValidationError as e:
+            failures += 1
+            print(f"[{iteration}] 变异脚本导致整章解析失败: {str(e)}")
+    print(f"模糊测试完成: {iterations} 轮, 失败 {failures} 轮")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="脚本解析器压测与模糊测试")
+    parser.add_argument("--branches", type=int, default=200, help="压测脚本分支数")
+    parser.add_argument("--commands", type=int, default=100, help="每个分支的指令数")
+    parser.add_argument("--rounds", type=int, default=5, help="压测轮数")
+    parser.add_argument("--fuzz", type=int, default=500, help="模糊测试轮数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    run_benchmark(rng, args.branches, args.commands, args.rounds)
+    failures = run_fuzz(rng, args.fuzz)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
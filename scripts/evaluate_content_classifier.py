@@ -0,0 +1,117 @@
+"""
+内容类型本地分类器的离线评估
+
+输入为 JSONL，每行 {"text": "...", "label": "想法|小说|无意义"}。没有 label 的样本可加 --llm
+用线上同样的提示词请求大模型标注（--save 保存标注结果，之后的评估不再调用大模型）：
+
+    python scripts/evaluate_content_classifier.py samples.jsonl --llm --save labeled.jsonl
+    python scripts/evaluate_content_classifier.py labeled.jsonl
+
+输出各置信度阈值下本地直接分类的覆盖率、与大模型标注的一致率，以及混淆矩阵。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.content_classifier import ContentClassifier, ContentLabel, extract_features, score
+from utils.text import TextUtils
+
+LABELS = [label.value for label in ContentLabel]
+THRESHOLDS = (0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99)
+
+
+async def label_with_llm(samples: List[Dict], concurrency: int) -> None:
+    """为缺少标注的样本请求大模型分类"""
+    from utils.llm_tool import LLMTool
+
+    llm_tool = LLMTool()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def label(sample: Dict) -> None:
+        async with semaphore:
+            result = await llm_tool.generate(
+                system_prompt="analyze_content_types_system",
+                user_prompt="analyze_content_types_user",
+                prompt_replacements={"content": TextUtils.truncate_by_complete_lines(sample["text"], 5000)}
+            )
+            sample["label"] = result.split("分类结果:")[-1].strip()
+
+    await asyncio.gather(*[label(sample) for sample in samples if not sample.get("label")])
+
+
+def predict(text: str):
+    """返回本地分类的标签、概率（必须交给大模型的样本为0，任何阈值下都不计入覆盖）与耗时（微秒）"""
+    started = time.perf_counter()
+    classification = ContentClassifier().classify(TextUtils.truncate_by_complete_lines(text, 5000))
+    confidence = 0.0 if classification.llm_required else classification.confidence
+    return classification.label.value, confidence, (time.perf_counter() - started) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评估内容类型本地分类器与大模型分类的一致性")
+    parser.add_argument("input", help="JSONL 样本文件")
+    parser.add_argument("--llm", action="store_true", help="用大模型标注缺少 label 的样本")
+    parser.add_argument("--save", help="保存带标注的样本")
+    parser.add_argument("--concurrency", type=int, default=4, help="大模型标注并发数")
+    parser.add_argument("--show-errors", type=int, default=10, help="打印置信且不一致的样本数")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    if args.llm:
+        asyncio.run(label_with_llm(samples, args.concurrency))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            for sample in samples:
+                f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+
+    samples = [sample for sample in samples if sample.get("label") in LABELS]
+    if not samples:
+        print("没有带有效标注的样本")
+        return
+
+    results = []
+    for sample in samples:
+        label, confidence, micros = predict(sample["text"])
+        results.append((sample, label, confidence, micros))
+
+    print(f"样本 {len(samples)} 条，标注分布 {dict(Counter(sample['label'] for sample in samples))}")
+    print(f"本地分类平均耗时 {sum(r[3] for r in results) / len(results):.0f} 微秒")
+    print("\n阈值    覆盖率   一致率（覆盖部分）")
+    for threshold in THRESHOLDS:
+        covered = [r for r in results if r[2] >= threshold]
+        agreed = sum(1 for sample, label, _, _ in covered if label == sample["label"])
+        agreement = agreed / len(covered) if covered else 0.0
+        print(f"{threshold:<7} {len(covered) / len(results):>6.1%}   {agreement:>6.1%} ({agreed}/{len(covered)})")
+
+    print("\n混淆矩阵（行为标注，列为本地分类，不计置信度）")
+    matrix = Counter((sample["label"], label) for sample, label, _, _ in results)
+    print("        " + "".join(f"{label:>6}" for label in LABELS))
+    for expected in LABELS:
+        print(f"{expected:<6}" + "".join(f"{matrix[(expected, label)]:>8}" for label in LABELS))
+
+    errors = [r for r in results if r[1] != r[0]["label"]]
+    errors.sort(key=lambda r: -r[2])
+    if errors and args.show_errors:
+        print(f"\n最置信的不一致样本（前 {args.show_errors} 条）")
+        for sample, label, confidence, _ in errors[:args.show_errors]:
+            scores = score(extract_features(sample["text"]))
+            print(
+                f"- 标注 {sample['label']} / 本地 {label} ({confidence:.2f}) "
+                f"得分 { {key.value: round(value, 2) for key, value in scores.items()} }: "
+                f"{sample['text'][:40]!r}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+服务商故障注入服务
+
+模拟 TTS（/infer_single）与文生图（/v1/jobs）接口，可按比例返回错误、增加延迟或挂起，
+用于在本地验证熔断器、重试与游戏暂停。
+
+启动服务，并将 TTS_API_URL / IMAGE_API_URL 指向它：
+    python scripts/fault_server.py serve --port 8900 --error-rate 0.3
+    TTS_API_URL=http://127.0.0.1:8900/infer_single IMAGE_API_URL=http://127.0.0.1:8900
+
+运行中调整故障：
+    curl -X POST 127.0.0.1:8900/fault -H 'Content-Type: application/json' -d '{"error_rate": 1.0}'
+
+在进程内启动服务并驱动 TTS 熔断器，打印状态变化：
+    python scripts/fault_server.py drive --outage-start 5 --outage-end 15
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Fault(BaseModel):
+    """当前注入的故障"""
+    error_rate: float = 0.0  # 返回 503 的概率
+    latency: float = 0.05  # 每次请求的平均延迟（秒）
+    hang: bool = False  # 请求挂起直到客户端超时
+
+
+fault = Fault()
+rng = random.Random()
+app = FastAPI(title="Provider fault injection")
+jobs = {}
+
+
+async def _inject() -> None:
+    if fault.hang:
+        await asyncio.sleep(3600)
+    await asyncio.sleep(rng.expovariate(1 / fault.latency) if fault.latency > 0 else 0)
+    if rng.random() < fault.error_rate:
+        raise HTTPException(status_code=503, detail="injected fault")
+
+
+@app.get("/fault", response_model=Fault)
+async def get_fault():
+    return fault
+
+
+@app.post("/fault", response_model=Fault)
+async def set_fault(update: dict):
+    global fault
+    fault = fault.model_copy(update=update)
+    return fault
+
+
+@app.post("/infer_single")
+async def infer_single(payload: dict):
+    await _inject()
+    return {"audio_url": f"https://example.com/tts/{uuid.uuid4()}.wav", "msg": "ok"}
+
+
+@app.post("/v1/jobs")
+async def create_job(payload: dict):
+    await _inject()
+    job_id = uuid.uuid4().hex
+    jobs[job_id] = time.monotonic()
+    return {"job": {"id": job_id, "status": "CREATED"}}
+
+
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str):
+    await _inject()
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="job not found")
+    return {
+        "job": {
+            "id": job_id,
+            "status": "SUCCESS",
+            "successInfo": {"images": [{"url": f"https://example.com/image/{job_id}.png"}]},
+        }
+    }
+
+
+async def drive(args: argparse.Namespace) -> None:
+    from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, call_provider
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/infer_single"
+    breaker = CircuitBreaker("tts")
+    counts = {"ok": 0, "error": 0, "rejected": 0}
+    last_state: Optional[str] = None
+    started = time.monotonic()
+
+    async with httpx.AsyncClient() as client:
+        async def request() -> dict:
+            resp = await client.post(url, json={"text": "你好"}, timeout=args.timeout)
+            resp.raise_for_status()
+            return resp.json()
+
+        async def call() -> None:
+            try:
+                await call_provider("tts", request)
+                counts["ok"] += 1
+            except CircuitOpenError:
+                counts["rejected"] += 1
+            except Exception:
+                counts["error"] += 1
+
+        while (elapsed := time.monotonic() - started) < args.duration:
+            fault.error_rate = 1.0 if args.outage_start <= elapsed < args.outage_end else args.error_rate
+            await asyncio.gather(*[call() for _ in range(args.concurrency)])
+            state = breaker.state.value
+            if state != last_state:
+                print(f"{elapsed:6.1f}s  熔断器 {last_state} -> {state}  累计 {counts}")
+                last_state = state
+            await asyncio.sleep(args.interval)
+
+    print(f"结束: {counts}，熔断器状态 {breaker.stats()}")
+    server.should_exit = True
+    await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务商故障注入服务")
+    parser.add_argument("mode", choices=("serve", "drive"), help="serve: 启动服务；drive: 进程内启动服务并驱动熔断器")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--latency", type=float, default=0.05, help="平均延迟（秒）")
+    parser.add_argument("--hang", action="store_true", help="请求挂起直到客户端超时")
+    parser.add_argument("--duration", type=float, default=60.0, help="drive: 运行时长（秒）")
+    parser.add_argument("--outage-start", type=float, default=5.0, help="drive: 故障开始时间（秒）")
+    parser.add_argument("--outage-end", type=float, default=15.0, help="drive: 故障结束时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=4, help="drive: 每轮并发调用数")
+    parser.add_argument("--interval", type=float, default=0.2, help="drive: 每轮间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=5.0, help="drive: 单次调用超时（秒）")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    global fault
+    fault = Fault(error_rate=args.error_rate, latency=args.latency, hang=args.hang)
+    rng.seed(args.seed)
+
+    if args.mode == "serve":
+        uvicorn.run(app, host="127.0.0.1", port=args.port)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+        asyncio.run(drive(args))
+
+
+if __name__ == "__main__":
+    main()
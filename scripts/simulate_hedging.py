@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 模拟耗时按毫秒计，去掉对冲阈值下限
+os.environ["TTS_HEDGING_ENABLED"] = "true"
+os.environ["HEDGE_MIN_DELAY_SECONDS"] = "0"
+
+from utils.hedging import Hedger
+
+logging.disable(logging.WARNING)
+
+
+class HeavyTailProvider:
+    """耗时呈重尾分布的模拟 TTS 服务商：大部分请求较快，少量请求很慢"""
+
+    def __init__(self, rng: random.Random, latency: float, slow_rate: float, slow_factor: float):
+        self.rng = rng
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.calls = 0
+
+    async def call(self) -> str:
+        self.calls += 1
+        latency = self.rng.lognormvariate(0, 0.3) * self.latency
+        if self.rng.random() < self.slow_rate:
+            latency *= self.slow_factor
+        await asyncio.sleep(latency)
+        return "ok"
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def simulate(hedge: bool, args: argparse.Namespace):
+    provider = HeavyTailProvider(random.Random(args.seed), args.latency, args.slow_rate, args.slow_factor)
+    Hedger._registry.clear()
+    hedger = Hedger("tts")
+
+    async def line() -> None:
+        if hedge:
+            await hedger.run(provider.call)
+        else:
+            await provider.call()
+
+    async def stage() -> float:
+        started = time.monotonic()
+        await asyncio.gather(*[line() for _ in range(args.lines)])
+        return time.monotonic() - started
+
+    # 每章的对话并发合成，章节耗时取决于最慢的一句
+    durations = []
+    for _ in range(args.chapters):
+        durations.append(await stage())
+    return durations, provider.calls, hedger.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟重尾耗时下，对冲请求对 TTS 阶段耗时的影响")
+    parser.add_argument("--chapters", type=int, default=500, help="章节数（每章一次阶段执行）")
+    parser.add_argument("--lines", type=int, default=20, help="每章的对话数")
+    parser.add_argument("--latency", type=float, default=0.02, help="正常请求的平均耗时（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="慢请求的比例")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="慢请求的耗时倍数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    requests = args.chapters * args.lines
+    for label, hedge in (("不对冲", False), ("对冲", True)):
+        durations, calls, stats = asyncio.run(simulate(hedge, args))
+        print(
+            f"[{label}] 阶段耗时 p50 {percentile(durations, 0.5):.3f}s "
+            f"p95 {percentile(durations, 0.95):.3f}s p99 {percentile(durations, 0.99):.3f}s，"
+            f"服务商调用 {calls} 次（额外 {calls - requests}，{(calls - requests) / requests:.1%}）"
+            + (f"，对冲阈值 {stats['threshold_seconds']}s，对冲胜出 {stats['hedge_wins']} 次" if hedge else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
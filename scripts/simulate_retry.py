@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.retry import RetryableError, RetryError, retry_async
+
+# 重试日志在模拟中过多，关闭
+logging.disable(logging.WARNING)
+
+
+class FlakyProvider:
+    """按给定概率返回暂时性错误的模拟服务商"""
+
+    def __init__(self, rng: random.Random, failure_rate: float, latency: float):
+        self.rng = rng
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.rng.expovariate(1 / self.latency))
+        if self.rng.random() < self.failure_rate:
+            raise RetryableError("provider unavailable")
+        return "ok"
+
+
+async def _run_game(provider: FlakyProvider, items: int, attempts: int, base_delay: float) -> int:
+    """一局游戏的某个媒体阶段，返回最终失败的条目数"""
+    async def item() -> bool:
+        try:
+            await retry_async(provider.call, name="simulation", max_attempts=attempts, base_delay=base_delay, max_delay=base_delay * 8)
+            return True
+        except RetryError:
+            return False
+
+    results = await asyncio.gather(*[item() for _ in range(items)])
+    return len(results) - sum(results)
+
+
+async def simulate(attempts: int, args: argparse.Namespace):
+    provider = FlakyProvider(random.Random(args.seed), args.failure_rate, args.latency)
+    started = time.monotonic()
+    rounds = 0
+    # 每局剩余的条目数；有失败条目的游戏需要用户重新生成，重新生成只提交失败条目
+    pending = [args.items] * args.games
+    completed_first_pass = None
+    while pending and rounds < args.max_rounds:
+        failures = await asyncio.gather(*[
+            _run_game(provider, items, attempts, args.base_delay) for items in pending
+        ])
+        if completed_first_pass is None:
+            completed_first_pass = sum(1 for failed in failures if not failed)
+        pending = [failed for failed in failures if failed]
+        rounds += 1
+    return {
+        "first_pass": completed_first_pass or 0,
+        "rounds": rounds,
+        "unfinished": len(pending),
+        "calls": provider.calls,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟服务商暂时性错误下，条目级重试对媒体阶段完成率的影响")
+    parser.add_argument("--games", type=int, default=50, help="游戏数")
+    parser.add_argument("--items", type=int, default=30, help="每局的媒体条目数")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="单次调用的暂时性错误概率")
+    parser.add_argument("--latency", type=float, default=0.005, help="单次调用平均耗时（秒）")
+    parser.add_argument("--attempts", type=int, default=3, help="条目级重试的最多尝试次数")
+    parser.add_argument("--base-delay", type=float, default=0.005, help="首次重试的最长等待（秒）")
+    parser.add_argument("--max-rounds", type=int, default=20, help="整局重新生成的最多轮数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for label, attempts in (("不重试", 1), (f"条目重试 x{args.attempts}", args.attempts)):
+        result = asyncio.run(simulate(attempts, args))
+        print(
+            f"[{label}] 首轮完成 {result['first_pass']}/{args.games} 局，"
+            f"全部完成需 {result['rounds']} 轮（未完成 {result['unfinished']}），"
+            f"服务商调用 {result['calls']} 次，耗时 {result['seconds']:.2f} 秒"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scheduler import FairScheduler, Priority, set_job_context, set_priority
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def _provider_call(scheduler: FairScheduler, rng: random.Random, service_time: float) -> None:
+    """模拟一次服务商调用，耗时服从指数分布"""
+    async with scheduler.slot():
+        await asyncio.sleep(rng.expovariate(1 / service_time))
+
+
+async def _generate_game(
+    scheduler: FairScheduler,
+    rng: random.Random,
+    user_id: str,
+    chapters: int,
+    calls_per_chapter: int,
+    service_time: float,
+    delay: float,
+    results: Dict[str, List[float]]
+) -> None:
+    """
+    模拟一局游戏生成：章节依次生成，章节内的调用并发发出；
+    首章完成即记录可玩时间，最后补充背景音乐
+    """
+    await asyncio.sleep(delay)
+    started = time.monotonic()
+    set_job_context(user_id, f"{user_id}-game", Priority.FIRST_CHAPTER)
+    for chapter in range(chapters):
+        await asyncio.gather(*[
+            _provider_call(scheduler, rng, service_time) for _ in range(calls_per_chapter)
+        ])
+        if chapter == 0:
+            results.setdefault(user_id, []).append(time.monotonic() - started)
+            set_priority(Priority.NEXT_CHAPTER)
+    set_priority(Priority.BACKFILL)
+    await asyncio.gather(*[_provider_call(scheduler, rng, service_time) for _ in range(chapters)])
+
+
+async def simulate(policy: str, args: argparse.Namespace) -> Dict[str, List[float]]:
+    rng = random.Random(args.seed)
+    scheduler = FairScheduler(f"simulation_{policy}", concurrency=args.concurrency, policy=policy)
+    results: Dict[str, List[float]] = {}
+    jobs = []
+    # 少数重度用户在开始时提交长篇小说
+    for index in range(args.heavy_users):
+        user_id = f"heavy_{index}"
+        for _ in range(args.heavy_games):
+            jobs.append(_generate_game(
+                scheduler, rng, user_id, args.heavy_chapters, args.calls_per_chapter,
+                args.service_time, rng.uniform(0, args.service_time), results
+            ))
+    # 大量普通用户陆续到达，各提交一个短篇
+    for index in range(args.light_users):
+        jobs.append(_generate_game(
+            scheduler, rng, f"light_{index}", args.light_chapters, args.calls_per_chapter,
+            args.service_time, rng.uniform(0, args.arrival_window), results
+        ))
+    await asyncio.gather(*jobs)
+    return results
+
+
+def _report(policy: str, results: Dict[str, List[float]]) -> None:
+    light = [value for user, values in results.items() if user.startswith("light") for value in values]
+    heavy = [value for user, values in results.items() if user.startswith("heavy") for value in values]
+    print(f"\n[{policy}] 首章可玩时间（秒）")
+    for label, values in (("普通用户", light), ("重度用户", heavy)):
+        print(
+            f"  {label}: n={len(values):4d}  p50={_percentile(values, 50):7.3f}  "
+            f"p95={_percentile(values, 95):7.3f}  max={max(values, default=0.0):7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务商调度模拟：对比先到先得与按优先级公平排队的首章可玩时间")
+    parser.add_argument("--concurrency", type=int, default=4, help="服务商并发槽位数")
+    parser.add_argument("--service-time", type=float, default=0.01, help="单次调用平均耗时（秒）")
+    parser.add_argument("--calls-per-chapter", type=int, default=8, help="每章的服务商调用数")
+    parser.add_argument("--heavy-users", type=int, default=2, help="重度用户数")
+    parser.add_argument("--heavy-games", type=int, default=2, help="每个重度用户提交的游戏数")
+    parser.add_argument("--heavy-chapters", type=int, default=30, help="重度用户每局的章节数")
+    parser.add_argument("--light-users", type=int, default=50, help="普通用户数")
+    parser.add_argument("--light-chapters", type=int, default=3, help="普通用户每局的章节数")
+    parser.add_argument("--arrival-window", type=float, default=2.0, help="普通用户到达的时间窗口（秒）")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--policy", choices=["fifo", "fair", "both"], default="both")
+    args = parser.parse_args()
+
+    policies = ["fifo", "fair"] if args.policy == "both" else [args.policy]
+    for policy in policies:
+        results = asyncio.run(simulate(policy, args))
+        _report(policy, results)
+
+
+if __name__ == "__main__":
+    main()
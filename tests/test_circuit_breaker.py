@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = SimpleNamespace(
+        CIRCUIT_WINDOW_SECONDS=60.0,
+        CIRCUIT_MIN_CALLS=4,
+        CIRCUIT_ERROR_RATE_THRESHOLD=0.5,
+        CIRCUIT_SLOW_CALL_RATE_THRESHOLD=0.8,
+        CIRCUIT_IMAGE_SLOW_CALL_SECONDS=60.0,
+        CIRCUIT_TTS_SLOW_CALL_SECONDS=60.0,
+        CIRCUIT_MUSIC_SLOW_CALL_SECONDS=60.0,
+        CIRCUIT_OPEN_SECONDS=30.0,
+        CIRCUIT_HALF_OPEN_PROBES=1,
+    )
+    monkeypatch.setattr(circuit_breaker, "get_settings", lambda: settings)
+    return settings
+
+
+def new_breaker(name):
+    CircuitBreaker._registry.pop(name, None)
+    return CircuitBreaker(name)
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise RuntimeError("服务商故障")
+
+
+async def trip(breaker):
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            await breaker.run(fail)
+
+
+def test_opens_half_opens_and_closes(settings):
+    breaker = new_breaker("test-cycle")
+    closed = []
+    breaker.add_listener(closed.append)
+
+    async def run():
+        await trip(breaker)
+        assert breaker.state == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.run(succeed)
+
+        # 打开时间已满
+        breaker._opened_at -= settings.CIRCUIT_OPEN_SECONDS
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert await breaker.run(succeed) == "ok"
+
+    asyncio.run(run())
+    assert breaker.state == CircuitState.CLOSED
+    assert closed == ["test-cycle"]
+    assert breaker.stats()["opened"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_failed_probe_reopens(settings):
+    breaker = new_breaker("test-reopen")
+
+    async def run():
+        await trip(breaker)
+        breaker._opened_at -= settings.CIRCUIT_OPEN_SECONDS
+        with pytest.raises(RuntimeError):
+            await breaker.run(fail)
+
+    asyncio.run(run())
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.stats()["opened"] == 2
+
+
+def test_cancelled_probe_returns_its_slot(settings):
+    breaker = new_breaker("test-probe-cancel")
+
+    async def run():
+        await trip(breaker)
+        breaker._opened_at -= settings.CIRCUIT_OPEN_SECONDS
+
+        probe_started = asyncio.Event()
+
+        async def hang():
+            probe_started.set()
+            await asyncio.sleep(60)
+
+        probe = asyncio.create_task(breaker.run(hang))
+        await probe_started.wait()
+        # 探测名额已被占用
+        with pytest.raises(CircuitOpenError):
+            await breaker.run(succeed)
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert await breaker.run(succeed) == "ok"
+
+    asyncio.run(run())
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_rate_limited_calls_do_not_open(settings):
+    breaker = new_breaker("test-429")
+    request = httpx.Request("POST", "https://provider.example/api")
+
+    async def throttled():
+        response = httpx.Response(429, request=request)
+        raise httpx.HTTPStatusError("限流", request=request, response=response)
+
+    async def run():
+        for _ in range(4):
+            with pytest.raises(httpx.HTTPStatusError):
+                await breaker.run(throttled)
+
+    asyncio.run(run())
+    assert breaker.state == CircuitState.CLOSED
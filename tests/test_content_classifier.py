@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+import utils.content_classifier as content_classifier
+from utils.content_classifier import ContentClassifier, ContentLabel
+
+ENGLISH_PROSE = (
+    "It was the best of times, it was the worst of times, it was the age of wisdom, "
+    "it was the age of foolishness, it was the epoch of belief, it was the epoch of incredulity, "
+    "it was the season of Light, it was the season of Darkness, it was the spring of hope, "
+    "it was the winter of despair, we had everything before us, we had nothing before us."
+)
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    settings = SimpleNamespace(
+        CONTENT_CLASSIFIER_ENABLED=True,
+        CONTENT_CLASSIFIER_CONFIDENCE=0.9,
+        CONTENT_CLASSIFIER_MAX_CHARS=5000,
+    )
+    monkeypatch.setattr(content_classifier, "get_settings", lambda: settings)
+    return ContentClassifier()
+
+
+def test_english_prose_is_left_to_the_llm(classifier):
+    result = classifier.classify(ENGLISH_PROSE)
+    assert not (result.confident and result.label == ContentLabel.MEANINGLESS)
+    assert result.probabilities[ContentLabel.MEANINGLESS.value] < 0.9
+
+
+def test_latin_gibberish_is_never_rejected_locally(classifier):
+    result = classifier.classify("asdf " * 40)
+    assert not (result.confident and result.label == ContentLabel.MEANINGLESS)
+    if result.label == ContentLabel.MEANINGLESS:
+        assert result.llm_required
+
+
+def test_repeated_chinese_text_is_meaningless(classifier):
+    result = classifier.classify("哈" * 200)
+    assert result.label == ContentLabel.MEANINGLESS
+    assert not result.llm_required
+
+
+def test_chinese_narrative_is_novel(classifier):
+    result = classifier.classify("他推开门，低声说道：“你来了。”她点了点头，眼中含着泪水。" * 5)
+    assert result.label == ContentLabel.NOVEL
+    assert result.confident
+
+
+def test_chinese_idea_is_idea(classifier):
+    result = classifier.classify("我想写一个关于穿越到古代的故事，主角是一个程序员")
+    assert result.label == ContentLabel.IDEA
+    assert result.confident
@@ -0,0 +1,51 @@
+from models.game import DBGame, derive_legacy_playable
+
+
+def chapter(index, generation_status, **fields):
+    return {
+        "index": index,
+        "summary": "",
+        "content": "",
+        "chapter_start_line": 0,
+        "chapter_end_line": 1,
+        "generation_status": generation_status,
+        **fields,
+    }
+
+
+def game(status, chapters, generate_chapter_index=2):
+    return {
+        "input_text": "",
+        "user_id": "0123456789abcdef01234567",
+        "user_info": {"name": "user"},
+        "title": "",
+        "novel_text": "",
+        "status": status,
+        "generate_chapter_index": generate_chapter_index,
+        "chapters": chapters,
+    }
+
+
+def test_completed_legacy_game_chapters_are_playable():
+    loaded = DBGame.model_validate(game("completed", [
+        chapter(0, "bgm_generated"),
+        chapter(1, "bgm_generated"),
+        chapter(2, "script_generated"),
+    ]))
+    assert [c.is_playable for c in loaded.chapters] == [True, True, False]
+
+
+def test_stored_flag_and_unfinished_games_are_left_alone():
+    loaded = DBGame.model_validate(game("completed", [chapter(0, "bgm_generated", is_playable=False)]))
+    assert not loaded.chapters[0].is_playable
+    loaded = DBGame.model_validate(game("generating", [chapter(0, "bgm_generated")]))
+    assert not loaded.chapters[0].is_playable
+
+
+def test_progress_projection_is_derived():
+    doc = derive_legacy_playable({
+        "status": "completed",
+        "generate_chapter_index": 1,
+        "chapters": [{"index": 0, "generation_status": "bgm_generated"}],
+    })
+    assert doc["chapters"][0]["is_playable"] is True
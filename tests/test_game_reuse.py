@@ -0,0 +1,90 @@
+from models.db_runtime_game import DBRuntimeGame
+from models.game import (
+    Character,
+    ChapterGenerationStatus,
+    DBGame,
+    GameChapter,
+    GameStatus,
+    StoryCharacterInfo,
+    UserInfo,
+)
+from schemas.script_commands import Branch, NarrationCommand
+from utils.game_reuse import GameReuse
+from utils.progress_bus import progress_event
+
+SOURCE_USER_ID = "0123456789abcdef01234567"
+CLONE_USER_ID = "76543210fedcba9876543210"
+
+
+def completed_source(chapter_count=3):
+    return DBGame(
+        user_id=SOURCE_USER_ID,
+        user_info=UserInfo(name="source"),
+        title="来源",
+        input_text="小说",
+        novel_text="小说",
+        status=GameStatus.COMPLETED,
+        generate_chapter_index=chapter_count,
+        story_character_info=StoryCharacterInfo(tags=[], characters=[
+            Character(name="小明", gender="男", is_protagonist=True, voice_match="", image_prompt=""),
+        ]),
+        chapters=[
+            GameChapter(
+                index=index,
+                summary="",
+                content="",
+                chapter_start_line=index * 10,
+                chapter_end_line=index * 10 + 10,
+                branches=[Branch("main", [NarrationCommand(f"第{index + 1}章")])],
+                generation_status=ChapterGenerationStatus.BGM_GENERATED,
+                is_playable=True,
+            )
+            for index in range(chapter_count)
+        ],
+        total_chapters=chapter_count,
+    )
+
+
+def clone(source):
+    return GameReuse().clone(
+        source,
+        user_id=CLONE_USER_ID,
+        user_info=UserInfo(name="clone"),
+        title="复用",
+        input_text="小说",
+        novel_text="小说",
+    )
+
+
+def test_clone_only_opens_the_first_chapter():
+    source = completed_source()
+    game = clone(source)
+
+    assert game.id != source.id
+    assert game.cloned_from == source.id
+    assert game.status == GameStatus.GENERATING
+    assert game.generate_chapter_index == 1
+    # 脚本与资源都已复制，开放后续章节时无需重新生成
+    assert len(game.chapters) == 3
+
+    runtime = DBRuntimeGame.convert_to_runtime_game(game)
+    assert [chapter.index for chapter in runtime.chapters] == [0]
+    assert runtime.chapters[0].is_playable
+
+
+def test_clone_progress_does_not_report_unopened_chapters():
+    game = clone(completed_source())
+
+    event = progress_event(game.model_dump(include={"chapters", "generate_chapter_index"}))
+
+    assert event["playable_chapters"] == [0]
+    assert event["current_chapter"] == 1
+
+
+def test_clone_does_not_share_state_with_source():
+    source = completed_source()
+    game = clone(source)
+
+    game.chapters[0].branches[0].commands.append(NarrationCommand("改动"))
+
+    assert len(source.chapters[0].branches[0].commands) == 1
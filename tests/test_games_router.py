@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from models.game import GameStatus
+from routers.games import _generate_next_chapter, _regenerate_game
+
+GAME_ID = "0123456789abcdef01234567"
+
+
+class GameRepository:
+    def __init__(self, game=None):
+        self.game = game
+
+    async def get(self, id):
+        return self.game
+
+
+def user(user_id="user"):
+    return SimpleNamespace(id=user_id)
+
+
+@pytest.mark.parametrize("handler", [
+    lambda game_id, game: _regenerate_game(game_id, user(), GameRepository(game), None),
+    lambda game_id, game: _generate_next_chapter(game_id, user(), GameRepository(game), None, None),
+])
+@pytest.mark.parametrize("game_id, game, status_code", [
+    ("not-an-id", None, 400),
+    (GAME_ID, None, 404),
+    (GAME_ID, SimpleNamespace(user_id="other", status=GameStatus.FAILED), 403),
+])
+def test_client_errors_are_not_turned_into_server_errors(handler, game_id, game, status_code):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(handler(game_id, game))
+    assert raised.value.status_code == status_code
+
+
+def test_wrong_state_is_a_client_error():
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(_regenerate_game(GAME_ID, user(), GameRepository(SimpleNamespace(user_id="user", status=GameStatus.COMPLETED)), None))
+    assert raised.value.status_code == 400
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(_generate_next_chapter(GAME_ID, user(), GameRepository(SimpleNamespace(user_id="user", status=GameStatus.FAILED)), None, None))
+    assert raised.value.status_code == 400
@@ -0,0 +1,184 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils.generation_lock as generation_lock
+from utils.generation_lock import GenerationLocks
+
+
+class InMemoryLockRepository:
+    """按 GenerationLockRepository 的语义在内存中保存锁，每次操作让出一次事件循环"""
+
+    def __init__(self, available: bool = True):
+        self.available = available
+        self.owners = {}
+        self.preemptible = set()
+        self.preempt_requested = set()
+        self.cancel_reasons = {}
+
+    async def acquire(self, game_id, owner, ttl_seconds, preemptible=False):
+        await asyncio.sleep(0)
+        if not self.available:
+            return None
+        if game_id in self.owners:
+            return False
+        self.owners[game_id] = owner
+        self.preempt_requested.discard(game_id)
+        if preemptible:
+            self.preemptible.add(game_id)
+        else:
+            self.preemptible.discard(game_id)
+        return True
+
+    async def renew(self, game_id, owner, ttl_seconds):
+        await asyncio.sleep(0)
+        if self.owners.get(game_id) != owner or game_id in self.preempt_requested:
+            return None
+        return {"cancel_reason": self.cancel_reasons.get(game_id)}
+
+    async def request_preempt(self, game_id, grace_seconds):
+        await asyncio.sleep(0)
+        if game_id in self.owners and game_id in self.preemptible:
+            self.preempt_requested.add(game_id)
+            return True
+        return False
+
+    async def release(self, game_id, owner):
+        await asyncio.sleep(0)
+        if self.owners.get(game_id) == owner:
+            del self.owners[game_id]
+            self.cancel_reasons.pop(game_id, None)
+            return True
+        return False
+
+    async def is_locked(self, game_id):
+        return game_id in self.owners
+
+
+@pytest.fixture
+def locks(monkeypatch):
+    settings = SimpleNamespace(
+        GENERATION_LOCK_TTL_SECONDS=0.03,
+        GENERATION_LOCK_PREEMPT_CHECK_SECONDS=0.01,
+        GENERATION_LOCK_PREEMPT_WAIT_SECONDS=2.0,
+    )
+    monkeypatch.setattr(generation_lock, "get_settings", lambda: settings)
+    monkeypatch.setattr(GenerationLocks, "_instance", None)
+    instance = GenerationLocks()
+    instance._repository = InMemoryLockRepository()
+    return instance
+
+
+def test_sequential_acquire_is_not_reentrant(locks):
+    async def run():
+        first = await locks.acquire("game")
+        second = await locks.acquire("game")
+        await locks.release("game", first)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert (first is not None, second is not None) == (True, False)
+
+
+def test_concurrent_acquire_only_one_wins(locks):
+    async def run():
+        tokens = await asyncio.gather(locks.acquire("game"), locks.acquire("game"))
+        for token in tokens:
+            await locks.release("game", token)
+        return tokens
+
+    tokens = asyncio.run(run())
+    assert [token is not None for token in tokens] == [True, False]
+
+
+def test_concurrent_acquire_without_database(locks):
+    locks._repository = InMemoryLockRepository(available=False)
+
+    async def run():
+        tokens = await asyncio.gather(locks.acquire("game"), locks.acquire("game"))
+        for token in tokens:
+            await locks.release("game", token)
+        return tokens
+
+    tokens = asyncio.run(run())
+    assert [token is not None for token in tokens] == [True, False]
+
+
+def test_release_requires_matching_token(locks):
+    async def run():
+        token = await locks.acquire("game")
+        await locks.release("game", "other")
+        still_held = locks.owns("game", token)
+        await locks.release("game", token)
+        reacquired = await locks.acquire("game")
+        await locks.release("game", reacquired)
+        return still_held, reacquired
+
+    still_held, reacquired = asyncio.run(run())
+    assert still_held
+    assert reacquired is not None
+
+
+def test_preempt_waits_for_speculative_holder_to_release(locks):
+    # 另一个 worker 上的锁管理器，与本进程共享同一个锁集合
+    other = object.__new__(GenerationLocks)
+    other.__init__()
+    other._repository = locks._repository
+
+    async def run():
+        stopped = asyncio.Event()
+        token = None
+
+        async def on_lost():
+            stopped.set()
+            await other.release("game", token)
+
+        token = await other.acquire("game", preemptible=True, on_lost=on_lost)
+        assert await locks.acquire("game") is None
+        preempting = await locks.acquire("game", preempt=True)
+        await locks.release("game", preempting)
+        return stopped.is_set(), preempting
+
+    stopped, preempting = asyncio.run(run())
+    assert stopped
+    assert preempting is not None
+
+
+def test_non_preemptible_lock_is_not_preempted(locks):
+    other = object.__new__(GenerationLocks)
+    other.__init__()
+    other._repository = locks._repository
+
+    async def run():
+        token = await other.acquire("game")
+        preempting = await locks.acquire("game", preempt=True)
+        await other.release("game", token)
+        return preempting
+
+    assert asyncio.run(run()) is None
+
+
+def test_renewal_cancels_generation_requested_by_another_process(locks, monkeypatch):
+    import utils.cancellation as cancellation
+
+    cancelled = []
+
+    async def cancel(self, game_id, reason, timeout=10.0):
+        cancelled.append((game_id, reason))
+        await locks.release(game_id, locks.token(game_id))
+
+    monkeypatch.setattr(cancellation.CancellationRegistry, "cancel", cancel)
+
+    async def run():
+        await locks.acquire("game")
+        # 其他进程删除游戏时在锁上记录取消原因
+        locks._repository.cancel_reasons["game"] = "deleted"
+        for _ in range(100):
+            if not locks.held("game"):
+                break
+            await asyncio.sleep(0.01)
+        return locks.held("game")
+
+    assert asyncio.run(run()) is False
+    assert cancelled == [("game", "deleted")]
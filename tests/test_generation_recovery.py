@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+
+import utils.generation_lock as generation_lock
+from utils.generation_lock import GenerationLocks
+from workflows.generation_recovery import GenerationRecovery
+
+from test_generation_lock import InMemoryLockRepository
+
+
+class WaitingGames:
+    def __init__(self, games):
+        self.games = games
+
+    async def find_waiting(self, limit=100):
+        return self.games
+
+
+def test_recovers_only_games_whose_lock_is_free(monkeypatch):
+    settings = SimpleNamespace(GENERATION_LOCK_TTL_SECONDS=30.0, GENERATION_LOCK_PREEMPT_CHECK_SECONDS=2.0)
+    monkeypatch.setattr(generation_lock, "get_settings", lambda: settings)
+    monkeypatch.setattr(GenerationLocks, "_instance", None)
+    locks = GenerationLocks()
+    locks._repository = InMemoryLockRepository()
+    # 另一个仍在运行的进程持有暂停中游戏的锁
+    locks._repository.owners["parked_elsewhere"] = "other-worker"
+
+    games = [SimpleNamespace(id="parked_elsewhere"), SimpleNamespace(id="orphaned")]
+    recovery = GenerationRecovery(WaitingGames(games), None)
+    submitted = []
+    monkeypatch.setattr(recovery, "_submit", lambda game, lock_token: submitted.append(game.id))
+
+    async def run():
+        recovered = await recovery.recover()
+        await locks.release("orphaned", locks.token("orphaned"))
+        return recovered
+
+    assert asyncio.run(run()) == 1
+    assert submitted == ["orphaned"]
@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils.hedging as hedging
+from utils.hedging import MAX_HEDGE_TOKENS, Hedger
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = SimpleNamespace(
+        TTS_HEDGING_ENABLED=True,
+        HEDGE_SAMPLE_SIZE=1000,
+        HEDGE_MIN_SAMPLES=10,
+        HEDGE_PERCENTILE=0.5,
+        HEDGE_MIN_DELAY_SECONDS=0.01,
+        HEDGE_BUDGET_RATIO=0.25,
+    )
+    monkeypatch.setattr(hedging, "get_settings", lambda: settings)
+    return settings
+
+
+def new_hedger():
+    # 只有 tts 开启了对冲
+    Hedger._registry.pop("tts", None)
+    hedger = Hedger("tts")
+    hedger._latencies.extend([0.001] * 100)
+    return hedger
+
+
+def test_hedges_stay_within_budget(settings):
+    hedger = new_hedger()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "audio"
+
+    async def run():
+        for _ in range(8):
+            assert await hedger.run(slow) == "audio"
+
+    asyncio.run(run())
+    stats = hedger.stats()
+    assert stats["requests"] == 8
+    assert stats["hedged"] == 8 * settings.HEDGE_BUDGET_RATIO
+    assert stats["skipped_over_budget"] == 6
+    assert len(calls) == 8 + stats["hedged"]
+
+
+def test_budget_is_capped(settings):
+    hedger = new_hedger()
+
+    async def fast():
+        return "audio"
+
+    async def run():
+        for _ in range(100):
+            await hedger.run(fast)
+
+    asyncio.run(run())
+    assert hedger._tokens == MAX_HEDGE_TOKENS
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_hedge_wins_when_primary_is_stuck(settings):
+    hedger = new_hedger()
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(60)
+        return "audio"
+
+    async def run():
+        hedger._tokens = 1.0
+        return await asyncio.wait_for(hedger.run(flaky), timeout=5)
+
+    assert asyncio.run(run()) == "audio"
+    assert hedger.stats()["hedge_wins"] == 1
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils.lazy_tts as lazy_tts
+from utils.lazy_tts import LazyDialogueTTS, LazyTTSError, LazyTTSQuota, LazyTTSUnavailable
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    settings = SimpleNamespace(LAZY_TTS_USER_LINES_PER_MINUTE=3)
+    monkeypatch.setattr(lazy_tts, "get_settings", lambda: settings)
+    monkeypatch.setattr(LazyTTSQuota, "_instance", None)
+    return LazyTTSQuota()
+
+
+def test_quota_is_per_user(quota):
+    assert quota.take("a", 1) == 1
+    assert quota.take("a", 5) == 2
+    assert quota.take("a", 1) == 0
+    assert quota.take("b", 1) == 1
+    assert quota.snapshot()["rejected"] == 4
+
+
+class Repository:
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def get(self, id):
+        return self.doc
+
+
+def make_lazy_tts(game, runtime_game=None):
+    instance = LazyDialogueTTS.__new__(LazyDialogueTTS)
+    instance.game_repository = Repository(game)
+    instance.runtime_game_repository = Repository(runtime_game)
+    return instance
+
+
+def synthesize(instance):
+    return asyncio.run(instance.synthesize("game", 0, "main", 0, user_id="user"))
+
+
+def test_rejects_deleted_game():
+    game = SimpleNamespace(is_deleted=True, settings={"tts_mode": "lazy"})
+    with pytest.raises(LazyTTSError):
+        synthesize(make_lazy_tts(game))
+
+
+def test_rejects_game_not_in_lazy_mode():
+    game = SimpleNamespace(is_deleted=False, settings={"tts_mode": "eager"})
+    with pytest.raises(LazyTTSUnavailable):
+        synthesize(make_lazy_tts(game))
@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils.rate_limiter as rate_limiter
+from utils.rate_limiter import AdaptiveRateLimiter
+
+
+class InMemoryRateLimitRepository:
+    """按 RateLimitRepository 的语义在内存中保存各窗口的配额与用量"""
+
+    def __init__(self):
+        self.windows = {}
+
+    async def claim(self, name, window, window_seconds, count, quota, lower=False):
+        await asyncio.sleep(0)
+        doc = self.windows.setdefault(f"{name}:{window}", {"quota": quota, "used": 0})
+        if lower:
+            doc["quota"] = min(doc["quota"], quota)
+        doc["used"] += count
+        return max(0, min(count, doc["quota"] - (doc["used"] - count)))
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = SimpleNamespace(
+        RATE_LIMIT_IMAGE_RATE=1.0,
+        RATE_LIMIT_IMAGE_MAX_RATE=4.0,
+        RATE_LIMIT_TTS_RATE=1.0,
+        RATE_LIMIT_TTS_MAX_RATE=4.0,
+        RATE_LIMIT_MUSIC_MAX_RATE=4.0,
+        MUSIC_API_RATE_LIMIT_MAX_REQUESTS=1,
+        MUSIC_API_RATE_LIMIT_WINDOW=1,
+        RATE_LIMIT_MIN_RATE=0.05,
+        RATE_LIMIT_ADDITIVE_INCREASE=0.5,
+        RATE_LIMIT_MULTIPLICATIVE_DECREASE=0.5,
+        RATE_LIMIT_BURST_SECONDS=2.0,
+        RATE_LIMIT_MAX_RETRY_AFTER=300.0,
+        RATE_LIMIT_SHARED_ENABLED=False,
+        RATE_LIMIT_SHARED_WINDOW_SECONDS=10.0,
+        RATE_LIMIT_SHARED_PREFETCH_SECONDS=1.0,
+    )
+    monkeypatch.setattr(rate_limiter, "get_settings", lambda: settings)
+    return settings
+
+
+def new_limiter(name="image", rate=None, repository=None):
+    """创建独立的限速器实例，模拟不同 worker 进程中的同名限速器"""
+    AdaptiveRateLimiter._registry.pop(name, None)
+    limiter = AdaptiveRateLimiter(name)
+    AdaptiveRateLimiter._registry.pop(name, None)
+    if rate is not None:
+        limiter.rate = rate
+    limiter._repository = repository
+    return limiter
+
+
+def test_throttle_halves_rate_once_per_interval(settings):
+    limiter = new_limiter()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(0.5)
+
+
+def test_success_recovers_rate_up_to_max(settings):
+    limiter = new_limiter()
+    limiter.on_throttle()
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.rate > 0.5
+    for _ in range(1000):
+        limiter.on_success()
+    assert limiter.rate == limiter.max_rate
+
+
+def test_retry_after_blocks_tokens(settings):
+    limiter = new_limiter()
+    limiter.on_throttle(retry_after=30)
+    assert limiter.stats()["blocked_seconds"] == pytest.approx(30, abs=1)
+
+
+def test_window_quota_is_shared_across_workers(settings):
+    settings.RATE_LIMIT_SHARED_ENABLED = True
+    # 窗口足够长，测试期间不会进入下一个窗口
+    settings.RATE_LIMIT_SHARED_WINDOW_SECONDS = 3600.0
+    repository = InMemoryRateLimitRepository()
+    fast = new_limiter(rate=2.0, repository=repository)
+    slow = new_limiter(rate=1.0, repository=repository)
+
+    async def run():
+        await fast.acquire()
+        await slow.acquire()
+
+    asyncio.run(run())
+    # 首个领取的进程写入配额，另一进程按同一配额领取
+    assert [doc["quota"] for doc in repository.windows.values()] == [7200]
+
+    slow.on_throttle()
+    slow._tokens = 1.0
+    asyncio.run(slow.acquire())
+    assert [doc["quota"] for doc in repository.windows.values()] == [1800]
+
+
+def test_waiting_for_next_window_does_not_hold_local_lock(settings):
+    settings.RATE_LIMIT_SHARED_ENABLED = True
+    settings.RATE_LIMIT_SHARED_WINDOW_SECONDS = 0.2
+    repository = InMemoryRateLimitRepository()
+    limiter = new_limiter(rate=4.0, repository=repository)
+
+    async def run():
+        # 当前窗口的配额已被其他进程用完
+        window = int(rate_limiter.time.time() // 0.2)
+        repository.windows[f"image:{window}"] = {"quota": 1, "used": 1}
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        locked = limiter._lock.locked()
+        await waiter
+        return locked
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import utils.scheduler as scheduler
+from utils.scheduler import FairScheduler, Priority, set_job_context
+
+
+def new_scheduler(monkeypatch, name, starvation_seconds=600.0):
+    settings = SimpleNamespace(SCHEDULER_ENABLED=True, SCHEDULER_STARVATION_SECONDS=starvation_seconds)
+    monkeypatch.setattr(scheduler, "get_settings", lambda: settings)
+    FairScheduler._registry.pop(name, None)
+    return FairScheduler(name, concurrency=1)
+
+
+async def serve_one(sched, order, label, user_id, priority):
+    set_job_context(user_id, priority=priority)
+    await sched.acquire()
+    order.append(label)
+    await asyncio.sleep(0)
+    sched.release()
+
+
+async def serve_in_order(sched, jobs):
+    """占住唯一的槽位，让 jobs 全部排队后再放行，返回被服务的顺序"""
+    order = []
+    await sched.acquire()
+    tasks = [asyncio.create_task(serve_one(sched, order, *spec)) for spec in jobs]
+    await asyncio.sleep(0)
+    assert sched.waiting == len(jobs)
+    sched.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_round_robins_users_within_a_priority(monkeypatch):
+    sched = new_scheduler(monkeypatch, "test-drr")
+    jobs = [(f"a{i}", "alice", Priority.NEXT_CHAPTER) for i in range(4)]
+    jobs += [(f"b{i}", "bob", Priority.NEXT_CHAPTER) for i in range(2)]
+
+    order = asyncio.run(serve_in_order(sched, jobs))
+
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_serves_higher_priority_first(monkeypatch):
+    sched = new_scheduler(monkeypatch, "test-priority")
+    jobs = [
+        ("backfill", "alice", Priority.BACKFILL),
+        ("speculative", "alice", Priority.SPECULATIVE),
+        ("next", "bob", Priority.NEXT_CHAPTER),
+        ("first", "carol", Priority.FIRST_CHAPTER),
+    ]
+
+    order = asyncio.run(serve_in_order(sched, jobs))
+
+    assert order == ["first", "next", "speculative", "backfill"]
+    assert sched.stats()["served"]["BACKFILL"] == 1
+
+
+def test_starving_low_priority_is_served_first(monkeypatch):
+    sched = new_scheduler(monkeypatch, "test-starvation", starvation_seconds=60)
+    jobs = [
+        ("backfill", "alice", Priority.BACKFILL),
+        ("first", "bob", Priority.FIRST_CHAPTER),
+    ]
+
+    async def run():
+        await sched.acquire()
+        tasks = [asyncio.create_task(serve_one(sched, order, *spec)) for spec in jobs]
+        await asyncio.sleep(0)
+        # 补充内容已经等待了两分钟
+        sched._queues[Priority.BACKFILL]["alice"][0].enqueued_at -= 120
+        sched.release()
+        await asyncio.gather(*tasks)
+
+    order = []
+    asyncio.run(run())
+
+    assert order == ["backfill", "first"]
+
+
+def test_fifo_policy_ignores_users_and_priority(monkeypatch):
+    sched = new_scheduler(monkeypatch, "test-fifo")
+    sched.policy = "fifo"
+    jobs = [(f"a{i}", "alice", Priority.BACKFILL) for i in range(2)]
+    jobs += [("b0", "bob", Priority.FIRST_CHAPTER)]
+
+    order = asyncio.run(serve_in_order(sched, jobs))
+
+    assert order == ["a0", "a1", "b0"]
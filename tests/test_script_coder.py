@@ -0,0 +1,33 @@
+from schemas.script_commands import CommandType
+from utils.script_coder import parse_script
+
+# 全角空格（U+3000）缩进与分隔的中文脚本
+FULL_WIDTH_SCRIPT = "\n".join([
+    "branch main",
+    "　　bg 咖啡馆 cozy cafe, warm light",
+    "　narration　黄昏时分，街道安静下来。",
+    "　　dialogue 艾琳, 平静, 我们必须离开。 // 注释",
+    "　choice 留下来,　end",
+    "branch　end",
+    "　jump main",
+])
+
+
+def test_full_width_spaces_are_whitespace():
+    errors = []
+    branches = parse_script(FULL_WIDTH_SCRIPT, errors)
+    assert errors == []
+    assert [branch.name for branch in branches] == ["main", "end"]
+    main = branches[0].commands
+    assert [command.type for command in main] == [
+        CommandType.BG, CommandType.NARRATION, CommandType.DIALOGUE, CommandType.CHOICE
+    ]
+    assert main[1].text == "黄昏时分，街道安静下来。"
+    assert (main[2].character, main[2].text) == ("艾琳", "我们必须离开。")
+    assert main[3].target == "end"
+    assert branches[1].commands[0].target == "main"
+
+
+def test_comments_and_unknown_lines_are_skipped():
+    branches = parse_script("# 注释\nbranch main\n随便的一行文字\nnarration 开始 # 注释\n")
+    assert [command.text for command in branches[0].commands] == ["开始"]
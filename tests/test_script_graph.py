@@ -0,0 +1,75 @@
+from schemas.script_commands import (
+    BackgroundCommand,
+    BGMCommand,
+    Branch,
+    ChoiceCommand,
+    DialogueCommand,
+    JumpCommand,
+    NarrationCommand,
+)
+from utils.script_graph import BranchGraph, analyze_and_repair
+
+
+def test_cycles_finds_loops_but_not_end_self_loop():
+    branches = [
+        Branch("main", [ChoiceCommand("左", "a"), ChoiceCommand("右", "c")]),
+        Branch("a", [JumpCommand("b")]),
+        Branch("b", [ChoiceCommand("回去", "a"), ChoiceCommand("结束", "end")]),
+        Branch("c", [ChoiceCommand("再来", "c"), ChoiceCommand("结束", "end")]),
+        Branch("end", [NarrationCommand("完"), JumpCommand("end")]),
+    ]
+
+    cycles = BranchGraph.from_branches(branches).cycles()
+
+    assert sorted(cycles) == [["a", "b"], ["c"]]
+
+
+def test_cycles_on_acyclic_graph():
+    branches = [
+        Branch("main", [JumpCommand("a")]),
+        Branch("a", [JumpCommand("end")]),
+        Branch("end", [NarrationCommand("完")]),
+    ]
+
+    assert BranchGraph.from_branches(branches).cycles() == []
+
+
+def test_prunes_unreachable_branches_and_counts_skipped_media():
+    branches = [
+        Branch("main", [BackgroundCommand("教室", "教室"), JumpCommand("end")]),
+        Branch("orphan", [
+            BackgroundCommand("教室", "教室"),
+            BackgroundCommand("屋顶", "屋顶"),
+            BGMCommand("悲伤", "悲伤"),
+            DialogueCommand("小明", "平静", "你好"),
+            DialogueCommand("小红", "开心", "你好呀"),
+            JumpCommand("end"),
+        ]),
+        Branch("end", [NarrationCommand("完")]),
+    ]
+
+    result = analyze_and_repair(branches)
+
+    assert [branch.name for branch in result.branches] == ["main", "end"]
+    assert result.unreachable_branches == ["orphan"]
+    # 教室仍被 main 使用，不计入跳过数量
+    assert result.skipped_scene_images == 1
+    assert result.skipped_bgm == 1
+    assert result.skipped_dialogue_lines == 2
+
+
+def test_repairs_dangling_targets_and_reports_trapped_branches():
+    branches = [
+        Branch("main", [ChoiceCommand("走", "missing"), ChoiceCommand("留", "x")]),
+        Branch("x", [JumpCommand("y")]),
+        Branch("y", [JumpCommand("x")]),
+        Branch("end", [NarrationCommand("完")]),
+    ]
+
+    result = analyze_and_repair(branches)
+
+    assert result.dangling_targets == ["main->missing"]
+    main = result.branches[0]
+    assert [cmd.target for cmd in main.commands] == ["end", "x"]
+    assert result.cycles == [["x", "y"]]
+    assert result.trapped_branches == ["x", "y"]
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import utils.scheduler as scheduler
+from utils.scheduler import FairScheduler, set_job_context
+from utils.single_flight import SingleFlight
+
+
+class Provider:
+    """记录调用次数以及调用是否完成或被取消"""
+
+    def __init__(self, seconds: float = 0.05):
+        self.seconds = seconds
+        self.calls = 0
+        self.finished = False
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        self.finished = True
+        return "result"
+
+
+def new_flight(name):
+    SingleFlight._registry.pop(name, None)
+    return SingleFlight(name)
+
+
+def test_concurrent_calls_are_deduplicated():
+    flight = new_flight("test_dedup")
+    provider = Provider()
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", provider) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["result"] * 3
+    assert provider.calls == 1
+    assert flight.stats()["saved"] == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelling_the_only_waiter_cancels_the_call():
+    flight = new_flight("test_cancel_only")
+    provider = Provider(seconds=10)
+
+    async def run():
+        waiter = asyncio.ensure_future(flight.do("key", provider))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(run())
+    assert (provider.finished, provider.cancelled) == (False, True)
+    assert flight.stats()["cancelled"] == 1
+
+
+def test_call_continues_while_another_waiter_remains():
+    flight = new_flight("test_cancel_one")
+    provider = Provider()
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", provider))
+        second = asyncio.ensure_future(flight.do("key", provider))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "result"
+    assert (provider.finished, provider.cancelled) == (True, False)
+    assert flight.stats()["cancelled"] == 0
+
+
+def test_cancelled_call_releases_scheduler_slot_and_is_counted(monkeypatch):
+    settings = SimpleNamespace(SCHEDULER_ENABLED=True, SCHEDULER_STARVATION_SECONDS=30.0)
+    monkeypatch.setattr(scheduler, "get_settings", lambda: settings)
+    FairScheduler._registry.pop("test_slot", None)
+    slots = FairScheduler("test_slot", concurrency=1)
+    flight = new_flight("test_slot")
+    provider = Provider(seconds=10)
+
+    async def pipeline():
+        set_job_context("user", "game")
+        await flight.do("key", lambda: slots.run(provider))
+
+    async def run():
+        task = asyncio.ensure_future(pipeline())
+        await asyncio.sleep(0.01)
+        FairScheduler.watch_cancelled("game")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return FairScheduler.pop_cancelled("game")
+
+    assert asyncio.run(run()) == {"test_slot": {"queued": 0, "running": 1}}
+    assert provider.cancelled
+    assert slots.stats()["active"] == 0
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from utils.speculation import SpeculationRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(SpeculationRegistry, "_instance", None)
+    return SpeculationRegistry()
+
+
+async def stubborn_speculation(cleanup: asyncio.Event):
+    """被取消后还需要一段时间清理（如释放生成锁）的预生成"""
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        await cleanup.wait()
+        raise
+
+
+def test_cancel_waits_for_speculation(registry):
+    async def run():
+        cleanup = asyncio.Event()
+        cleanup.set()
+        registry._tasks["game"] = ("user", asyncio.ensure_future(stubborn_speculation(cleanup)))
+        await asyncio.sleep(0)
+        return await registry.cancel("game")
+
+    assert asyncio.run(run()) is True
+    assert registry.snapshot()["preempted"] == 1
+
+
+def test_cancelling_the_caller_is_not_swallowed(registry):
+    async def run():
+        cleanup = asyncio.Event()
+        registry._tasks["game"] = ("user", asyncio.ensure_future(stubborn_speculation(cleanup)))
+        await asyncio.sleep(0)
+        # 生成锁续期任务在 on_lost 中取消预生成时，自身被取消（锁释放或服务关闭）
+        renew = asyncio.ensure_future(registry.cancel("game"))
+        await asyncio.sleep(0.01)
+        renew.cancel()
+        await asyncio.wait({renew})
+        cleanup.set()
+        return renew.cancelled()
+
+    assert asyncio.run(run()) is True
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import utils.timeline as timeline
+from utils.timeline import GenerationTimeline, Span
+
+GAME_ID = "0123456789abcdef01234567"
+
+
+class InMemoryTimelineRepository:
+    def __init__(self):
+        self.spans = []
+
+    async def insert_spans(self, spans):
+        await asyncio.sleep(0)
+        self.spans.extend(spans)
+        return True
+
+
+def make_timeline(monkeypatch, flush_size, flush_seconds):
+    settings = SimpleNamespace(
+        TIMELINE_ENABLED=True,
+        TIMELINE_TTL_DAYS=30,
+        TIMELINE_FLUSH_SIZE=flush_size,
+        TIMELINE_FLUSH_SECONDS=flush_seconds,
+    )
+    monkeypatch.setattr(timeline, "get_settings", lambda: settings)
+    monkeypatch.setattr(GenerationTimeline, "_instance", None)
+    instance = GenerationTimeline()
+    instance._repository = InMemoryTimelineRepository()
+    return instance
+
+
+def test_flushes_when_buffer_is_full(monkeypatch):
+    recorder = make_timeline(monkeypatch, flush_size=2, flush_seconds=0)
+
+    async def run():
+        recorder._record(GAME_ID, Span(kind="workflow", name="a"))
+        recorder._record(GAME_ID, Span(kind="workflow", name="b"))
+        assert len(recorder._flush_tasks) == 1
+        await asyncio.gather(*recorder._flush_tasks)
+
+    asyncio.run(run())
+    assert [span["name"] for span in recorder.repository.spans] == ["a", "b"]
+    assert not recorder._flush_tasks
+
+
+def test_flushes_old_buffer_before_it_is_full(monkeypatch):
+    recorder = make_timeline(monkeypatch, flush_size=200, flush_seconds=0.02)
+
+    async def run():
+        recorder._record(GAME_ID, Span(kind="workflow", name="a"))
+        assert recorder.repository.spans == []
+        await asyncio.wait_for(recorder._flusher, timeout=1)
+
+    asyncio.run(run())
+    assert [span["name"] for span in recorder.repository.spans] == ["a"]
+    assert recorder.snapshot()["buffered_games"] == 0
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from config import get_settings
+from utils.scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+# 耗时滑动平均的平滑系数
+EWMA_ALPHA = 0.2
+
+
+class AdmissionDecision(str, Enum):
+    """准入判定结果"""
+    ADMIT = "admit"  # 立即开始生成
+    QUEUE = "queue"  # 排队，有空闲生成名额时开始
+    REJECT = "reject"  # 负载过高，拒绝
+
+
+@dataclass
+class AdmissionTicket:
+    """准入判定及预计等待时间"""
+    decision: AdmissionDecision
+    estimated_wait_seconds: float
+    reason: Optional[str] = None
+
+
+class AdmissionController:
+    """
+    生成任务准入控制（单例模式）
+
+    根据当前负载决定新游戏能否立即开始生成：
+    - 进行中的生成流水线数量（ADMISSION_MAX_IN_FLIGHT）
+    - 各服务商调度器的排队请求数（ADMISSION_MAX_PROVIDER_QUEUE）
+    - 近期首章可玩耗时与整局生成耗时的滑动平均，用于估算等待时间
+
+    超出并发上限或服务商排队过多的任务进入等待队列，前面的流水线结束后
+    或每 ADMISSION_RETRY_SECONDS 秒重新检查时依次启动；
+    等待队列也已满时拒绝，让已在进行的游戏保持在延迟预算内。
+    等待队列只在进程内，进程重启后排队与暂停中的游戏由 GenerationRecovery 重新提交。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            # game_id -> 开始时间
+            self._in_flight: Dict[str, float] = {}
+            # 本轮流水线已记录过首章可玩耗时的游戏
+            self._playable: Set[str] = set()
+            self._queue: Deque[Tuple[str, Callable[[], Awaitable[None]]]] = deque()
+            self._tasks: Set[asyncio.Task] = set()
+            self._retry: Optional[asyncio.TimerHandle] = None
+            self._first_playable_ewma: Optional[float] = None
+            self._duration_ewma: Optional[float] = None
+            self._admitted = 0
+            self._queued = 0
+            self._rejected = 0
+            self._initialized = True
+
+    @staticmethod
+    def _ewma(current: Optional[float], value: float) -> float:
+        return value if current is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * current
+
+    @property
+    def first_playable_seconds(self) -> float:
+        """首章可玩耗时估计"""
+        if self._first_playable_ewma is None:
+            return get_settings().ADMISSION_DEFAULT_FIRST_PLAYABLE_SECONDS
+        return self._first_playable_ewma
+
+    @property
+    def duration_seconds(self) -> float:
+        """整局生成耗时估计"""
+        if self._duration_ewma is None:
+            return get_settings().ADMISSION_DEFAULT_DURATION_SECONDS
+        return self._duration_ewma
+
+    def estimate_wait(self, position: int) -> float:
+        """排在等待队列第 position 位（从0开始）的任务的预计首章可玩等待时间"""
+        capacity = get_settings().ADMISSION_MAX_IN_FLIGHT
+        # 每结束 capacity 个流水线释放一轮名额
+        rounds = math.ceil((position + 1) / capacity)
+        return rounds * self.duration_seconds + self.first_playable_seconds
+
+    def _has_capacity(self) -> bool:
+        """是否有空闲的生成名额，且服务商调度器的排队请求未超过上限"""
+        settings = get_settings()
+        return (
+            len(self._in_flight) < settings.ADMISSION_MAX_IN_FLIGHT
+            and FairScheduler.total_waiting() < settings.ADMISSION_MAX_PROVIDER_QUEUE
+        )
+
+    def evaluate(self) -> AdmissionTicket:
+        """
+        评估新任务的准入结果，在扣除生成次数之前调用
+
+        Returns:
+            AdmissionTicket: 判定结果与预计首章可玩等待时间
+        """
+        settings = get_settings()
+        if self._has_capacity() and not self._queue:
+            return AdmissionTicket(AdmissionDecision.ADMIT, round(self.first_playable_seconds, 1))
+
+        estimated = round(self.estimate_wait(len(self._queue)), 1)
+        if len(self._queue) < settings.ADMISSION_MAX_QUEUED:
+            return AdmissionTicket(AdmissionDecision.QUEUE, estimated, "生成服务繁忙，已进入排队")
+        return AdmissionTicket(AdmissionDecision.REJECT, estimated, "生成服务繁忙，请稍后再试")
+
+    def submit(self, game_id: str, factory: Callable[[], Awaitable[None]]) -> AdmissionDecision:
+        """
+        提交生成流水线，按与 evaluate 相同的条件立即启动或进入等待队列
+
+        Args:
+            game_id: 游戏ID
+            factory: 无参协程函数，执行实际的生成
+
+        Returns:
+            AdmissionDecision: ADMIT 或 QUEUE
+        """
+        game_id = str(game_id)
+        if self._has_capacity() and not self._queue:
+            self._start(game_id, factory)
+            self._admitted += 1
+            return AdmissionDecision.ADMIT
+        self._queue.append((game_id, factory))
+        self._queued += 1
+        logger.info(f"游戏 {game_id} 进入生成队列，前方 {len(self._queue) - 1} 个")
+        self._schedule_retry()
+        return AdmissionDecision.QUEUE
+
+    def reject(self) -> None:
+        """记录一次拒绝"""
+        self._rejected += 1
+
+    def _start(self, game_id: str, factory: Callable[[], Awaitable[None]]) -> None:
+        self._in_flight[game_id] = time.monotonic()
+        task = asyncio.create_task(self._run(game_id, factory))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, game_id: str, factory: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await factory()
+        except Exception as e:
+            logger.error(f"游戏 {game_id} 生成流水线异常退出: {str(e)}")
+        finally:
+            started = self._in_flight.pop(game_id, None)
+            self._playable.discard(game_id)
+            if started is not None:
+                self._duration_ewma = self._ewma(self._duration_ewma, time.monotonic() - started)
+            self._start_next()
+
+    def _start_next(self) -> None:
+        while self._queue and self._has_capacity():
+            game_id, factory = self._queue.popleft()
+            logger.info(f"游戏 {game_id} 出队开始生成")
+            self._start(game_id, factory)
+        self._schedule_retry()
+
+    def _schedule_retry(self) -> None:
+        """队列不为空时定时重新检查，服务商排队回落后不必等到某条流水线结束才出队"""
+        if not self._queue or self._retry is not None:
+            return
+
+        def retry() -> None:
+            self._retry = None
+            self._start_next()
+
+        self._retry = asyncio.get_running_loop().call_later(get_settings().ADMISSION_RETRY_SECONDS, retry)
+
+    def remove(self, game_id: str) -> bool:
+        """把游戏从等待队列中移除，返回是否在队列中"""
+        position = self.queue_position(game_id)
+        if position is None:
+            return False
+        del self._queue[position]
+        return True
+
+    def queue_position(self, game_id: str) -> Optional[int]:
+        """游戏在等待队列中的位置（从0开始），不在队列中返回None"""
+        for position, (queued_id, _) in enumerate(self._queue):
+            if queued_id == str(game_id):
+                return position
+        return None
+
+    def record_first_playable(self, game_id: str) -> None:
+        """记录流水线首个章节可玩的耗时，之后的章节不再记录"""
+        game_id = str(game_id)
+        started = self._in_flight.get(game_id)
+        if started is not None and game_id not in self._playable:
+            self._playable.add(game_id)
+            self._first_playable_ewma = self._ewma(self._first_playable_ewma, time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, object]:
+        """准入统计"""
+        duration = self.duration_seconds
+        return {
+            "in_flight": len(self._in_flight),
+            "queued": len(self._queue),
+            "provider_waiting": FairScheduler.total_waiting(),
+            "first_playable_seconds": round(self.first_playable_seconds, 1),
+            "duration_seconds": round(duration, 1),
+            "throughput_per_minute": round(get_settings().ADMISSION_MAX_IN_FLIGHT * 60 / duration, 2) if duration else 0.0,
+            "admitted": self._admitted,
+            "queued_total": self._queued,
+            "rejected": self._rejected,
+        }
@@ -3,8 +3,11 @@ import os
 import httpx
 from urllib.parse import unquote
 import asyncio
+import time
 from typing import Optional
 from config import get_settings
+from utils.metrics import OSS_UPLOADED_BYTES, PROVIDER_CALL_DURATION, PROVIDER_CALLS_IN_FLIGHT
+from utils.timeline import GenerationTimeline
 
 settings = get_settings()
  
@@ -22,6 +25,20 @@ async def upload_from_url(url: str, type: str, oss_object_path: Optional[str] =
     :param chunk_size: 分块大小（字节）
     :return: 上传结果
     """
+    # 上传耗时与字节数计入生成时间线与服务商指标
+    started = time.monotonic()
+    succeeded = False
+    PROVIDER_CALLS_IN_FLIGHT.inc("oss")
+    try:
+        with GenerationTimeline().span("upload", type) as span:
+            succeeded = span.succeeded = await _upload_from_url(url, type, oss_object_path, chunk_size)
+        return succeeded
+    finally:
+        PROVIDER_CALLS_IN_FLIGHT.dec("oss")
+        PROVIDER_CALL_DURATION.observe(time.monotonic() - started, "oss", "success" if succeeded else "error")
+
+
+async def _upload_from_url(url: str, type: str, oss_object_path: Optional[str], chunk_size: int) -> bool:
     try:
         # 自动获取文件名（如果未指定OSS路径）
         if not oss_object_path:
@@ -55,6 +72,8 @@ async def upload_from_url(url: str, type: str, oss_object_path: Optional[str] =
                             chunk
                         )
                         parts.append(oss2.models.PartInfo(part_number, result.etag))
+                        GenerationTimeline().add("bytes", len(chunk))
+                        OSS_UPLOADED_BYTES.inc(type, amount=len(chunk))
                         part_number += 1
 
                         # 显示进度（如果已知文件大小）
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Sequence
+
+from config import get_settings
+from models.game import GameStatus
+from models.types import PyObjectId
+from utils.admission import AdmissionController
+from utils.circuit_breaker import ParkingLot
+from utils.generation_lock import GenerationLocks
+from utils.scheduler import FairScheduler
+from utils.speculation import SpeculationRegistry
+
+logger = logging.getLogger(__name__)
+
+# 保留的取消报告数量
+MAX_REPORTS = 100
+
+
+class GenerationCancelled(Exception):
+    """游戏生成已被取消"""
+
+    def __init__(self, game_id: str, reason: str):
+        super().__init__(f"游戏 {game_id} 的生成已取消: {reason}")
+        self.game_id = game_id
+        self.reason = reason
+
+
+@dataclass
+class _Registration:
+    task: asyncio.Task
+    stages: Sequence[str]
+    stage: Optional[str] = None
+    reason: Optional[str] = None
+    deadline: Optional[asyncio.TimerHandle] = None
+
+
+@dataclass
+class CancellationReport:
+    """一次取消节省的服务商工作量"""
+    game_id: str
+    reason: str
+    stage: Optional[str] = None
+    skipped_stages: List[str] = field(default_factory=list)
+    provider_calls: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    was_queued: bool = False  # 在排队或暂停中，尚未开始（继续）生成
+    cancelled_speculation: bool = False
+    forwarded: bool = False  # 由持有生成锁的其他进程取消
+    cancelled_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def avoided_calls(self) -> int:
+        """实际被取消的服务商调用数：未发出（排队中）与被中断（进行中）"""
+        return sum(load["queued"] + load["running"] for load in self.provider_calls.values())
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "game_id": self.game_id,
+            "reason": self.reason,
+            "stage": self.stage,
+            "skipped_stages": self.skipped_stages,
+            "provider_calls": self.provider_calls,
+            "avoided_calls": self.avoided_calls,
+            "was_queued": self.was_queued,
+            "cancelled_speculation": self.cancelled_speculation,
+            "forwarded": self.forwarded,
+            "cancelled_at": self.cancelled_at.isoformat(),
+        }
+
+
+class CancellationRegistry:
+    """
+    生成任务取消登记表（单例模式）
+
+    生成流水线启动时按游戏ID登记自身任务，工作流之间调用 check 检查是否已取消。
+    取消时除了设置标记，还会取消流水线任务本身，CancelledError 会传入
+    正在等待的 asyncio.gather、服务商轮询与调度器排队，使其立即停止。
+
+    取消来源：删除游戏、管理员接口、超过生成期限（GENERATION_DEADLINE_SECONDS）。
+
+    游戏不在本进程中生成时，取消请求记录在游戏的生成锁上，持有锁的进程在续期时
+    （或流水线在工作流之间调用 refresh 时）读取并取消；没有进程持有锁的排队或暂停中的游戏直接标记为失败。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._registrations: Dict[str, _Registration] = {}
+            self._reports: Deque[CancellationReport] = deque(maxlen=MAX_REPORTS)
+            self._initialized = True
+
+    def register(self, game_id: str, stages: Sequence[str], deadline_seconds: Optional[float] = None) -> None:
+        """
+        登记当前任务为游戏的生成流水线
+
+        Args:
+            game_id: 游戏ID
+            stages: 流水线的全部工作流名称，用于统计取消后跳过的工作流
+            deadline_seconds: 游戏自身的生成期限（秒），为空或超过 GENERATION_DEADLINE_SECONDS 时使用全局期限，0 表示不限
+        """
+        game_id = str(game_id)
+        registration = _Registration(task=asyncio.current_task(), stages=list(stages))
+        # 游戏设置的期限只能比全局期限更短
+        global_deadline = get_settings().GENERATION_DEADLINE_SECONDS
+        if deadline_seconds is None or (global_deadline > 0 and deadline_seconds > global_deadline):
+            deadline_seconds = global_deadline
+        if deadline_seconds and deadline_seconds > 0:
+            registration.deadline = asyncio.get_running_loop().call_later(
+                deadline_seconds,
+                lambda: asyncio.ensure_future(self.cancel(game_id, "deadline"))
+            )
+        self._registrations[game_id] = registration
+
+    def unregister(self, game_id: str) -> None:
+        """流水线结束时注销"""
+        registration = self._registrations.pop(str(game_id), None)
+        if registration and registration.deadline:
+            registration.deadline.cancel()
+
+    def check(self, game_id: str, stage: Optional[str] = None) -> None:
+        """
+        在工作流之间检查是否已取消，并记录即将执行的工作流
+
+        Raises:
+            GenerationCancelled: 游戏生成已被取消
+        """
+        registration = self._registrations.get(str(game_id))
+        if registration is None:
+            return
+        if registration.reason:
+            raise GenerationCancelled(str(game_id), registration.reason)
+        if stage:
+            registration.stage = stage
+
+    async def refresh(self, game_id: str, stage: Optional[str] = None) -> None:
+        """
+        同 check，并先读取其他进程记录在生成锁上的取消请求
+
+        Raises:
+            GenerationCancelled: 游戏生成已被取消
+        """
+        if self.reason(game_id) is None:
+            reason = await GenerationLocks().repository.cancel_reason(str(game_id))
+            if reason:
+                await self.cancel(game_id, reason)
+        self.check(game_id, stage)
+
+    def reason(self, game_id: str) -> Optional[str]:
+        """游戏生成被取消的原因，未取消时返回None"""
+        registration = self._registrations.get(str(game_id))
+        return registration.reason if registration else None
+
+    async def cancel(self, game_id: str, reason: str, timeout: float = 10.0) -> Optional[CancellationReport]:
+        """
+        取消游戏正在进行、排队、暂停或预生成中的生成任务
+
+        Args:
+            game_id: 游戏ID
+            reason: 取消原因，如 deleted、admin、deadline
+            timeout: 等待流水线退出的最长时间（秒）
+
+        Returns:
+            Optional[CancellationReport]: 取消报告，没有可取消的任务时返回None
+        """
+        game_id = str(game_id)
+        report = CancellationReport(game_id=game_id, reason=reason)
+        FairScheduler.watch_cancelled(game_id)
+        try:
+            return await self._cancel(game_id, report, timeout)
+        finally:
+            FairScheduler.pop_cancelled(game_id)
+
+    async def _cancel(self, game_id: str, report: CancellationReport, timeout: float) -> Optional[CancellationReport]:
+        reason = report.reason
+        was_queued = AdmissionController().remove(game_id)
+        was_parked = ParkingLot().remove(game_id)
+        report.was_queued = was_queued or was_parked
+        if report.was_queued:
+            # 排队与暂停中的游戏持有生成锁，出队前没有流水线释放
+            locks = GenerationLocks()
+            await locks.release(game_id, locks.token(game_id))
+            await self._mark_cancelled(game_id, reason)
+        report.cancelled_speculation = await SpeculationRegistry().cancel(game_id)
+
+        registration = self._registrations.get(game_id)
+        running = (
+            registration is not None
+            and not registration.reason
+            and registration.task is not None
+            and not registration.task.done()
+        )
+        if running:
+            registration.reason = reason
+            report.stage = registration.stage
+            if registration.stage in registration.stages:
+                report.skipped_stages = list(
+                    registration.stages[registration.stages.index(registration.stage):]
+                )
+            if registration.task is not asyncio.current_task():
+                registration.task.cancel()
+                await asyncio.wait({registration.task}, timeout=timeout)
+
+        if not (running or report.was_queued or report.cancelled_speculation):
+            # 不在本进程中：交给持有生成锁的进程取消，没有进程持有锁时（所在进程已退出）直接标记为失败
+            if await GenerationLocks().repository.request_cancel(game_id, reason):
+                report.forwarded = True
+            elif await self._mark_cancelled(game_id, reason, only_waiting=True):
+                report.was_queued = True
+            else:
+                return None
+        # 只统计流水线退出前确实被取消的调用，仍有其他游戏等待的共享调用不计入
+        report.provider_calls = FairScheduler.pop_cancelled(game_id)
+        self._reports.append(report)
+        logger.info(
+            f"已取消游戏 {game_id} 的生成（{reason}），跳过工作流 {report.skipped_stages}，"
+            f"避免服务商调用 {report.avoided_calls} 次"
+        )
+        return report
+
+    @staticmethod
+    async def _mark_cancelled(game_id: str, reason: str, only_waiting: bool = False) -> bool:
+        """
+        把没有流水线的游戏（排队或暂停中）标记为失败，可重新生成；已删除的游戏不更新
+
+        Args:
+            only_waiting: 只在游戏仍处于排队或暂停状态时更新
+
+        Returns:
+            bool: 是否更新
+        """
+        from core.container import get_game_repository
+
+        if reason == "deleted":
+            return False
+        conditions: Dict[str, object] = {"is_deleted": False}
+        if only_waiting:
+            conditions["status"] = {"$in": [GameStatus.QUEUED, GameStatus.PARKED]}
+        return await get_game_repository().update_if(
+            id=PyObjectId(game_id),
+            conditions=conditions,
+            fields={"status": GameStatus.FAILED, "error": f"生成已取消: {reason}"}
+        )
+
+    def snapshot(self) -> Dict[str, object]:
+        """进行中的流水线与最近的取消报告"""
+        return {
+            "running": {game_id: registration.stage for game_id, registration in self._registrations.items()},
+            "cancelled": len(self._reports),
+            "avoided_calls": sum(report.avoided_calls for report in self._reports),
+            "reports": [report.to_dict() for report in reversed(self._reports)],
+        }
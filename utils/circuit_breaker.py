@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from config import get_settings
+from utils.admission import AdmissionController
+from utils.scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitState(str, Enum):
+    """熔断器状态"""
+    CLOSED = "closed"  # 正常放行
+    OPEN = "open"  # 快速失败
+    HALF_OPEN = "half_open"  # 放行少量探测请求
+
+
+class CircuitOpenError(Exception):
+    """服务商熔断中，调用被快速拒绝"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"服务商 {name} 熔断中，{retry_in:.0f} 秒后重新探测")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    服务商熔断器
+
+    按滚动时间窗口（CIRCUIT_WINDOW_SECONDS）统计调用的错误率与慢调用率：
+    - CLOSED: 窗口内调用数达到 CIRCUIT_MIN_CALLS 且错误率或慢调用率达到阈值时打开
+    - OPEN: 新调用立即抛出 CircuitOpenError，CIRCUIT_OPEN_SECONDS 后进入半开
+    - HALF_OPEN: 最多放行 CIRCUIT_HALF_OPEN_PROBES 个探测调用，全部成功则关闭，任一失败则重新打开
+
+    每个服务商一个实例，通过名称注册。
+    """
+    _registry: Dict[str, "CircuitBreaker"] = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, name: str):
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = super().__new__(cls)
+            return cls._registry[name]
+
+    def __init__(self, name: str):
+        if not hasattr(self, '_initialized'):
+            self.name = name
+            self._state = CircuitState.CLOSED
+            # (完成时间, 是否成功, 耗时)
+            self._window: Deque[Tuple[float, bool, float]] = deque()
+            self._opened_at = 0.0
+            self._probes = 0
+            self._probe_successes = 0
+            self._rejected = 0
+            self._opened_count = 0
+            self._listeners: List[Callable[[str], None]] = []
+            self._initialized = True
+
+    @property
+    def state(self) -> CircuitState:
+        """当前状态，打开时间已满时视为半开"""
+        if self._state == CircuitState.OPEN and self.open_remaining() <= 0:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    @property
+    def is_closed(self) -> bool:
+        return self._state == CircuitState.CLOSED
+
+    def open_remaining(self) -> float:
+        """距离进入半开的剩余时间（秒）"""
+        if self._state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + get_settings().CIRCUIT_OPEN_SECONDS - time.monotonic())
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """注册熔断器关闭时的回调，参数为服务商名称"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def raise_if_open(self) -> None:
+        """熔断打开期间快速失败，不占用调度槽位"""
+        remaining = self.open_remaining()
+        if remaining > 0:
+            self._rejected += 1
+            raise CircuitOpenError(self.name, remaining)
+
+    def _acquire(self) -> bool:
+        """
+        判断本次调用是否放行
+
+        Returns:
+            bool: 是否为半开状态下的探测调用
+        """
+        self.raise_if_open()
+        if self._state == CircuitState.OPEN:
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            logger.info(f"服务商 {self.name} 熔断器进入半开，开始探测")
+        if self._state == CircuitState.HALF_OPEN:
+            if self._probes >= get_settings().CIRCUIT_HALF_OPEN_PROBES:
+                self._rejected += 1
+                raise CircuitOpenError(self.name, 0)
+            self._probes += 1
+            return True
+        return False
+
+    def _slow_call_seconds(self) -> float:
+        """超过该耗时的调用计为慢调用，各服务商正常耗时差异很大，分别配置"""
+        settings = get_settings()
+        return {
+            "image": settings.CIRCUIT_IMAGE_SLOW_CALL_SECONDS,
+            "tts": settings.CIRCUIT_TTS_SLOW_CALL_SECONDS,
+            "music": settings.CIRCUIT_MUSIC_SLOW_CALL_SECONDS,
+        }.get(self.name, settings.CIRCUIT_IMAGE_SLOW_CALL_SECONDS)
+
+    def _trim(self, now: float) -> None:
+        horizon = now - get_settings().CIRCUIT_WINDOW_SECONDS
+        while self._window and self._window[0][0] < horizon:
+            self._window.popleft()
+
+    def _open(self, reason: str) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._opened_count += 1
+        self._window.clear()
+        logger.warning(f"服务商 {self.name} 熔断器打开: {reason}")
+
+    def _close(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._window.clear()
+        logger.info(f"服务商 {self.name} 熔断器关闭，恢复正常")
+        for listener in list(self._listeners):
+            try:
+                listener(self.name)
+            except Exception as e:
+                logger.error(f"熔断器关闭回调出错: {str(e)}")
+
+    def _record(self, success: bool, latency: float, probe: bool) -> None:
+        settings = get_settings()
+        if probe:
+            if not success:
+                self._open("半开探测失败")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= settings.CIRCUIT_HALF_OPEN_PROBES:
+                self._close()
+            return
+        if self._state != CircuitState.CLOSED:
+            return
+
+        now = time.monotonic()
+        self._window.append((now, success, latency))
+        self._trim(now)
+        total = len(self._window)
+        if total < settings.CIRCUIT_MIN_CALLS:
+            return
+        errors = sum(1 for _, ok, _ in self._window if not ok)
+        slow_seconds = self._slow_call_seconds()
+        slow = sum(1 for _, _, elapsed in self._window if elapsed >= slow_seconds)
+        if errors / total >= settings.CIRCUIT_ERROR_RATE_THRESHOLD:
+            self._open(f"错误率 {errors}/{total}")
+        elif slow / total >= settings.CIRCUIT_SLOW_CALL_RATE_THRESHOLD:
+            self._open(f"慢调用率 {slow}/{total}")
+
+    async def run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        在熔断器保护下执行无参协程函数
+
+        Raises:
+            CircuitOpenError: 熔断打开或半开探测名额已满
+        """
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # 取消不代表服务商故障，归还探测名额
+            if probe and self._state == CircuitState.HALF_OPEN:
+                self._probes -= 1
+            raise
+        except httpx.HTTPStatusError as e:
+            # 限流由限速器降速处理，不计为服务商故障
+            self._record(e.response.status_code == 429, time.monotonic() - started, probe)
+            raise
+        except Exception:
+            self._record(False, time.monotonic() - started, probe)
+            raise
+        self._record(True, time.monotonic() - started, probe)
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        self._trim(now)
+        total = len(self._window)
+        errors = sum(1 for _, ok, _ in self._window if not ok)
+        return {
+            "state": self.state.value,
+            "window_calls": total,
+            "window_error_rate": round(errors / total, 4) if total else 0.0,
+            "open_remaining_seconds": round(self.open_remaining(), 1),
+            "opened": self._opened_count,
+            "rejected": self._rejected,
+        }
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, object]]:
+        """获取所有熔断器的状态"""
+        with cls._registry_lock:
+            breakers = list(cls._registry.items())
+        return {name: breaker.stats() for name, breaker in breakers}
+
+
+async def call_provider(name: str, fn: Callable[[], Awaitable[T]], cost: float = 1.0) -> T:
+    """
+    调用服务商：熔断打开时快速失败，否则按调度器排队后在熔断器保护下执行
+
+    Args:
+        name: 服务商名称，同时用于调度器与熔断器，如 image、tts、music
+        fn: 无参协程函数，执行实际的调用
+        cost: 调度成本
+    """
+    breaker = CircuitBreaker(name)
+    breaker.raise_if_open()
+    return await FairScheduler(name).run(lambda: breaker.run(fn), cost=cost)
+
+
+class ParkingLot:
+    """
+    暂停生成的游戏（单例模式）
+
+    服务商熔断导致阶段失败的游戏不标记为失败，而是暂停在这里：
+    - 熔断器关闭时恢复该服务商下的全部游戏
+    - 打开时间结束后先恢复一个游戏作为探测，之后每个打开周期再恢复一个
+    恢复通过 AdmissionController 提交，仍受生成并发限制。
+    暂停期间游戏的生成锁仍由本进程持有，其他进程不会重复生成。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            # 服务商 -> game_id -> 恢复生成的无参协程函数
+            self._parked: Dict[str, "OrderedDict[str, Callable[[], Awaitable[None]]]"] = {}
+            self._timers: Dict[str, asyncio.TimerHandle] = {}
+            self._initialized = True
+
+    def park(self, game_id: str, provider: str, resume: Callable[[], Awaitable[None]]) -> None:
+        """暂停游戏，等待服务商恢复"""
+        breaker = CircuitBreaker(provider)
+        breaker.add_listener(self._release_all)
+        self._parked.setdefault(provider, OrderedDict())[str(game_id)] = resume
+        self._schedule_wake(provider, breaker.open_remaining())
+        logger.info(f"游戏 {game_id} 因服务商 {provider} 熔断暂停生成")
+
+    def remove(self, game_id: str) -> bool:
+        """取消暂停（游戏被删除或取消时），返回是否在暂停中"""
+        removed = False
+        for games in self._parked.values():
+            if games.pop(str(game_id), None) is not None:
+                removed = True
+        return removed
+
+    def is_parked(self, game_id: str) -> bool:
+        """游戏是否在本进程中暂停"""
+        return any(str(game_id) in games for games in self._parked.values())
+
+    def _schedule_wake(self, provider: str, delay: float) -> None:
+        if provider in self._timers:
+            return
+        self._timers[provider] = asyncio.get_running_loop().call_later(
+            max(delay, 1.0), self._wake, provider
+        )
+
+    def _wake(self, provider: str) -> None:
+        self._timers.pop(provider, None)
+        games = self._parked.get(provider)
+        if not games:
+            return
+        breaker = CircuitBreaker(provider)
+        if breaker.is_closed:
+            self._release_all(provider)
+            return
+        if breaker.state == CircuitState.HALF_OPEN:
+            # 恢复一个游戏，它的调用会作为半开探测
+            self._release(*games.popitem(last=False))
+        if games:
+            self._schedule_wake(provider, breaker.open_remaining() or get_settings().CIRCUIT_OPEN_SECONDS)
+
+    def _release_all(self, provider: str) -> None:
+        games = self._parked.pop(provider, None) or {}
+        for game_id, resume in games.items():
+            self._release(game_id, resume)
+
+    @staticmethod
+    def _release(game_id: str, resume: Callable[[], Awaitable[None]]) -> None:
+        logger.info(f"恢复暂停的游戏 {game_id}")
+        AdmissionController().submit(game_id, resume)
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """各服务商下暂停的游戏"""
+        return {provider: list(games) for provider, games in self._parked.items() if games}
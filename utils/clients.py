@@ -3,6 +3,7 @@ import httpx
 from typing import Dict, Optional
 from openai import AsyncOpenAI
 from config import get_settings
+from utils.llm_usage import LLMUsageTracker
 import threading
 
 
@@ -49,7 +50,8 @@ class DeepSeekClient:
         self,
         messages: list[Dict[str, str]],
         model: Optional[str] = None,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        prompt_name: Optional[str] = None
     ) -> str:
         """
         发送聊天请求到 DeepSeek API
@@ -58,6 +60,7 @@ class DeepSeekClient:
             messages: 对话消息列表
             model: 可选，指定模型名称
             temperature: 采样温度，控制输出的随机性
+            prompt_name: 可选，提示词名称，用于按提示词统计上下文缓存命中
         
         Returns:
             API 响应的文本内容
@@ -76,6 +79,7 @@ class DeepSeekClient:
                 timeout=60
             )
             logger.info("Successfully received response from DeepSeek API")
+            LLMUsageTracker().record(prompt_name or "unknown", response.usage)
             return response.choices[0].message.content
         except Exception as e:
             logger.error("Error occurred: %s", str(e))
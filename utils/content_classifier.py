@@ -0,0 +1,192 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict
+
+from config import get_settings
+
+
+class ContentLabel(str, Enum):
+    """创建游戏时的输入内容类型，取值与 analyze_content_types 提示词的输出一致"""
+    IDEA = "想法"
+    NOVEL = "小说"
+    MEANINGLESS = "无意义"
+
+
+# 构思、设定类用语
+IDEA_CUES = (
+    "想写", "我想", "想要", "打算", "计划", "构思", "灵感", "设定", "世界观", "大纲", "题材",
+    "讲述", "讲的是", "关于", "故事", "主角是", "主角", "男主", "女主", "背景是", "希望", "剧情是",
+    "类型", "穿越到", "重生", "一个", "可以", "应该", "如果",
+)
+# 叙事、描写类用语
+NARRATIVE_CUES = (
+    "说道", "问道", "笑道", "道：", "说：", "只见", "忽然", "突然", "转身", "看着", "望着",
+    "低声", "轻声", "点了点头", "摇了摇头", "笑了", "叹了口气", "心中", "心里", "眼中", "脸上",
+    "走进", "推开", "抬起头", "皱眉", "。”", "！”", "？”",
+)
+PRONOUNS = ("他", "她", "我们", "你们", "他们", "她们")
+# 中文字符占比达到该值时视为中文为主的文本
+CJK_DOMINANT_RATIO = 0.5
+OPEN_QUOTES = ("“", "「", "『", "\"")
+
+_CJK = re.compile(r"[一-鿿]")
+_WORD_CHAR = re.compile(r"[一-鿿A-Za-z]")
+_SENTENCE_END = re.compile(r"[。！？!?…]+")
+_PUNCTUATION = re.compile(r"[，。！？、；：“”‘’「」『』（）《》…—,.!?;:\"'()]")
+
+
+def _count(text: str, cues) -> int:
+    return sum(text.count(cue) for cue in cues)
+
+
+def extract_features(text: str) -> Dict[str, float]:
+    """
+    提取分类特征：文本长度、句子与段落数、标点密度、对话引号、人称代词密度、
+    字符多样性（重复字与乱码），以及构思类与叙事类字符 n-gram 的出现次数
+    """
+    stripped = text.strip()
+    length = len(stripped)
+    word_chars = len(_WORD_CHAR.findall(stripped))
+    bigrams = Counter(stripped[i:i + 2] for i in range(max(0, length - 1)))
+    return {
+        "length": length,
+        "lines": len([line for line in stripped.splitlines() if line.strip()]),
+        "sentences": len(_SENTENCE_END.findall(stripped)),
+        "cjk_ratio": len(_CJK.findall(stripped)) / length if length else 0.0,
+        "word_ratio": word_chars / length if length else 0.0,
+        "punctuation_density": len(_PUNCTUATION.findall(stripped)) / length if length else 0.0,
+        "unique_ratio": len(set(stripped)) / length if length else 0.0,
+        # 最常见双字占比，"哈哈哈哈" 之类的重复内容很高
+        "top_bigram_ratio": bigrams.most_common(1)[0][1] / sum(bigrams.values()) if bigrams else 0.0,
+        "quotes": _count(stripped, OPEN_QUOTES),
+        "idea_cues": _count(stripped, IDEA_CUES),
+        "narrative_cues": _count(stripped, NARRATIVE_CUES),
+        "pronoun_density": _count(stripped, PRONOUNS) * 100 / length if length else 0.0,
+    }
+
+
+def is_cjk_dominant(features: Dict[str, float]) -> bool:
+    """文本是否以中文为主"""
+    return features["cjk_ratio"] >= CJK_DOMINANT_RATIO
+
+
+def score(features: Dict[str, float]) -> Dict[ContentLabel, float]:
+    """按特征计算各类别的得分（对数几率）"""
+    length = features["length"]
+    per_kchar = max(length, 200) / 1000
+    idea_cues = features["idea_cues"] / per_kchar
+    narrative_cues = features["narrative_cues"] / per_kchar
+    quotes = features["quotes"] / per_kchar
+
+    meaningless = -2.0
+    if length < 6:
+        meaningless += 4.0
+    # 字符多样性与重复内容只对中文为主的文本有效：拉丁字母文本只有几十种字符，正常行文的 unique_ratio 同样很低
+    if is_cjk_dominant(features) and length >= 10 and (
+        features["unique_ratio"] < 0.15 or features["top_bigram_ratio"] > 0.3
+    ):
+        meaningless += 5.0
+    if features["word_ratio"] < 0.4:
+        meaningless += 4.0
+    if features["word_ratio"] > 0.5 and features["cjk_ratio"] < 0.3 and features["sentences"] == 0:
+        meaningless += 1.5
+    meaningless -= 0.8 * min(features["idea_cues"] + features["narrative_cues"], 4)
+
+    idea = 0.0
+    idea += 0.8 * min(idea_cues, 8)
+    idea += 1.5 if length < 300 else (-1.0 if length > 1500 else 0.0)
+    idea -= 0.6 * min(quotes, 8)
+    idea -= 0.4 * min(narrative_cues, 8)
+
+    novel = -1.0
+    novel += 0.6 * min(quotes, 8)
+    novel += 0.6 * min(narrative_cues, 8)
+    novel += 0.5 * min(features["pronoun_density"], 4)
+    novel += 2.5 if length > 1500 else (1.0 if length > 500 else (-1.5 if length < 100 else 0.0))
+    novel += 0.5 if features["sentences"] >= 10 else 0.0
+    novel -= 0.3 * min(idea_cues, 8)
+
+    return {ContentLabel.IDEA: idea, ContentLabel.NOVEL: novel, ContentLabel.MEANINGLESS: meaningless}
+
+
+@dataclass
+class Classification:
+    """本地分类结果，confident 为 False 时需要交给大模型判断"""
+    label: ContentLabel
+    confidence: float
+    confident: bool
+    probabilities: Dict[str, float] = field(default_factory=dict)
+    llm_required: bool = False  # 无论置信度如何都交给大模型判断（非中文为主的文本判为无意义）
+
+
+class ContentClassifier:
+    """
+    创建游戏时的内容类型本地预分类器（单例模式）
+
+    按文本启发式与字符 n-gram 特征计算各类别得分，softmax 后最高概率达到
+    CONTENT_CLASSIFIER_CONFIDENCE 时直接采用，否则由调用方回退到大模型分类。
+    非中文为主的文本特征只针对中文设计，判为无意义时总是交给大模型确认，不直接拒绝。
+    只检查前 CONTENT_CLASSIFIER_MAX_CHARS 个字符，耗时在毫秒以内。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._counts: Counter = Counter()
+            self._local_seconds = 0.0
+            self._initialized = True
+
+    def classify(self, text: str) -> Classification:
+        """对文本进行本地分类"""
+        settings = get_settings()
+        started = time.perf_counter()
+        features = extract_features(text[:settings.CONTENT_CLASSIFIER_MAX_CHARS])
+        scores = score(features)
+        peak = max(scores.values())
+        weights = {label: math.exp(value - peak) for label, value in scores.items()}
+        total = sum(weights.values())
+        probabilities = {label: weight / total for label, weight in weights.items()}
+        label = max(probabilities, key=probabilities.get)
+        confidence = probabilities[label]
+        llm_required = label == ContentLabel.MEANINGLESS and not is_cjk_dominant(features)
+        confident = (
+            settings.CONTENT_CLASSIFIER_ENABLED
+            and not llm_required
+            and confidence >= settings.CONTENT_CLASSIFIER_CONFIDENCE
+        )
+
+        with self._lock:
+            self._local_seconds += time.perf_counter() - started
+            self._counts["classified"] += 1
+            self._counts[f"local_{label.name.lower()}" if confident else "llm_fallback"] += 1
+        return Classification(
+            label=label,
+            confidence=confidence,
+            confident=confident,
+            probabilities={label.value: round(probability, 4) for label, probability in probabilities.items()},
+            llm_required=llm_required
+        )
+
+    def snapshot(self) -> Dict[str, object]:
+        """本地分类与回退大模型的次数"""
+        with self._lock:
+            counts = dict(self._counts)
+            classified = counts.get("classified", 0)
+            return {
+                **counts,
+                "local_rate": round(1 - counts.get("llm_fallback", 0) / classified, 4) if classified else 0.0,
+                "avg_local_microseconds": round(self._local_seconds * 1e6 / classified, 1) if classified else 0.0,
+            }
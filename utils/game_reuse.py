@@ -0,0 +1,97 @@
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from config import get_settings
+from models.game import DBGame, GameStatus
+from utils.single_flight import make_key
+
+logger = logging.getLogger(__name__)
+
+# 不影响生成内容的设置，不计入内容哈希
+NON_CONTENT_SETTINGS = ("deadline_seconds",)
+
+# 复用时从来源游戏复制的中间产物
+CLONED_FIELDS = (
+    "input_text_type",
+    "story_character_info",
+    "chapters",
+    "total_chapters",
+    "resources",
+    "character_resources",
+    "dialogue_tts_resources",
+    "scene_image_resources",
+    "background_music_resources",
+    "progress",
+)
+
+
+def content_hash(novel_text: str, settings: Dict[str, Any]) -> str:
+    """规范化小说文本与生成设置的哈希，相同输入的游戏生成结果可以互相复用"""
+    return make_key(
+        novel_text=novel_text,
+        settings={name: value for name, value in settings.items() if name not in NON_CONTENT_SETTINGS}
+    )
+
+
+class GameReuse:
+    """
+    相同输入的游戏复用（单例模式）
+
+    创建游戏时按内容哈希查找已完成的游戏，找到时复制其角色信息、章节脚本与媒体资源，
+    新游戏无需调用大模型和媒体服务商即可直接发布。请求指定 fresh 时跳过复用重新生成，
+    新生成的游戏同样记录内容哈希，之后的相同输入复用最新的一个。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._counts: Counter = Counter()
+            self._initialized = True
+
+    async def find_source(self, game_repository, content_hash: str, fresh: bool = False) -> Optional[DBGame]:
+        """查找可复用的已完成游戏，未开启复用、指定重新生成或没有时返回None"""
+        if not get_settings().GAME_REUSE_ENABLED:
+            return None
+        if fresh:
+            self._counts["fresh"] += 1
+            return None
+        source = await game_repository.find_reusable(content_hash)
+        self._counts["hits" if source else "misses"] += 1
+        return source
+
+    def clone(self, source: DBGame, **fields: Any) -> DBGame:
+        """以来源游戏的中间产物创建新游戏，fields 为新游戏自己的字段（用户、标题、设置等）"""
+        copied = source.model_copy(deep=True)
+        game = DBGame(
+            **{name: getattr(copied, name) for name in CLONED_FIELDS},
+            **fields,
+            cloned_from=source.id,
+            status=GameStatus.GENERATING,
+            # 与新建游戏一样只开放第一章，后续章节仍需消耗次数生成（脚本与资源已就绪时直接发布）
+            generate_chapter_index=1
+        )
+        logger.info(f"游戏 {game.id} 复用游戏 {source.id} 的生成结果")
+        return game
+
+    def record_failure(self) -> None:
+        """复用的游戏发布失败，改为正常生成"""
+        self._counts["publish_failed"] += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """复用命中、未命中与强制重新生成的次数"""
+        counts = dict(self._counts)
+        lookups = counts.get("hits", 0) + counts.get("misses", 0)
+        return {
+            **counts,
+            "hit_rate": round(counts.get("hits", 0) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationLocks:
+    """
+    游戏生成锁（单例模式）
+
+    同一游戏同时只允许一条生成流水线，锁保存在 MongoDB generation_locks 集合中，跨 worker 进程生效。
+    锁不可重入：获取成功时返回持有者标识，同一进程内再次获取同一游戏的锁也会失败。
+    接口在扣除次数前获取锁，并把持有者标识交给它提交的流水线，流水线结束时凭该标识释放；
+    排队与熔断暂停期间锁同样由本进程定期续期。进程异常退出时锁在 GENERATION_LOCK_TTL_SECONDS 后过期。
+
+    下一章预生成持有可抢占的锁：确认生成下一章的请求（可能在其他 worker 上）通过锁请求抢占，
+    预生成每 GENERATION_LOCK_PREEMPT_CHECK_SECONDS 秒续期时发现后停止并释放锁，之后请求方才获取锁开始生成。
+
+    其他进程取消游戏生成（删除、管理员取消）时在锁上记录取消原因，持有锁的进程续期时读取并在本进程中取消。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            # game_id -> (持有者标识, 续期任务)
+            self._held: Dict[str, Tuple[str, asyncio.Task]] = {}
+            self._preempted = 0
+            # 正在获取锁的游戏，避免同一进程的并发请求同时进入数据库获取
+            self._acquiring: Set[str] = set()
+            self._repository = None
+            self._initialized = True
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from core.container import get_generation_lock_repository
+            self._repository = get_generation_lock_repository()
+        return self._repository
+
+    def held(self, game_id: str) -> bool:
+        """本进程是否持有该游戏的锁"""
+        return str(game_id) in self._held
+
+    def owns(self, game_id: str, token: Optional[str]) -> bool:
+        """持有者标识是否仍持有该游戏的锁"""
+        held = self._held.get(str(game_id))
+        return held is not None and token is not None and held[0] == token
+
+    def token(self, game_id: str) -> Optional[str]:
+        """本进程持有该游戏的锁时返回持有者标识，用于取消排队中的游戏时释放锁"""
+        held = self._held.get(str(game_id))
+        return held[0] if held else None
+
+    async def acquire(
+        self,
+        game_id: str,
+        preemptible: bool = False,
+        preempt: bool = False,
+        on_lost: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Optional[str]:
+        """
+        获取游戏的生成锁
+
+        Args:
+            game_id: 游戏ID
+            preemptible: 获取可抢占的锁（下一章预生成）
+            preempt: 锁被可抢占的持有者持有时请求抢占，并等待其释放
+            on_lost: 锁被抢占或被请求抢占时调用，持有者应在其中停止工作并释放锁
+
+        Returns:
+            Optional[str]: 持有者标识，锁已被任一持有者（包括本进程）持有时返回None
+        """
+        token = await self._acquire(game_id, preemptible, on_lost)
+        if token is not None or not preempt:
+            return token
+
+        wait_seconds = get_settings().GENERATION_LOCK_PREEMPT_WAIT_SECONDS
+        if not await self.repository.request_preempt(str(game_id), wait_seconds):
+            return None
+        self._preempted += 1
+        logger.info(f"请求抢占游戏 {game_id} 的预生成锁")
+        deadline = time.monotonic() + wait_seconds + 1.0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            token = await self._acquire(game_id, preemptible, on_lost)
+            if token is not None:
+                return token
+        return None
+
+    async def _acquire(
+        self,
+        game_id: str,
+        preemptible: bool,
+        on_lost: Optional[Callable[[], Awaitable[None]]]
+    ) -> Optional[str]:
+        game_id = str(game_id)
+        if game_id in self._held or game_id in self._acquiring:
+            return None
+        self._acquiring.add(game_id)
+        try:
+            owner = uuid.uuid4().hex
+            acquired = await self.repository.acquire(
+                game_id, owner, get_settings().GENERATION_LOCK_TTL_SECONDS, preemptible=preemptible
+            )
+            # 数据库不可用（返回None）时退化为进程内互斥
+            if acquired is False:
+                return None
+            renew_task = asyncio.create_task(self._renew(game_id, owner, preemptible, on_lost))
+            self._held[game_id] = (owner, renew_task)
+            return owner
+        finally:
+            self._acquiring.discard(game_id)
+
+    async def _renew(
+        self,
+        game_id: str,
+        owner: str,
+        preemptible: bool,
+        on_lost: Optional[Callable[[], Awaitable[None]]]
+    ) -> None:
+        settings = get_settings()
+        ttl = settings.GENERATION_LOCK_TTL_SECONDS
+        interval = min(ttl / 3, settings.GENERATION_LOCK_PREEMPT_CHECK_SECONDS) if preemptible else ttl / 3
+        cancelled = False
+        while True:
+            await asyncio.sleep(interval)
+            state = await self.repository.renew(game_id, owner, ttl)
+            if state is None:
+                logger.warning(f"游戏 {game_id} 的生成锁已被其他持有者抢占")
+                if on_lost is not None:
+                    # 持有者停止工作时凭标识释放锁，被请求抢占的锁随即可被获取
+                    await on_lost()
+                if self.owns(game_id, owner):
+                    del self._held[game_id]
+                return
+            reason = state.get("cancel_reason")
+            if reason and not cancelled:
+                cancelled = True
+                logger.info(f"游戏 {game_id} 的生成已在其他进程被取消: {reason}")
+                from utils.cancellation import CancellationRegistry
+                await CancellationRegistry().cancel(game_id, reason)
+                if not self.owns(game_id, owner):
+                    return
+
+    async def release(self, game_id: str, token: Optional[str]) -> None:
+        """凭持有者标识释放锁，标识不匹配（锁已被抢占或重新获取）时不做任何事"""
+        game_id = str(game_id)
+        if not self.owns(game_id, token):
+            return
+        _, renew_task = self._held.pop(game_id)
+        if renew_task is not asyncio.current_task():
+            renew_task.cancel()
+        await self.repository.release(game_id, token)
+
+    async def is_locked(self, game_id: str) -> bool:
+        """是否有任一进程持有该游戏的锁"""
+        return self.held(game_id) or await self.repository.is_locked(str(game_id))
+
+    def snapshot(self) -> Dict[str, object]:
+        return {"held": list(self._held), "preempted": self._preempted}
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 对冲预算的最大累积量（次），避免长时间低延迟后集中对冲
+MAX_HEDGE_TOKENS = 10.0
+
+
+class Hedger:
+    """
+    对冲请求（每个服务商一个实例，通过名称注册）
+
+    调用超过近期调用耗时的 HEDGE_PERCENTILE 分位数仍未返回时，再发出一个相同的请求，
+    先成功的结果生效，另一个被取消。样本不足 HEDGE_MIN_SAMPLES 时不对冲。
+
+    对冲预算：每个请求积累 HEDGE_BUDGET_RATIO 次对冲额度，每次对冲消耗一次，
+    对冲请求数因此不超过总请求数的 HEDGE_BUDGET_RATIO（外加少量累积额度）。
+    """
+    _registry: Dict[str, "Hedger"] = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, name: str):
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = super().__new__(cls)
+            return cls._registry[name]
+
+    def __init__(self, name: str):
+        if not hasattr(self, '_initialized'):
+            self.name = name
+            self._latencies: Deque[float] = deque(maxlen=get_settings().HEDGE_SAMPLE_SIZE)
+            self._tokens = 0.0
+            self._requests = 0
+            self._hedged = 0
+            self._hedge_wins = 0
+            self._skipped = 0
+            self._initialized = True
+
+    @property
+    def enabled(self) -> bool:
+        settings = get_settings()
+        return {"tts": settings.TTS_HEDGING_ENABLED}.get(self.name, False)
+
+    def threshold(self) -> Optional[float]:
+        """发出对冲请求前的等待时间（秒），样本不足时返回None"""
+        settings = get_settings()
+        if len(self._latencies) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * settings.HEDGE_PERCENTILE))
+        return max(settings.HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # 被对冲取消的慢请求按已耗时计入样本（实际耗时只会更长），避免阈值只由快请求决定
+            self._latencies.append(time.monotonic() - started)
+            raise
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    async def run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行无参协程函数，超过阈值未返回时对冲
+
+        两个请求都失败时抛出原请求的异常。
+        """
+        if not self.enabled:
+            return await fn()
+        self._requests += 1
+        self._tokens = min(MAX_HEDGE_TOKENS, self._tokens + get_settings().HEDGE_BUDGET_RATIO)
+        delay = self.threshold()
+        if delay is None:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if self._tokens < 1:
+                self._skipped += 1
+                return await primary
+            self._tokens -= 1
+            self._hedged += 1
+            hedge = asyncio.ensure_future(self._timed(fn))
+            tasks.add(hedge)
+
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._hedge_wins += 1
+                        return task.result()
+            # 两个请求都失败
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        threshold = self.threshold()
+        return {
+            "enabled": self.enabled,
+            "threshold_seconds": round(threshold, 3) if threshold is not None else None,
+            "samples": len(self._latencies),
+            "requests": self._requests,
+            "hedged": self._hedged,
+            "hedge_wins": self._hedge_wins,
+            "hedge_rate": round(self._hedged / self._requests, 4) if self._requests else 0.0,
+            "skipped_over_budget": self._skipped,
+        }
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, object]]:
+        """获取所有服务商的对冲统计"""
+        with cls._registry_lock:
+            hedgers = list(cls._registry.items())
+        return {name: hedger.stats() for name, hedger in hedgers}
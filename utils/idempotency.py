@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Type, TypeVar
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# 等待首个请求完成时的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+async def run_idempotent(
+    user_id: str,
+    scope: str,
+    key: Optional[str],
+    fingerprint: str,
+    handler: Callable[[], Awaitable[T]],
+    response_model: Type[T],
+    should_store: Callable[[T], bool] = lambda response: True,
+) -> T:
+    """
+    按 Idempotency-Key 执行请求：同一用户、接口与键的重复请求返回首个请求的响应，不再重复执行
+
+    Args:
+        user_id: 用户ID
+        scope: 接口标识，如 create、next_chapter:<game_id>
+        key: 请求头 Idempotency-Key，为空时直接执行
+        fingerprint: 请求内容指纹，同一个键用于不同请求内容时返回 422
+        handler: 实际处理请求的无参协程函数
+        response_model: 响应模型，用于还原已保存的响应
+        should_store: 是否保存响应；不保存时（如未产生任何效果的失败）删除记录，允许客户端用同一个键重试
+
+    Raises:
+        HTTPException: 422 键已用于不同请求；409 首个请求仍在处理
+    """
+    if not key:
+        return await handler()
+
+    from core.container import get_idempotency_repository
+    repository = get_idempotency_repository()
+    settings = get_settings()
+    record_id = f"{user_id}:{scope}:{key}"
+
+    first, record = await repository.begin(record_id, fingerprint, settings.IDEMPOTENCY_TTL_SECONDS)
+    if not first:
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        # 首个请求仍在处理时等待它完成
+        while record and record["status"] == "pending" and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            record = await repository.get(record_id)
+        if record is None:
+            # 首个请求失败后记录已删除，按新请求处理
+            return await run_idempotent(user_id, scope, key, fingerprint, handler, response_model, should_store)
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key 已用于不同的请求")
+        if record["status"] == "pending":
+            raise HTTPException(status_code=409, detail="相同 Idempotency-Key 的请求仍在处理中")
+        logger.info(f"重复请求 {record_id}，返回首次请求的响应")
+        return response_model.model_validate(record["response"])
+
+    try:
+        response = await handler()
+    except BaseException:
+        await repository.release(record_id)
+        raise
+    if should_store(response):
+        await repository.complete(record_id, response.model_dump(mode="json"))
+    else:
+        await repository.release(record_id)
+    return response
@@ -0,0 +1,170 @@
+from typing import Dict, List, Optional
+import logging
+
+from config import get_settings
+from models.image_cache import DBImageCache
+from models.types import PyObjectId
+from utils.image_tool import DEFAULT_SD_MODEL, DEFAULT_SAMPLER
+from utils.single_flight import make_key, normalize_text
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCOPE_OFF = "off"
+CACHE_SCOPE_GAME = "game"
+CACHE_SCOPE_GLOBAL = "global"
+
+
+class ImageCache:
+    """
+    图片缓存，按规范化提示词、模型、采样器与尺寸复用已生成的图片
+
+    复用范围由 IMAGE_CACHE_SCOPE 控制：
+    - off: 不复用
+    - game: 只复用同一游戏生成过的图片（跨章节）
+    - global: 跨游戏复用
+
+    同一缓存键下可保存多个图片变体（如提示词相同的不同角色）。
+    """
+    _hits = 0
+    _misses = 0
+
+    def __init__(self, scope: Optional[str] = None):
+        settings = get_settings()
+        self.scope = scope or settings.IMAGE_CACHE_SCOPE
+        self.max_entries = settings.IMAGE_CACHE_MAX_ENTRIES
+        self._repository = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.scope in (CACHE_SCOPE_GAME, CACHE_SCOPE_GLOBAL)
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from core.container import get_image_cache_repository
+            self._repository = get_image_cache_repository()
+        return self._repository
+
+    @staticmethod
+    def make_cache_key(
+        kind: str,
+        prompt: str,
+        width: int,
+        height: int,
+        sd_model: str = DEFAULT_SD_MODEL,
+        sampler: str = DEFAULT_SAMPLER,
+    ) -> str:
+        """生成缓存键，提示词大小写与空白差异不影响结果"""
+        return make_key(
+            kind=kind,
+            prompt=normalize_text(prompt).lower(),
+            width=width,
+            height=height,
+            sd_model=sd_model,
+            sampler=sampler,
+        )
+
+    async def lookup_many(
+        self,
+        kind: str,
+        prompt: str,
+        width: int,
+        height: int,
+        game_id: PyObjectId,
+        count: int,
+        sd_model: str = DEFAULT_SD_MODEL,
+        sampler: str = DEFAULT_SAMPLER,
+    ) -> List[str]:
+        """
+        查找最多 count 个可复用的图片变体
+
+        Returns:
+            List[str]: 命中的图片地址，可能少于 count 个
+        """
+        if not self.enabled or count <= 0:
+            return []
+        cache_key = self.make_cache_key(kind, prompt, width, height, sd_model, sampler)
+        entry = await self.repository.get_by_key(
+            cache_key,
+            game_id=game_id if self.scope == CACHE_SCOPE_GAME else None
+        )
+        if not entry:
+            ImageCache._misses += 1
+            return []
+
+        ImageCache._hits += 1
+        if game_id not in entry.game_ids:
+            await self.repository.add_usage(cache_key, game_id)
+        logger.info(f"图片缓存命中: {kind} {prompt[:50]}")
+        return entry.urls[:count]
+
+    async def lookup(
+        self,
+        kind: str,
+        prompt: str,
+        width: int,
+        height: int,
+        game_id: PyObjectId,
+        sd_model: str = DEFAULT_SD_MODEL,
+        sampler: str = DEFAULT_SAMPLER,
+    ) -> Optional[str]:
+        """
+        查找可复用的图片地址
+
+        Returns:
+            Optional[str]: 命中时返回图片地址，否则返回None
+        """
+        urls = await self.lookup_many(kind, prompt, width, height, game_id, 1, sd_model, sampler)
+        return urls[0] if urls else None
+
+    async def store_many(
+        self,
+        kind: str,
+        prompt: str,
+        width: int,
+        height: int,
+        urls: List[str],
+        game_id: PyObjectId,
+        sd_model: str = DEFAULT_SD_MODEL,
+        sampler: str = DEFAULT_SAMPLER,
+    ) -> None:
+        """写入新生成的图片变体并按LRU淘汰超出上限的记录"""
+        if not self.enabled or not urls:
+            return
+        entry = DBImageCache(
+            cache_key=self.make_cache_key(kind, prompt, width, height, sd_model, sampler),
+            kind=kind,
+            prompt=normalize_text(prompt),
+            sd_model=sd_model,
+            sampler=sampler,
+            width=width,
+            height=height,
+        )
+        if await self.repository.put(entry, urls, game_id):
+            evicted = await self.repository.evict(self.max_entries)
+            if evicted:
+                logger.info(f"图片缓存淘汰 {evicted} 条记录")
+
+    async def store(
+        self,
+        kind: str,
+        prompt: str,
+        width: int,
+        height: int,
+        url: str,
+        game_id: PyObjectId,
+        sd_model: str = DEFAULT_SD_MODEL,
+        sampler: str = DEFAULT_SAMPLER,
+    ) -> None:
+        """写入新生成的图片"""
+        await self.store_many(kind, prompt, width, height, [url], game_id, sd_model, sampler)
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        """当前进程的缓存命中统计"""
+        total = cls._hits + cls._misses
+        return {
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "hit_rate": round(cls._hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from config import get_settings
+from models.db_runtime_game import DBRuntimeGame, DBRuntimeBranch
+from models.game import DBGame
+from models.types import PyObjectId
+from repositories.mongo_repository import MongoRepository
+from schemas.script_commands import CommandType, DialogueCommand
+from utils.scheduler import Priority, set_job_context, set_priority
+from utils.single_flight import SingleFlight, make_key
+from workflows.dialogue_tts_workflow import TTS_MODE_LAZY, DialogueTTSWorkflow, get_tts_mode
+
+logger = logging.getLogger(__name__)
+
+
+class LazyTTSError(Exception):
+    """按需语音合成请求错误（目标不存在或不是对话）"""
+    pass
+
+
+class LazyTTSUnavailable(LazyTTSError):
+    """游戏不是按需合成语音模式"""
+    pass
+
+
+class LazyTTSQuotaExceeded(LazyTTSError):
+    """用户按需合成语音的次数超过限制"""
+    pass
+
+
+class LazyTTSQuota:
+    """
+    按用户限制按需合成语音的次数（单例模式）
+
+    每个用户每分钟最多合成 LAZY_TTS_USER_LINES_PER_MINUTE 句（包括后台预取），
+    避免单个客户端对任意已发布游戏无限制地触发服务商调用。计数保存在进程内。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            # user_id -> 最近一分钟内的合成时间（time.monotonic）
+            self._usage: Dict[str, Deque[float]] = {}
+            self._rejected = 0
+            self._initialized = True
+
+    def take(self, user_id: str, lines: int) -> int:
+        """
+        为用户扣除至多 lines 句的额度
+
+        Returns:
+            int: 实际扣除的句数
+        """
+        limit = get_settings().LAZY_TTS_USER_LINES_PER_MINUTE
+        now = time.monotonic()
+        usage = self._usage.setdefault(str(user_id), deque())
+        while usage and now - usage[0] >= 60:
+            usage.popleft()
+        granted = max(0, min(lines, limit - len(usage)))
+        usage.extend([now] * granted)
+        if granted < lines:
+            self._rejected += lines - granted
+        # 清理一分钟内没有合成的用户
+        for stale in [user for user, times in self._usage.items() if not times or now - times[-1] >= 60]:
+            del self._usage[stale]
+        return granted
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"users": len(self._usage), "rejected": self._rejected}
+
+
+class LazyDialogueTTS:
+    """
+    按需对话语音合成
+
+    游戏以无语音的方式发布，玩家播放到某句对话时才合成：结果写入
+    dialogue_tts_resources，并直接修补运行时游戏中该指令的 oss_url，
+    随后在后台预取当前分支接下来的几句对话。
+    """
+
+    # 后台预取任务，保存引用避免被垃圾回收
+    _background_tasks: Set[asyncio.Task] = set()
+
+    def __init__(
+        self,
+        game_repository: MongoRepository[DBGame],
+        runtime_game_repository: MongoRepository[DBRuntimeGame]
+    ):
+        self.game_repository = game_repository
+        self.runtime_game_repository = runtime_game_repository
+        self._tts_workflow = DialogueTTSWorkflow(game_repository)
+
+    @staticmethod
+    def _locate(
+        runtime_game: DBRuntimeGame,
+        chapter_index: int,
+        branch_name: str
+    ) -> Tuple[int, int, DBRuntimeBranch]:
+        """定位章节与分支在运行时游戏中的数组位置"""
+        for chapter_pos, chapter in enumerate(runtime_game.chapters):
+            if chapter.index != chapter_index:
+                continue
+            for branch_pos, branch in enumerate(chapter.branches):
+                if branch.name == branch_name:
+                    return chapter_pos, branch_pos, branch
+        raise LazyTTSError(f"章节 {chapter_index} 中不存在分支 {branch_name}")
+
+    async def synthesize(
+        self,
+        game_id: PyObjectId,
+        chapter_index: int,
+        branch_name: str,
+        command_index: int,
+        user_id: str
+    ) -> Optional[str]:
+        """
+        获取一句已发布游戏中对话的语音地址，未合成时立即合成
+
+        Args:
+            game_id: 游戏ID
+            chapter_index: 章节索引
+            branch_name: 分支名称
+            command_index: 指令在运行时分支中的位置
+            user_id: 请求的用户ID，用于限制合成次数
+
+        Returns:
+            Optional[str]: 语音地址；主角台词或无法匹配角色时返回None
+
+        Raises:
+            LazyTTSError: 游戏（未发布或已删除）、分支或指令不存在，或指令不是对话
+            LazyTTSUnavailable: 游戏不是按需合成语音模式
+            LazyTTSQuotaExceeded: 用户合成次数超过限制
+        """
+        game = await self.game_repository.get(game_id)
+        if not game or game.is_deleted:
+            raise LazyTTSError("游戏不存在")
+        if get_tts_mode(game) != TTS_MODE_LAZY:
+            raise LazyTTSUnavailable("游戏不是按需合成语音模式")
+        runtime_game = await self.runtime_game_repository.get(game_id)
+        if not runtime_game or runtime_game.is_deleted:
+            raise LazyTTSError("游戏不存在")
+        chapter_pos, branch_pos, branch = self._locate(runtime_game, chapter_index, branch_name)
+        if not 0 <= command_index < len(branch.commands):
+            raise LazyTTSError(f"指令位置 {command_index} 超出范围")
+        command = branch.commands[command_index]
+        if command.type != CommandType.DIALOGUE:
+            raise LazyTTSError("只能为对话指令合成语音")
+        if command.oss_url:
+            return command.oss_url
+
+        quota = LazyTTSQuota()
+        if not quota.take(user_id, 1):
+            raise LazyTTSQuotaExceeded("语音合成请求过于频繁，请稍后再试")
+        # 玩家正在等待这句语音，按最高优先级调度
+        set_job_context(game.user_id, game.id, Priority.FIRST_CHAPTER)
+
+        url = await self._synthesize_command(game, chapter_index, chapter_pos, branch_pos, command_index, branch)
+
+        # 后台预取当前分支接下来的对话，预取同样占用用户的额度
+        prefetch = self._next_dialogue_positions(branch, command_index, get_settings().DIALOGUE_TTS_PREFETCH_LINES)
+        prefetch = prefetch[:quota.take(user_id, len(prefetch))] if prefetch else prefetch
+        if prefetch:
+            task = asyncio.create_task(
+                self._prefetch(game, chapter_index, chapter_pos, branch_pos, branch, prefetch)
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        return url
+
+    @staticmethod
+    def _next_dialogue_positions(branch: DBRuntimeBranch, command_index: int, count: int) -> List[int]:
+        """当前指令之后尚无语音的对话位置"""
+        positions = []
+        for position in range(command_index + 1, len(branch.commands)):
+            if len(positions) >= count:
+                break
+            command = branch.commands[position]
+            if command.type == CommandType.DIALOGUE and not command.oss_url:
+                positions.append(position)
+        return positions
+
+    async def _prefetch(
+        self,
+        game: DBGame,
+        chapter_index: int,
+        chapter_pos: int,
+        branch_pos: int,
+        branch: DBRuntimeBranch,
+        positions: List[int]
+    ) -> None:
+        set_priority(Priority.BACKFILL)
+        results = await asyncio.gather(
+            *[
+                self._synthesize_command(game, chapter_index, chapter_pos, branch_pos, position, branch)
+                for position in positions
+            ],
+            return_exceptions=True
+        )
+        for position, result in zip(positions, results):
+            if isinstance(result, Exception):
+                logger.warning(f"预取语音失败，游戏 {game.id} 章节 {chapter_index} 分支 {branch.name} 位置 {position}: {str(result)}")
+
+    async def _synthesize_command(
+        self,
+        game: DBGame,
+        chapter_index: int,
+        chapter_pos: int,
+        branch_pos: int,
+        command_index: int,
+        branch: DBRuntimeBranch
+    ) -> Optional[str]:
+        """合成（或复用）一句对话的语音，并修补运行时游戏"""
+        command = branch.commands[command_index]
+        # 同一句对话的并发请求只合成、记录一次
+        key = make_key(game_id=str(game.id), chapter_index=chapter_index, text=command.content)
+        url = await SingleFlight("lazy_tts").do(
+            key, lambda: self._resolve_audio(game, chapter_index, command.name, command.content)
+        )
+        if url:
+            command.oss_url = url
+            await self.runtime_game_repository.update(
+                id=game.id,
+                fields={f"chapters.{chapter_pos}.branches.{branch_pos}.commands.{command_index}.oss_url": url}
+            )
+        return url
+
+    async def _resolve_audio(self, game: DBGame, chapter_index: int, character_name: str, text: str) -> Optional[str]:
+        """查找已有语音资源，没有时调用TTS合成并保存"""
+        for resource in game.dialogue_tts_resources:
+            if resource.chapter_index == chapter_index and resource.text == text:
+                return resource.audio_url
+
+        character = self._tts_workflow._find_character(character_name, game.story_character_info)
+        # 主角不生成语音
+        if not character or character.is_protagonist:
+            return None
+
+        resource = await self._tts_workflow.synthesize_line(
+            chapter_index,
+            DialogueCommand(character=character_name, emotion="", text=text),
+            character
+        )
+        if not resource:
+            return None
+        game.dialogue_tts_resources.append(resource)
+        await self.game_repository.push(game.id, "dialogue_tts_resources", resource)
+        return resource.audio_url
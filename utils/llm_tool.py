@@ -4,6 +4,8 @@ from threading import Lock
 from fastapi import HTTPException
 from utils.clients import DeepSeekClient
 from utils.prompt_manager import PromptManager
+from utils.scheduler import FairScheduler
+from utils.timeline import GenerationTimeline
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,8 @@ class LLMTool:
         system_prompt: str,
         user_prompt: str,
         temperature: float = 0.7,
-        prompt_replacements: Optional[Dict[str, Any]] = None
+        prompt_replacements: Optional[Dict[str, Any]] = None,
+        static_replacements: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         生成大模型回复
@@ -39,6 +42,7 @@ class LLMTool:
             user_prompt: 用户提示词模板名称
             temperature: 采样温度
             prompt_replacements: 提示词模板替换参数
+            static_replacements: 跨调用不变的模板替换参数，会排在动态内容之前以复用上下文缓存
             
         Returns:
             str: 大模型生成的回复
@@ -49,12 +53,17 @@ class LLMTool:
             messages = prompt_manager.create_messages(
                 system_prompt=system_prompt,
                 user_prompt_name=user_prompt,
-                user_params=prompt_replacements
-            )
-            completion = await client.chat_completion(
-                messages=messages,
-                temperature=temperature,
+                user_params=prompt_replacements,
+                static_params=static_replacements
             )
+            with GenerationTimeline().span("llm", system_prompt):
+                completion = await FairScheduler("llm").run(
+                    lambda: client.chat_completion(
+                        messages=messages,
+                        temperature=temperature,
+                        prompt_name=system_prompt
+                    )
+                )
             return completion
         except Exception as e:
             logger.error(f"LLMTool 执行失败: {e}")
@@ -0,0 +1,69 @@
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class PromptUsageStats:
+    """单个提示词的 token 用量统计"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_cache_hit_tokens: int = 0
+    prompt_cache_miss_tokens: int = 0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """前缀缓存命中率（命中 token / 输入 token）"""
+        total = self.prompt_cache_hit_tokens + self.prompt_cache_miss_tokens
+        return self.prompt_cache_hit_tokens / total if total else 0.0
+
+
+class LLMUsageTracker:
+    """大模型用量统计器（单例模式），按提示词名称记录 DeepSeek 上下文缓存命中情况"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._stats: Dict[str, PromptUsageStats] = {}
+            self._initialized = True
+
+    def record(self, prompt_name: str, usage: Optional[Any]) -> None:
+        """
+        记录一次调用的 token 用量
+
+        Args:
+            prompt_name: 提示词名称
+            usage: 响应中的 usage 对象，DeepSeek 会额外返回
+                prompt_cache_hit_tokens / prompt_cache_miss_tokens
+        """
+        if usage is None:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(prompt_name, PromptUsageStats())
+            stats.calls += 1
+            stats.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            stats.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            stats.prompt_cache_hit_tokens += getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+            stats.prompt_cache_miss_tokens += getattr(usage, "prompt_cache_miss_tokens", 0) or 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有提示词的用量统计"""
+        with self._lock:
+            return {
+                name: {**asdict(stats), "cache_hit_rate": round(stats.cache_hit_rate, 4)}
+                for name, stats in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,404 @@
+import asyncio
+import bisect
+import glob
+import ipaddress
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图默认分桶（秒），覆盖毫秒级的数据库命令到分钟级的生成阶段
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelValues = Tuple[str, ...]
+# 导出的单个样本：(样本名, 标签, 值)
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+class _Metric:
+    """
+    预聚合指标
+
+    每组标签值一个累计值，更新只是一次字典操作，在事件循环线程中无需加锁。
+    threadsafe 为 True 时更新加锁，用于在线程池中回调的指标（如 MongoDB 命令监听）。
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), threadsafe: bool = False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock() if threadsafe else None
+
+    def _labels(self, values: LabelValues) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, values))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if self._lock:
+            with self._lock:
+                self._values[labels] = self._values.get(labels, 0.0) + amount
+        else:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        return [(f"{self.name}_total", self._labels(labels), value) for labels, value in list(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if self._lock:
+            with self._lock:
+                self._values[labels] = self._values.get(labels, 0.0) + amount
+        else:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(labels), value) for labels, value in list(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数..., +Inf 计数, 总和]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if self._lock:
+            with self._lock:
+                self._observe(value, labels)
+        else:
+            self._observe(value, labels)
+
+    def _observe(self, value: float, labels: LabelValues) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        for labels, state in list(self._values.items()):
+            base = self._labels(labels)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                samples.append((f"{self.name}_bucket", base + (("le", le),), cumulative))
+            samples.append((f"{self.name}_count", base, cumulative))
+            samples.append((f"{self.name}_sum", base, state[-1]))
+        return samples
+
+
+# 指标族：名称 -> (类型, 说明, 样本)
+Families = Dict[str, Tuple[str, str, List[Sample]]]
+
+
+class MetricsRegistry:
+    """
+    指标注册表（单例模式）
+
+    热路径上的指标在更新时预聚合；各组件已有的统计（熔断器、调度器、准入、限速、对冲、缓存、
+    大模型 token 等）由采集函数在导出时读取，不增加热路径开销。
+
+    METRICS_MULTIPROCESS_DIR 设置时，每个 uvicorn worker 每 METRICS_FLUSH_SECONDS 秒把本进程的样本
+    写入该目录下的 <pid>.json，/metrics 合并所有 worker 的文件：计数器与直方图相加，
+    仪表值按 pid 标签分别导出（超过 METRICS_STALE_SECONDS 未更新的 worker 的仪表值不再导出）。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._metrics: Dict[str, _Metric] = {}
+            self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+            self._flusher: Optional[asyncio.Task] = None
+            self._initialized = True
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, **kwargs))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]) -> None:
+        """
+        注册导出时调用的采集函数
+
+        采集函数返回 (指标名, 类型, 说明, 标签, 值)，计数器的指标名不带 _total 后缀。
+        """
+        self._collectors.append(collector)
+
+    def collect(self) -> Families:
+        """本进程的全部样本"""
+        families: Families = {}
+        for metric in list(self._metrics.values()):
+            families[metric.name] = (metric.kind, metric.documentation, metric.samples())
+        for collector in self._collectors:
+            try:
+                for name, kind, documentation, labels, value in collector():
+                    sample_name = f"{name}_total" if kind == "counter" else name
+                    family = families.setdefault(name, (kind, documentation, []))
+                    family[2].append((sample_name, tuple(sorted(labels.items())), float(value)))
+            except Exception as e:
+                logger.warning(f"指标采集失败: {str(e)}")
+        return families
+
+    def _serialize(self) -> Dict[str, list]:
+        return {
+            name: [kind, documentation, [[sample, list(labels), value] for sample, labels, value in samples]]
+            for name, (kind, documentation, samples) in self.collect().items()
+        }
+
+    @staticmethod
+    def _write(directory: str, families: Dict[str, list]) -> None:
+        """写入本进程的样本文件（原子替换）"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(families, f)
+        os.replace(tmp_path, path)
+
+    def ensure_flusher(self) -> None:
+        """启动本进程的定期写入任务（多进程模式下每个 worker 处理首个请求时调用）"""
+        if not get_settings().METRICS_MULTIPROCESS_DIR:
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        settings = get_settings()
+        while True:
+            try:
+                # 在事件循环中读取样本，只有文件写入放到线程池
+                families = self._serialize()
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._write, settings.METRICS_MULTIPROCESS_DIR, families
+                )
+            except Exception as e:
+                logger.warning(f"指标写入失败: {str(e)}")
+            await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+
+    @staticmethod
+    def _merged(local: Families) -> Families:
+        """写入本进程的样本并合并所有 worker 写入的样本（文件读写，在线程池中执行）"""
+        settings = get_settings()
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        MetricsRegistry._write(directory, local)
+        merged: Dict[str, Tuple[str, str, Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]]] = {}
+        now = time.time()
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            pid = os.path.basename(path)[:-len(".json")]
+            try:
+                stale = now - os.path.getmtime(path) > settings.METRICS_STALE_SECONDS
+                with open(path, "r", encoding="utf-8") as f:
+                    families = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, (kind, documentation, samples) in families.items():
+                values = merged.setdefault(name, (kind, documentation, {}))[2]
+                for sample, labels, value in samples:
+                    labels = tuple(tuple(pair) for pair in labels)
+                    if kind == "gauge":
+                        if stale:
+                            continue
+                        labels += (("pid", pid),)
+                    key = (sample, labels)
+                    values[key] = values.get(key, 0.0) + value
+        return {
+            name: (kind, documentation, [(sample, labels, value) for (sample, labels), value in values.items()])
+            for name, (kind, documentation, values) in merged.items()
+        }
+
+    async def render(self) -> str:
+        """按 Prometheus 文本格式（0.0.4）导出"""
+        if get_settings().METRICS_MULTIPROCESS_DIR:
+            # 在事件循环中读取样本，只有文件读写放到线程池
+            families = await asyncio.get_running_loop().run_in_executor(None, self._merged, self._serialize())
+        else:
+            families = self.collect()
+        lines: List[str] = []
+        for name in sorted(families):
+            kind, documentation, samples = families[name]
+            if not samples:
+                continue
+            header = f"{name}_total" if kind == "counter" else name
+            lines.append(f"# HELP {header} {_escape(documentation)}")
+            lines.append(f"# TYPE {header} {kind}")
+            for sample, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape_label(str(val))}"' for key, val in labels)
+                lines.append(f"{sample}{{{label_text}}} {_format(value)}" if labels else f"{sample} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def client_allowed(host: Optional[str]) -> bool:
+    """请求方地址是否在 METRICS_ALLOWED_HOSTS 中（逗号分隔的地址或网段，* 表示不限制）"""
+    allowed = [entry.strip() for entry in get_settings().METRICS_ALLOWED_HOSTS.split(",") if entry.strip()]
+    if "*" in allowed:
+        return True
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    for entry in allowed:
+        try:
+            if address in ipaddress.ip_network(entry, strict=False):
+                return True
+        except ValueError:
+            logger.warning(f"METRICS_ALLOWED_HOSTS 中的地址无效: {entry}")
+    return False
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(text: str) -> str:
+    return _escape(text).replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+# 热路径指标
+HTTP_REQUEST_DURATION = registry.histogram(
+    "gal_http_request_duration_seconds", "接口请求耗时", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("gal_http_requests_in_flight", "处理中的接口请求数")
+MONGODB_COMMAND_DURATION = registry.histogram(
+    "gal_mongodb_command_duration_seconds", "MongoDB 命令耗时", ("command", "outcome"), threadsafe=True
+)
+MONGODB_POOL_CONNECTIONS = registry.gauge(
+    "gal_mongodb_pool_connections", "MongoDB 连接池中的连接数", ("state",), threadsafe=True
+)
+PROVIDER_CALL_DURATION = registry.histogram(
+    "gal_provider_call_duration_seconds", "服务商调用耗时（不含排队）", ("provider", "outcome")
+)
+PROVIDER_CALLS_IN_FLIGHT = registry.gauge("gal_provider_calls_in_flight", "进行中的服务商调用数", ("provider",))
+PROVIDER_QUEUE_WAIT = registry.histogram(
+    "gal_provider_queue_wait_seconds", "服务商调用等待调度槽位的时间", ("provider",)
+)
+OSS_UPLOADED_BYTES = registry.counter("gal_oss_uploaded_bytes", "上传到 OSS 的字节数", ("type",))
+GENERATION_SPAN_DURATION = registry.histogram(
+    "gal_generation_span_duration_seconds", "生成时间线各时间段的耗时", ("kind", "name", "outcome")
+)
+
+
+def collect_components() -> Iterable[Tuple[str, str, str, Dict[str, str], float]]:
+    """导出时读取各组件已有的统计：大模型 token、缓存命中、熔断器、调度、准入、限速、对冲与进度推送"""
+    from utils.admission import AdmissionController
+    from utils.circuit_breaker import CircuitBreaker
+    from utils.content_classifier import ContentClassifier
+    from utils.game_reuse import GameReuse
+    from utils.hedging import Hedger
+    from utils.image_cache import ImageCache
+    from utils.llm_usage import LLMUsageTracker
+    from utils.music_library import MusicLibrary
+    from utils.progress_bus import ProgressBus
+    from utils.rate_limiter import AdaptiveRateLimiter
+    from utils.scheduler import FairScheduler
+    from utils.single_flight import SingleFlight
+
+    for prompt, usage in LLMUsageTracker().snapshot().items():
+        for kind in ("prompt_tokens", "completion_tokens", "prompt_cache_hit_tokens", "prompt_cache_miss_tokens"):
+            yield "gal_llm_tokens", "counter", "大模型 token 用量", {"prompt": prompt, "type": kind}, usage[kind]
+        yield "gal_llm_calls", "counter", "大模型调用次数", {"prompt": prompt}, usage["calls"]
+
+    caches = {
+        "image_cache": ImageCache.stats(),
+        "music_library": MusicLibrary().stats(),
+        "game_reuse": GameReuse().snapshot(),
+    }
+    for cache, stats in caches.items():
+        for result in ("hits", "misses"):
+            yield "gal_cache_lookups", "counter", "缓存查找次数", {"cache": cache, "result": result}, stats.get(result, 0)
+    classifier = ContentClassifier().snapshot()
+    classified = classifier.get("classified", 0)
+    llm_fallback = classifier.get("llm_fallback", 0)
+    for result, value in (("hits", classified - llm_fallback), ("misses", llm_fallback)):
+        yield "gal_cache_lookups", "counter", "缓存查找次数", {"cache": "content_classifier", "result": result}, value
+    for name, stats in SingleFlight.snapshot().items():
+        for result, value in (("executed", stats["executions"]), ("deduplicated", stats["saved"])):
+            yield "gal_single_flight_calls", "counter", "单飞去重的请求数", {"provider": name, "result": result}, value
+
+    for name, stats in CircuitBreaker.snapshot().items():
+        yield "gal_circuit_breaker_closed", "gauge", "熔断器是否关闭（1 为关闭）", {"provider": name}, stats["state"] == "closed"
+        yield "gal_circuit_breaker_opened", "counter", "熔断器打开次数", {"provider": name}, stats["opened"]
+        yield "gal_circuit_breaker_rejected", "counter", "熔断期间拒绝的调用数", {"provider": name}, stats["rejected"]
+
+    for name, stats in FairScheduler.snapshot().items():
+        yield "gal_scheduler_active", "gauge", "占用中的调度槽位", {"provider": name}, stats["active"]
+        yield "gal_scheduler_waiting", "gauge", "等待调度槽位的调用数", {"provider": name}, stats["waiting"]
+
+    admission = AdmissionController().snapshot()
+    yield "gal_admission_in_flight", "gauge", "进行中的生成流水线", {}, admission["in_flight"]
+    yield "gal_admission_queued", "gauge", "排队等待生成的游戏", {}, admission["queued"]
+    for decision, key in (("admitted", "admitted"), ("queued", "queued_total"), ("rejected", "rejected")):
+        yield "gal_admission_decisions", "counter", "生成准入决策次数", {"decision": decision}, admission[key]
+
+    for name, stats in AdaptiveRateLimiter.snapshot().items():
+        yield "gal_rate_limit_rate", "gauge", "自适应限速的当前速率（次/秒）", {"provider": name}, stats["rate_per_second"]
+        yield "gal_rate_limit_throttled", "counter", "服务商限流响应次数", {"provider": name}, stats["throttled"]
+
+    for name, stats in Hedger.snapshot().items():
+        yield "gal_hedge_requests", "counter", "对冲统计的请求数", {"provider": name, "result": "requests"}, stats["requests"]
+        yield "gal_hedge_requests", "counter", "对冲统计的请求数", {"provider": name, "result": "hedged"}, stats["hedged"]
+        yield "gal_hedge_requests", "counter", "对冲统计的请求数", {"provider": name, "result": "hedge_won"}, stats["hedge_wins"]
+
+    yield "gal_progress_subscribers", "gauge", "进度推送的订阅数", {}, ProgressBus().snapshot()["subscribers"]
+
+
+registry.register_collector(collect_components)
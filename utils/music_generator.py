@@ -2,12 +2,13 @@ import asyncio
 import httpx
 from typing import Optional, Dict, Any, List, Literal
 from dataclasses import dataclass
-from datetime import datetime, timedelta
 import logging
-from collections import deque
 from config import get_settings
 from enum import Enum
 from utils.ali_upload import upload_from_url
+from utils.single_flight import SingleFlight, make_key
+from utils.circuit_breaker import call_provider
+from utils.rate_limiter import AdaptiveRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -22,12 +23,6 @@ class MusicTaskStatus(str, Enum):
     CALLBACK_EXCEPTION = "CALLBACK_EXCEPTION"
     SENSITIVE_WORD_ERROR = "SENSITIVE_WORD_ERROR"
 
-@dataclass
-class RateLimitConfig:
-    """速率限制配置"""
-    max_requests: int = 20  # 最大请求数
-    time_window: int = 10   # 时间窗口（秒）
-
 @dataclass
 class MusicGenerationResult:
     """音乐生成结果"""
@@ -55,11 +50,8 @@ class MusicGenerator:
         settings = get_settings()
         self.api_url = settings.MUSIC_API_URL
         self.token = settings.MUSIC_API_TOKEN
-        self.rate_limit = RateLimitConfig(
-            max_requests=settings.MUSIC_API_RATE_LIMIT_MAX_REQUESTS,
-            time_window=settings.MUSIC_API_RATE_LIMIT_WINDOW
-        )
-        self._request_times = deque(maxlen=self.rate_limit.max_requests)
+        # 初始速率取 MUSIC_API_RATE_LIMIT_*，之后按服务商的限流响应自适应调整
+        self.rate_limiter = AdaptiveRateLimiter("music")
         self._client = httpx.AsyncClient(timeout=60.0)
     
     @classmethod
@@ -71,26 +63,6 @@ class MusicGenerator:
                     cls._instance = cls()
         return cls._instance
 
-    async def _check_rate_limit(self) -> None:
-        """检查并等待速率限制"""
-        now = datetime.now()
-        
-        # 清理过期的请求记录
-        while self._request_times and \
-              (now - self._request_times[0]) > timedelta(seconds=self.rate_limit.time_window):
-            self._request_times.popleft()
-        
-        # 如果请求数达到限制，等待到最早的请求过期
-        if len(self._request_times) >= self.rate_limit.max_requests:
-            wait_time = (self._request_times[0] + 
-                        timedelta(seconds=self.rate_limit.time_window) - now).total_seconds()
-            if wait_time > 0:
-                logger.debug(f"Rate limit reached, waiting for {wait_time:.2f} seconds")
-                await asyncio.sleep(wait_time)
-        
-        # 记录新的请求时间
-        self._request_times.append(now)
-
     async def generate_music(
         self,
         prompt: str,
@@ -110,8 +82,28 @@ class MusicGenerator:
         :param kwargs: 其他可选参数
         :return: 音乐生成结果
         """
-        # 检查速率限制
-        await self._check_rate_limit()
+        # 相同提示词的并发请求共享同一次生成
+        key = make_key(prompt=prompt, custom_mode=custom_mode, instrumental=instrumental, **kwargs)
+        return await SingleFlight("music").do(
+            key,
+            lambda: call_provider(
+                "music",
+                lambda: self._generate_music(prompt, custom_mode, instrumental, max_retries, check_interval, **kwargs)
+            )
+        )
+
+    async def _generate_music(
+        self,
+        prompt: str,
+        custom_mode: bool,
+        instrumental: bool,
+        max_retries: int,
+        check_interval: float,
+        **kwargs
+    ) -> MusicGenerationResult:
+        """实际调用音乐生成接口，参数同 generate_music"""
+        # 等待限速器放行
+        await self.rate_limiter.acquire()
         
         # 构建请求数据
         payload = {
@@ -137,6 +129,7 @@ class MusicGenerator:
                 json=payload,
                 headers=headers
             )
+            self.rate_limiter.observe(resp)
             resp.raise_for_status()
             result = resp.json()
             
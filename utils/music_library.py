@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import get_settings
+from models.music_library import DBMusicTrack
+from utils.single_flight import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TAG_SEPARATOR = re.compile(r"[,，、;；/|]+")
+_TOKEN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+_STOPWORDS = {"a", "an", "and", "the", "of", "with", "in", "on", "for", "to", "music", "bgm"}
+
+
+def extract_tags(prompt: str) -> List[str]:
+    """按逗号等分隔符把提示词拆成标签，如 "calm piano, melancholic" -> ["calm piano", "melancholic"]"""
+    tags = []
+    for part in _TAG_SEPARATOR.split(prompt.lower()):
+        tag = normalize_text(part)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def tokenize(prompt: str) -> List[str]:
+    """
+    提示词分词：英文按单词，中文按相邻双字，另外把完整标签作为短语词条，
+    使标签完全一致的提示词获得更高相似度
+    """
+    tokens = []
+    for match in _TOKEN.finditer(prompt.lower()):
+        word = match.group()
+        if word[0] <= "z":
+            if word not in _STOPWORDS:
+                tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    tokens.extend(f"#{tag}" for tag in extract_tags(prompt))
+    return tokens
+
+
+class MusicLibrary:
+    """
+    背景音乐曲库（单例模式）
+
+    在本地维护所有曲目提示词的 TF-IDF 倒排索引，提示词足够相似时复用已有曲目，
+    不再调用音乐生成服务。索引定期从数据库增量刷新，以获取其他进程入库的曲目。
+    """
+
+    _instance = None
+    _lock = asyncio.Lock()
+
+    def __init__(self):
+        self._tracks: List[DBMusicTrack] = []
+        self._term_counts: List[Counter] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._norms: Optional[List[float]] = None
+        self._loaded_until = datetime.min
+        self._refreshed_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._repository = None
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    async def get_instance(cls) -> "MusicLibrary":
+        """获取MusicLibrary的单例实例"""
+        if not cls._instance:
+            async with cls._lock:
+                if not cls._instance:
+                    cls._instance = cls()
+        return cls._instance
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from core.container import get_music_library_repository
+            self._repository = get_music_library_repository()
+        return self._repository
+
+    def _index(self, track: DBMusicTrack) -> None:
+        """把曲目加入倒排索引"""
+        doc_index = len(self._tracks)
+        counts = Counter(tokenize(track.prompt))
+        self._tracks.append(track)
+        self._term_counts.append(counts)
+        for term in counts:
+            self._postings.setdefault(term, []).append(doc_index)
+        self._norms = None  # 文档频率变化，向量长度需重新计算
+
+    def _idf(self, term: str) -> float:
+        return math.log((1 + len(self._tracks)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _ensure_norms(self) -> List[float]:
+        if self._norms is None:
+            self._norms = [
+                math.sqrt(sum((tf * self._idf(term)) ** 2 for term, tf in counts.items())) or 1.0
+                for counts in self._term_counts
+            ]
+        return self._norms
+
+    def search(self, prompt: str) -> Optional[Tuple[DBMusicTrack, float]]:
+        """
+        查找与提示词最相似的曲目
+
+        Returns:
+            Optional[Tuple[DBMusicTrack, float]]: 最相似的曲目及其余弦相似度
+        """
+        query = Counter(tokenize(prompt))
+        if not query or not self._tracks:
+            return None
+
+        norms = self._ensure_norms()
+        query_weights = {term: tf * self._idf(term) for term, tf in query.items()}
+        query_norm = math.sqrt(sum(weight ** 2 for weight in query_weights.values())) or 1.0
+
+        scores: Dict[int, float] = {}
+        for term, query_weight in query_weights.items():
+            idf = self._idf(term)
+            for doc_index in self._postings.get(term, ()):
+                doc_weight = self._term_counts[doc_index][term] * idf
+                scores[doc_index] = scores.get(doc_index, 0.0) + query_weight * doc_weight
+        if not scores:
+            return None
+
+        best_index, best_score = max(scores.items(), key=lambda item: item[1])
+        return self._tracks[best_index], best_score / (query_norm * norms[best_index])
+
+    async def _refresh(self) -> None:
+        """按间隔从数据库增量加载新曲目"""
+        interval = get_settings().MUSIC_LIBRARY_REFRESH_SECONDS
+        if time.monotonic() - self._refreshed_at < interval:
+            return
+        async with self._refresh_lock:
+            if time.monotonic() - self._refreshed_at < interval:
+                return
+            known = {track.id for track in self._tracks}
+            for track in await self.repository.list_since(self._loaded_until):
+                if track.id not in known:
+                    self._index(track)
+                self._loaded_until = max(self._loaded_until, track.created_at)
+            self._refreshed_at = time.monotonic()
+
+    async def find(self, prompt: str) -> Optional[DBMusicTrack]:
+        """
+        查找可复用的曲目
+
+        Args:
+            prompt: BGM 提示词
+
+        Returns:
+            Optional[DBMusicTrack]: 相似度达到阈值的曲目，否则返回None
+        """
+        settings = get_settings()
+        if not settings.MUSIC_LIBRARY_ENABLED:
+            return None
+
+        await self._refresh()
+        match = self.search(prompt)
+        if match is None or match[1] < settings.MUSIC_LIBRARY_SIMILARITY_THRESHOLD:
+            self._misses += 1
+            return None
+
+        track, score = match
+        self._hits += 1
+        await self.repository.record_use(track.id)
+        logger.info(f"曲库命中: '{prompt}' -> '{track.prompt}' (相似度 {score:.2f})")
+        return track
+
+    async def add(
+        self,
+        prompt: str,
+        audio_url: str,
+        title: Optional[str] = None,
+        duration: Optional[float] = None
+    ) -> Optional[DBMusicTrack]:
+        """把新生成的曲目入库并加入本地索引"""
+        if not get_settings().MUSIC_LIBRARY_ENABLED:
+            return None
+        track = DBMusicTrack(
+            prompt=normalize_text(prompt),
+            tags=extract_tags(prompt),
+            audio_url=audio_url,
+            title=title,
+            duration=duration
+        )
+        created = await self.repository.create(track)
+        if created:
+            self._index(created)
+        return created
+
+    def stats(self) -> Dict[str, float]:
+        """当前进程的曲库命中统计"""
+        total = self._hits + self._misses
+        return {
+            "tracks": len(self._tracks),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 4) if total else 0.0,
+        }
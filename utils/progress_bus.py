@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Set
+
+from pydantic import BaseModel
+
+from config import get_settings
+from schemas.game import STATUS_NAMES
+
+logger = logging.getLogger(__name__)
+
+# 记录游戏归属用户的最大数量，超过时淘汰最早记录的游戏
+MAX_TRACKED_GAMES = 10000
+
+# SSE 响应头：禁止缓存与反向代理缓冲
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# 游戏更新中会推送给客户端的字段
+PROGRESS_FIELDS = ("status", "progress", "error", "chapters", "generate_chapter_index")
+
+
+def game_channel(game_id: Any) -> str:
+    return f"game:{game_id}"
+
+
+def user_channel(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+def _dump(value: Any) -> Any:
+    return value.model_dump() if isinstance(value, BaseModel) else value
+
+
+def progress_event(fields: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """从游戏更新字段中提取进度事件，不涉及进度时返回None"""
+    if not any(name in fields for name in PROGRESS_FIELDS):
+        return None
+    event: Dict[str, Any] = {"type": "progress"}
+    if "status" in fields:
+        status = fields["status"]
+        event["status"] = STATUS_NAMES.get(status, getattr(status, "value", status))
+    if "progress" in fields:
+        progress = _dump(fields["progress"])
+        event["progress"] = progress.get("progress")
+        event["current_workflow"] = progress.get("current_workflow")
+    if "error" in fields:
+        event["error"] = fields["error"]
+    if "chapters" in fields:
+        chapters = [_dump(chapter) for chapter in fields["chapters"]]
+        # 复用的游戏带有来源游戏后续章节的可玩标记，未开放的章节不算可玩
+        opened = fields.get("generate_chapter_index")
+        event["playable_chapters"] = [
+            chapter["index"] for chapter in chapters
+            if chapter.get("is_playable") and (opened is None or chapter["index"] < opened)
+        ]
+    if "generate_chapter_index" in fields:
+        event["current_chapter"] = fields["generate_chapter_index"]
+    return event
+
+
+class ProgressBus:
+    """
+    游戏生成进度的进程内发布/订阅（单例模式）
+
+    游戏仓库写入状态、进度、章节时发布进度事件，媒体条目完成或最终失败时发布条目事件。
+    订阅方按游戏（game:<id>）或按用户（user:<id>）订阅，每个订阅一个有界队列，
+    客户端消费过慢时丢弃最旧的事件。
+
+    PROGRESS_CHANGE_STREAM_ENABLED 开启时改由 MongoDB change stream 提供进度事件，
+    其他 worker 进程写入的进度也能推送；change stream 未开启或不可用（非副本集）时退回进程内发布，
+    由 sse_events 在每次心跳时重新读取进度补上其他进程写入的变化。
+    条目事件始终只在产生它的进程内发布。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+            # game_id -> user_id，用于把游戏事件同时发给用户频道
+            self._owners: "OrderedDict[str, str]" = OrderedDict()
+            self._counts: Counter = Counter()
+            self._stream_task: Optional[asyncio.Task] = None
+            self._stream_active = False
+            self._stream_retry_at = 0.0
+            self._initialized = True
+
+    @property
+    def change_stream_active(self) -> bool:
+        """是否由 change stream 提供所有 worker 写入的进度"""
+        return self._stream_active
+
+    def track(self, game_id: Any, user_id: Any) -> None:
+        """记录游戏的归属用户"""
+        if not game_id or not user_id:
+            return
+        game_id = str(game_id)
+        self._owners[game_id] = str(user_id)
+        self._owners.move_to_end(game_id)
+        while len(self._owners) > MAX_TRACKED_GAMES:
+            self._owners.popitem(last=False)
+
+    def publish(self, game_id: Any, event: Dict[str, Any]) -> None:
+        """向游戏频道及其归属用户的频道发布事件"""
+        game_id = str(game_id)
+        event = {**event, "game_id": game_id, "timestamp": time.time()}
+        self._counts["published"] += 1
+        channels = [game_channel(game_id)]
+        owner = self._owners.get(game_id)
+        if owner:
+            channels.append(user_channel(owner))
+        for channel in channels:
+            for queue in self._subscribers.get(channel, ()):
+                if queue.full():
+                    queue.get_nowait()
+                    self._counts["dropped"] += 1
+                queue.put_nowait(event)
+
+    def publish_update(self, game_id: Any, fields: Mapping[str, Any]) -> None:
+        """游戏记录更新后发布进度事件；change stream 生效时由其发布，避免重复"""
+        if self._stream_active:
+            return
+        event = progress_event(fields)
+        if event:
+            self.publish(game_id, event)
+
+    def publish_item(self, stage: str, succeeded: bool) -> None:
+        """当前生成任务的一个媒体条目完成（或重试后最终失败）"""
+        from utils.scheduler import current_job
+
+        job = current_job()
+        if job.game_id:
+            self.publish(job.game_id, {"type": "item", "stage": stage, "succeeded": succeeded})
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """订阅频道，退出时取消订阅"""
+        self._ensure_change_stream()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=get_settings().PROGRESS_STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def _ensure_change_stream(self) -> None:
+        """首次有订阅时启动 change stream 监听"""
+        if not get_settings().PROGRESS_CHANGE_STREAM_ENABLED:
+            return
+        if self._stream_task and not self._stream_task.done():
+            return
+        if time.monotonic() < self._stream_retry_at:
+            return
+        self._stream_task = asyncio.create_task(self._follow_change_stream())
+
+    async def _follow_change_stream(self) -> None:
+        from core.container import container
+
+        updated = "updateDescription.updatedFields"
+        pipeline = [
+            {"$match": {
+                "operationType": "update",
+                "$or": [{f"{updated}.{name}": {"$exists": True}} for name in PROGRESS_FIELDS],
+            }},
+            {"$project": {
+                "documentKey": 1,
+                "fullDocument.user_id": 1,
+                **{f"{updated}.{name}": 1 for name in PROGRESS_FIELDS if name != "chapters"},
+                f"{updated}.chapters.index": 1,
+                f"{updated}.chapters.is_playable": 1,
+            }},
+        ]
+        try:
+            collection = container.games_collection()
+            async with collection.watch(pipeline, full_document="updateLookup") as stream:
+                self._stream_active = True
+                logger.info("进度推送改由 MongoDB change stream 提供")
+                async for change in stream:
+                    game_id = change["documentKey"]["_id"]
+                    self.track(game_id, (change.get("fullDocument") or {}).get("user_id"))
+                    event = progress_event(change.get("updateDescription", {}).get("updatedFields", {}))
+                    if event:
+                        self.publish(game_id, event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stream_retry_at = time.monotonic() + get_settings().PROGRESS_CHANGE_STREAM_RETRY_SECONDS
+            logger.warning(f"MongoDB change stream 不可用，进度改为进程内推送: {str(e)}")
+        finally:
+            self._stream_active = False
+
+    def snapshot(self) -> Dict[str, object]:
+        """订阅数与事件统计"""
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "tracked_games": len(self._owners),
+            "change_stream_active": self._stream_active,
+            **dict(self._counts),
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """按 Server-Sent Events 格式编码事件"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+def _changed(states: Dict[str, Dict[str, Any]], event: Dict[str, Any]) -> bool:
+    """把进度事件合并到该游戏已推送的状态中，返回是否有字段变化"""
+    fields = {name: value for name, value in event.items() if name not in ("type", "game_id", "timestamp")}
+    state = states.setdefault(str(event.get("game_id")), {})
+    changed = any(state.get(name) != value for name, value in fields.items())
+    state.update(fields)
+    return changed
+
+
+async def sse_events(
+    request,
+    channel: str,
+    initial: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None,
+    until: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    poll: Optional[Callable[[], Awaitable[List[Dict[str, Any]]]]] = None
+) -> AsyncIterator[str]:
+    """
+    订阅频道并逐条输出 SSE 文本，客户端断开或 until 返回 True 时结束
+
+    进程内发布只包含本进程写入的进度；change stream 未生效时，每次心跳调用 poll 重新读取进度，
+    其他 worker 上的流水线写入的变化（包括结束状态）也能推送。
+
+    Args:
+        request: 当前请求，用于检测客户端断开
+        channel: 订阅的频道
+        initial: 订阅后读取当前状态的协程函数，结果作为第一个事件发送，订阅前后的更新不会遗漏
+        until: 判断事件发送后是否结束推送
+        poll: 读取频道内各游戏当前进度事件的协程函数，与已推送的状态不同时发送
+    """
+    bus = ProgressBus()
+    heartbeat = get_settings().PROGRESS_STREAM_HEARTBEAT_SECONDS
+    # game_id -> 已推送的进度字段
+    states: Dict[str, Dict[str, Any]] = {}
+    async with bus.subscribe(channel) as queue:
+        if initial:
+            event = await initial()
+            if event:
+                _changed(states, event)
+                yield format_sse(event)
+                if until and until(event):
+                    return
+        elif poll and not bus.change_stream_active:
+            for event in await poll():
+                _changed(states, event)
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if poll is None or bus.change_stream_active:
+                    yield ": heartbeat\n\n"
+                    continue
+                events = [event for event in await poll() if _changed(states, event)]
+                if not events:
+                    yield ": heartbeat\n\n"
+                for event in events:
+                    yield format_sse(event)
+                    if until and until(event):
+                        return
+                continue
+            if event.get("type") == "progress":
+                _changed(states, event)
+            yield format_sse(event)
+            if until and until(event):
+                return
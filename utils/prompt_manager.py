@@ -1,13 +1,18 @@
 import os
+import string
 import threading
+import logging
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 class PromptManager:
     """提示词管理器（单例模式）"""
     _instance = None
     _lock = threading.Lock()
     _prompts_cache: Dict[str, str] = {}  # 添加缓存来存储已加载的提示词
+    _checked_layouts: set = set()  # 已检查过静态前缀布局的模板
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -77,25 +82,76 @@ class PromptManager:
             "content": template.format(**params) if params else template
         }
         
+    @staticmethod
+    def _normalize_param(value: Any) -> str:
+        """
+        规范化模板参数，保证相同内容渲染出的字节完全一致
+
+        Args:
+            value: 参数值
+
+        Returns:
+            统一换行符并去除行尾空白后的字符串
+        """
+        text = value if isinstance(value, str) else str(value)
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+    def _check_static_prefix(self, prompt_name: str, static_keys: List[str]) -> None:
+        """
+        检查模板中静态参数是否都排在动态参数之前，否则无法命中上下文前缀缓存
+
+        Args:
+            prompt_name: prompt 文件名
+            static_keys: 静态参数名列表
+        """
+        if prompt_name in self._checked_layouts:
+            return
+        self._checked_layouts.add(prompt_name)
+        fields = [
+            field for _, field, _, _ in string.Formatter().parse(self.load_prompt(prompt_name))
+            if field
+        ]
+        seen_dynamic = False
+        for field in fields:
+            if field not in static_keys:
+                seen_dynamic = True
+            elif seen_dynamic:
+                logger.warning(
+                    f"Prompt {prompt_name}: 静态参数 {field} 位于动态参数之后，无法复用上下文缓存"
+                )
+                return
+
     def create_messages(
         self,
         system_prompt: str,
         user_prompt_name: str,
-        user_params: Optional[Dict[str, Any]] = None
+        user_params: Optional[Dict[str, Any]] = None,
+        static_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, str]]:
         """
         创建完整的对话消息列表
+
+        消息按"系统提示词 → 静态参数 → 动态参数"的顺序组织，且所有参数经过规范化，
+        使得同一阶段的重复调用拥有字节一致的前缀，便于 DeepSeek 上下文缓存命中。
         
         Args:
             system_prompt: 系统提示词文件名
             user_prompt_name: 用户提示词文件名
-            user_params: 用于格式化用户提示词的参数
+            user_params: 用于格式化用户提示词的参数（每次调用都会变化的内容）
+            static_params: 跨调用保持不变的参数（如语音库、角色名），模板中应排在动态参数之前
             
         Returns:
             对话消息列表
         """
+        params = {
+            key: self._normalize_param(value)
+            for key, value in {**(static_params or {}), **(user_params or {})}.items()
+        }
+        if static_params:
+            self._check_static_prefix(user_prompt_name, list(static_params.keys()))
         messages = [
             self.format_prompt(system_prompt, {}, role="system"),
-            self.format_prompt(user_prompt_name, user_params or {})
+            self.format_prompt(user_prompt_name, params)
         ]
         return messages
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+import httpx
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 视为服务商限流的状态码
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+def retry_after_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回需要等待的秒数"""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """
+    服务商自适应限速器（AIMD）
+
+    令牌桶按当前速率（次/秒）补充令牌，容量为 RATE_LIMIT_BURST_SECONDS 秒的请求量：
+    - 请求成功时加性增加速率，每秒约增加 RATE_LIMIT_ADDITIVE_INCREASE
+    - 收到 429/503 时速率乘以 RATE_LIMIT_MULTIPLICATIVE_DECREASE，同一补充间隔内的多个限流信号只降速一次
+    - 带 Retry-After 时在该时间内暂停发放令牌
+
+    RATE_LIMIT_SHARED_ENABLED 开启时，令牌还需从 MongoDB rate_limits 集合按时间窗口领取，所有 worker 进程合计不超过配额。
+    窗口的配额保存在该窗口的记录中：由首个领取的进程按其当前速率 × RATE_LIMIT_SHARED_WINDOW_SECONDS 写入，
+    任一进程被限流后领取时把配额降到按其降低后的速率计算的值，所有进程对同一窗口执行同一个配额。
+    每次批量领取约 RATE_LIMIT_SHARED_PREFETCH_SECONDS 秒的用量缓存在本地，避免每次请求访问数据库；
+    数据库不可用时退回只按本进程限速。
+
+    等待本地令牌的协程按先来先得排队；等待共享配额（下一个窗口）时不持有本地锁，
+    不影响已缓存共享配额的其他请求。每个服务商一个实例，通过名称注册。
+    """
+    _registry: Dict[str, "AdaptiveRateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, name: str):
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = super().__new__(cls)
+            return cls._registry[name]
+
+    def __init__(self, name: str):
+        if not hasattr(self, '_initialized'):
+            self.name = name
+            initial_rate, self.max_rate = self._configured_rates()
+            self.rate = min(initial_rate, self.max_rate)
+            self._tokens = 1.0
+            self._refilled_at = time.monotonic()
+            self._blocked_until = 0.0
+            self._last_decrease = 0.0
+            self._lock = asyncio.Lock()
+            self._shared_lock = asyncio.Lock()
+            self._repository = None
+            # 本地缓存的共享配额：(窗口序号, 剩余数量)
+            self._lease_window = -1
+            self._leased = 0
+            # 被限流后下次领取时降低共享窗口的配额
+            self._lower_shared_quota = False
+            self._shared_claims = 0
+            self._shared_unavailable_until = 0.0
+            self._requests = 0
+            self._throttled = 0
+            self._waited_seconds = 0.0
+            self._initialized = True
+
+    def _configured_rates(self):
+        """各服务商的初始速率与速率上限（次/秒）"""
+        settings = get_settings()
+        rates = {
+            "image": (settings.RATE_LIMIT_IMAGE_RATE, settings.RATE_LIMIT_IMAGE_MAX_RATE),
+            "tts": (settings.RATE_LIMIT_TTS_RATE, settings.RATE_LIMIT_TTS_MAX_RATE),
+            "music": (
+                settings.MUSIC_API_RATE_LIMIT_MAX_REQUESTS / max(settings.MUSIC_API_RATE_LIMIT_WINDOW, 1),
+                settings.RATE_LIMIT_MUSIC_MAX_RATE
+            ),
+        }
+        return rates.get(self.name, (settings.RATE_LIMIT_IMAGE_RATE, settings.RATE_LIMIT_IMAGE_MAX_RATE))
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate * get_settings().RATE_LIMIT_BURST_SECONDS)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity(), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    async def acquire(self) -> None:
+        """等待一个请求令牌"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                self._waited_seconds += wait
+                await asyncio.sleep(wait)
+        await self._acquire_shared()
+        self._requests += 1
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from core.container import get_rate_limit_repository
+            self._repository = get_rate_limit_repository()
+        return self._repository
+
+    async def _acquire_shared(self) -> None:
+        """从跨进程共享配额中取一个，当前窗口配额用完时等到下一个窗口"""
+        settings = get_settings()
+        if not settings.RATE_LIMIT_SHARED_ENABLED:
+            return
+        window_seconds = settings.RATE_LIMIT_SHARED_WINDOW_SECONDS
+        while True:
+            # 只在领取时互斥，等待下一个窗口时不持有锁
+            async with self._shared_lock:
+                now = time.time()
+                if now < self._shared_unavailable_until:
+                    return
+                window = int(now // window_seconds)
+                if self._lease_window == window and self._leased > 0:
+                    self._leased -= 1
+                    return
+                quota = max(1, int(self.rate * window_seconds))
+                count = max(1, min(quota, math.ceil(self.rate * settings.RATE_LIMIT_SHARED_PREFETCH_SECONDS)))
+                lower = self._lower_shared_quota
+                granted = await self.repository.claim(self.name, window, window_seconds, count, quota, lower=lower)
+                if granted is None:
+                    # 数据库不可用，一个窗口内不再尝试，避免每次请求都等待连接超时
+                    self._shared_unavailable_until = now + window_seconds
+                    return
+                self._shared_claims += 1
+                if lower:
+                    self._lower_shared_quota = False
+                if granted > 0:
+                    self._lease_window = window
+                    self._leased = granted - 1
+                    return
+                wait = (window + 1) * window_seconds - now
+            self._waited_seconds += wait
+            await asyncio.sleep(wait)
+
+    def on_success(self) -> None:
+        """请求成功，加性增加速率"""
+        step = get_settings().RATE_LIMIT_ADDITIVE_INCREASE
+        self.rate = min(self.max_rate, self.rate + step / self.rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """收到限流响应，乘性降低速率并遵守 Retry-After"""
+        settings = get_settings()
+        now = time.monotonic()
+        self._throttled += 1
+        if retry_after:
+            retry_after = min(retry_after, settings.RATE_LIMIT_MAX_RETRY_AFTER)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        # 降速前已发出的请求也会陆续被限流，一个补充间隔内只降一次
+        if now - self._last_decrease < 1 / self.rate:
+            return
+        self._last_decrease = now
+        previous = self.rate
+        self.rate = max(settings.RATE_LIMIT_MIN_RATE, self.rate * settings.RATE_LIMIT_MULTIPLICATIVE_DECREASE)
+        self._tokens = min(self._tokens, 0.0)
+        # 丢弃本地缓存的共享配额，下次领取时按降低后的速率降低共享窗口的配额
+        self._leased = 0
+        self._lower_shared_quota = True
+        logger.warning(
+            f"服务商 {self.name} 限流，速率 {previous:.3f} -> {self.rate:.3f} 次/秒"
+            + (f"，{retry_after:.0f} 秒后恢复" if retry_after else "")
+        )
+
+    def observe(self, response: httpx.Response) -> None:
+        """根据服务商响应调整速率"""
+        if response.status_code in THROTTLE_STATUS_CODES:
+            self.on_throttle(retry_after_from_headers(response.headers))
+        elif response.is_success:
+            self.on_success()
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        return {
+            "rate_per_second": round(self.rate, 4),
+            "max_rate_per_second": self.max_rate,
+            "blocked_seconds": round(max(0.0, self._blocked_until - now), 1),
+            "requests": self._requests,
+            "throttled": self._throttled,
+            "waited_seconds": round(self._waited_seconds, 1),
+            "shared_claims": self._shared_claims,
+            "leased": self._leased,
+        }
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, object]]:
+        """获取所有限速器的当前速率"""
+        with cls._registry_lock:
+            limiters = list(cls._registry.items())
+        return {name: limiter.stats() for name, limiter in limiters}
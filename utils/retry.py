@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import random
+import threading
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+from config import get_settings
+from models.game import FailedItem
+from utils.circuit_breaker import CircuitOpenError
+from utils.progress_bus import ProgressBus
+from utils.timeline import GenerationTimeline
+from utils.rate_limiter import retry_after_from_headers
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 服务商返回这些状态码时视为暂时性错误
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """暂时性错误，可以重试（如服务商未返回结果）"""
+    pass
+
+
+class PermanentError(Exception):
+    """永久性错误，重试也不会成功（如提示词被拒绝）"""
+    pass
+
+
+class RetryError(Exception):
+    """重试耗尽或遇到永久性错误"""
+
+    def __init__(self, error: Exception, attempts: int, retryable: bool):
+        super().__init__(str(error) or error.__class__.__name__)
+        self.error = error
+        self.attempts = attempts
+        self.retryable = retryable
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    判断错误是否值得重试
+
+    超时、连接错误、429 与 5xx 等视为暂时性错误；其余 4xx、参数与数据错误视为永久性错误；
+    无法识别的错误按暂时性处理（服务商多以普通 Exception 报告失败）
+    """
+    if isinstance(error, PermanentError):
+        return False
+    if isinstance(error, (RetryableError, asyncio.TimeoutError, TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return False
+    return True
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取服务商建议的重试间隔（Retry-After 秒数）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return retry_after_from_headers(error.response.headers)
+    return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """第 attempt 次（从0开始）重试前的等待时间：指数退避加全抖动"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+@dataclass
+class RetryStats:
+    """重试统计"""
+    calls: int = 0
+    retries: int = 0
+    recovered: int = 0  # 重试后成功
+    exhausted: int = 0  # 重试耗尽
+    permanent: int = 0  # 永久性错误
+    short_circuited: int = 0  # 服务商熔断，快速失败
+
+
+_stats: Dict[str, RetryStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _get_stats(name: str) -> RetryStats:
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = RetryStats()
+        return _stats[name]
+
+
+def retry_snapshot() -> Dict[str, Dict[str, int]]:
+    """各类调用的重试统计（当前进程）"""
+    with _stats_lock:
+        return {name: asdict(stats) for name, stats in _stats.items()}
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[T]],
+    name: str,
+    max_attempts: Optional[int] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None
+) -> T:
+    """
+    按指数退避重试无参协程函数
+
+    Args:
+        fn: 无参协程函数，每次尝试重新调用
+        name: 统计名称，如 scene_image
+        max_attempts: 最多尝试次数，默认 MEDIA_RETRY_MAX_ATTEMPTS
+        base_delay: 首次重试的最长等待（秒），默认 MEDIA_RETRY_BASE_DELAY
+        max_delay: 单次等待上限（秒），默认 MEDIA_RETRY_MAX_DELAY
+
+    Returns:
+        T: fn 的返回值
+
+    Raises:
+        RetryError: 重试耗尽或遇到永久性错误
+    """
+    settings = get_settings()
+    max_attempts = max_attempts or settings.MEDIA_RETRY_MAX_ATTEMPTS
+    base_delay = settings.MEDIA_RETRY_BASE_DELAY if base_delay is None else base_delay
+    max_delay = settings.MEDIA_RETRY_MAX_DELAY if max_delay is None else max_delay
+
+    stats = _get_stats(name)
+    stats.calls += 1
+    with GenerationTimeline().span("item", name) as span:
+        for attempt in range(max_attempts):
+            span.retries = attempt
+            try:
+                result = await fn()
+                if attempt:
+                    stats.recovered += 1
+                ProgressBus().publish_item(name, succeeded=True)
+                return result
+            except CircuitOpenError as e:
+                # 服务商熔断中，不在这里等待重试，由上层暂停游戏
+                stats.short_circuited += 1
+                raise RetryError(e, attempt + 1, retryable=True) from e
+            except Exception as e:
+                if not is_retryable(e):
+                    stats.permanent += 1
+                    ProgressBus().publish_item(name, succeeded=False)
+                    raise RetryError(e, attempt + 1, retryable=False) from e
+                if attempt + 1 >= max_attempts:
+                    stats.exhausted += 1
+                    ProgressBus().publish_item(name, succeeded=False)
+                    raise RetryError(e, attempt + 1, retryable=True) from e
+
+                delay = retry_after_seconds(e)
+                delay = min(delay, max_delay) if delay is not None else backoff_delay(attempt, base_delay, max_delay)
+                stats.retries += 1
+                logger.warning(f"{name} 第 {attempt + 1} 次尝试失败，{delay:.1f} 秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+
+
+def failed_item(stage: str, chapter_index: int, key: str, error: Exception) -> FailedItem:
+    """根据最终错误生成死信条目"""
+    if isinstance(error, RetryError):
+        return FailedItem(
+            stage=stage,
+            chapter_index=chapter_index,
+            key=key,
+            error=str(error),
+            retryable=error.retryable,
+            attempts=error.attempts
+        )
+    return FailedItem(
+        stage=stage,
+        chapter_index=chapter_index,
+        key=key,
+        error=str(error) or error.__class__.__name__,
+        retryable=is_retryable(error),
+        attempts=1
+    )
+
+
+def merge_failed_items(
+    existing: List[FailedItem],
+    stage: str,
+    attempted: Iterable[Tuple[int, str]],
+    failures: List[FailedItem]
+) -> List[FailedItem]:
+    """
+    更新死信列表：移除本次重新尝试过的条目，加入本次最终失败的条目
+
+    Args:
+        existing: 原死信列表
+        stage: 工作流名称
+        attempted: 本次尝试的 (章节索引, 条目键)
+        failures: 本次最终失败的条目
+    """
+    attempted_keys: Set[Tuple[int, str]] = set(attempted)
+    kept = [
+        item for item in existing
+        if item.stage != stage or (item.chapter_index, item.key) not in attempted_keys
+    ]
+    return kept + failures
+
+
+def within_failure_tolerance(failed: int, total: int) -> bool:
+    """失败条目占比是否在 MEDIA_FAILURE_TOLERANCE 之内（在内时阶段视为成功，失败条目留在死信列表）"""
+    if not failed:
+        return True
+    return total > 0 and failed / total <= get_settings().MEDIA_FAILURE_TOLERANCE
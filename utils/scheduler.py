@@ -0,0 +1,324 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, replace
+from enum import IntEnum
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+from config import get_settings
+from utils.metrics import PROVIDER_CALL_DURATION, PROVIDER_CALLS_IN_FLIGHT, PROVIDER_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """生成任务优先级，数值越小越优先"""
+    FIRST_CHAPTER = 0  # 首章及游玩时的按需请求，决定用户首次可玩的时间
+    NEXT_CHAPTER = 1  # 用户已付费的后续章节
+    SPECULATIVE = 2  # 下一章预生成
+    BACKFILL = 3  # 章节可玩后的补充内容，如背景音乐、语音预取
+
+
+@dataclass(frozen=True)
+class JobContext:
+    """当前生成任务的归属，随 asyncio 任务的上下文向下传递"""
+    user_id: str = "system"
+    game_id: Optional[str] = None
+    priority: Priority = Priority.NEXT_CHAPTER
+
+
+_job_context: contextvars.ContextVar[JobContext] = contextvars.ContextVar("job_context", default=JobContext())
+
+
+def current_job() -> JobContext:
+    """获取当前任务的归属信息"""
+    return _job_context.get()
+
+
+def set_job_context(user_id: str, game_id: Optional[str] = None, priority: Priority = Priority.NEXT_CHAPTER) -> None:
+    """设置当前任务（及其之后创建的子任务）的归属信息"""
+    _job_context.set(JobContext(user_id=str(user_id), game_id=str(game_id) if game_id else None, priority=priority))
+
+
+def set_priority(priority: Priority) -> None:
+    """只修改当前任务的优先级"""
+    _job_context.set(replace(_job_context.get(), priority=priority))
+
+
+@contextmanager
+def job_priority(priority: Priority) -> Iterator[None]:
+    """在代码块内临时使用指定优先级"""
+    token = _job_context.set(replace(_job_context.get(), priority=priority))
+    try:
+        yield
+    finally:
+        _job_context.reset(token)
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    cost: float
+    enqueued_at: float
+    game_id: Optional[str] = None
+
+
+class FairScheduler:
+    """
+    服务商调用调度器
+
+    限制同时进行的服务商调用数量，空闲槽位按以下规则分配：
+    - 优先级类别之间严格按优先级，等待超过 SCHEDULER_STARVATION_SECONDS 的低优先级请求会被提前
+    - 同一优先级内按用户做差额轮询（DRR），单个用户的大量请求不会挤占其他用户
+
+    每个服务商一个实例，通过名称注册。policy 为 "fifo" 时退化为先到先得，用于对比测试。
+    """
+    _registry: Dict[str, "FairScheduler"] = {}
+    _registry_lock = threading.Lock()
+    # game_id -> 服务商 -> 被取消的排队中与进行中的调用数，只统计 watch_cancelled 登记的游戏
+    _cancelled: Dict[str, Dict[str, Dict[str, int]]] = {}
+
+    QUANTUM = 1.0
+
+    def __new__(cls, name: str, concurrency: Optional[int] = None, policy: str = "fair"):
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = super().__new__(cls)
+            return cls._registry[name]
+
+    def __init__(self, name: str, concurrency: Optional[int] = None, policy: str = "fair"):
+        if not hasattr(self, '_initialized'):
+            self.name = name
+            self.concurrency = concurrency or self._default_concurrency(name)
+            self.policy = policy
+            self._active = 0
+            # 优先级 -> 用户 -> 等待队列，用户的顺序即轮询顺序
+            self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+            self._deficits: Dict[Tuple[int, str], float] = {}
+            self._served: Dict[int, int] = {}
+            self._wait_seconds: Dict[int, float] = {}
+            # game_id -> 正在占用的槽位数
+            self._running: Dict[str, int] = {}
+            self._initialized = True
+
+    @staticmethod
+    def _default_concurrency(name: str) -> int:
+        settings = get_settings()
+        return {
+            "image": settings.SCHEDULER_IMAGE_CONCURRENCY,
+            "tts": settings.SCHEDULER_TTS_CONCURRENCY,
+            "music": settings.SCHEDULER_MUSIC_CONCURRENCY,
+            "llm": settings.SCHEDULER_LLM_CONCURRENCY,
+        }.get(name, 8)
+
+    def _queue_key(self, job: JobContext) -> Tuple[int, str]:
+        if self.policy == "fifo":
+            return 0, "*"
+        return int(job.priority), job.user_id
+
+    def _has_waiters(self) -> bool:
+        return any(users for users in self._queues.values())
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for users in self._queues.values() for queue in users.values())
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        """获取一个调用槽位，必要时按调度规则排队等待"""
+        if self._active < self.concurrency and not self._has_waiters():
+            self._active += 1
+            self._record(self._queue_key(current_job())[0], 0.0)
+            return
+
+        priority, user_id = self._queue_key(current_job())
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost, time.monotonic(), current_job().game_id)
+        users = self._queues.setdefault(priority, OrderedDict())
+        users.setdefault(user_id, deque()).append(waiter)
+        # 队列中可能只剩已取消的等待者，此时有空闲槽位应立即分配
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已分配到槽位但调用方被取消，归还槽位
+                self.release()
+            self._count_cancelled(waiter.game_id, "queued")
+            raise
+
+    def release(self) -> None:
+        """归还槽位并唤醒下一个等待者"""
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 1.0):
+        """
+        在调度下执行一次服务商调用
+
+        用法:
+            async with FairScheduler("image").slot():
+                ...
+        """
+        from utils.timeline import GenerationTimeline
+
+        timeline = GenerationTimeline()
+        scheduled = get_settings().SCHEDULER_ENABLED
+        game_id = current_job().game_id
+        enqueued = time.monotonic()
+        if scheduled:
+            await self.acquire(cost)
+        started = time.monotonic()
+        timeline.add("queue_wait_seconds", started - enqueued)
+        PROVIDER_QUEUE_WAIT.observe(started - enqueued, self.name)
+        PROVIDER_CALLS_IN_FLIGHT.inc(self.name)
+        if scheduled and game_id:
+            self._running[game_id] = self._running.get(game_id, 0) + 1
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        except asyncio.CancelledError:
+            # 对冲落败或生成取消
+            outcome = "cancelled"
+            self._count_cancelled(game_id, "running")
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            timeline.add("provider_seconds", elapsed)
+            PROVIDER_CALLS_IN_FLIGHT.dec(self.name)
+            PROVIDER_CALL_DURATION.observe(elapsed, self.name, outcome)
+            if scheduled:
+                if game_id:
+                    self._running[game_id] -= 1
+                    if not self._running[game_id]:
+                        del self._running[game_id]
+                self.release()
+
+    async def run(self, fn: Callable[[], Awaitable[T]], cost: float = 1.0) -> T:
+        """在调度下执行无参协程函数并返回其结果"""
+        async with self.slot(cost):
+            return await fn()
+
+    def _dispatch(self) -> None:
+        while self._active < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.cancelled():
+                continue
+            self._active += 1
+            waiter.future.set_result(None)
+
+    def _record(self, priority: int, waited: float) -> None:
+        self._served[priority] = self._served.get(priority, 0) + 1
+        self._wait_seconds[priority] = self._wait_seconds.get(priority, 0.0) + waited
+
+    def _starving_priority(self, now: float) -> Optional[int]:
+        """等待时间超过阈值的最高优先级类别"""
+        threshold = get_settings().SCHEDULER_STARVATION_SECONDS
+        for priority in sorted(self._queues):
+            for queue in self._queues[priority].values():
+                if queue and now - queue[0].enqueued_at > threshold:
+                    return priority
+        return None
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        starving = self._starving_priority(now)
+        priorities = sorted(self._queues)
+        if starving is not None:
+            priorities.remove(starving)
+            priorities.insert(0, starving)
+
+        for priority in priorities:
+            users = self._queues[priority]
+            while users:
+                user_id, queue = next(iter(users.items()))
+                key = (priority, user_id)
+                while queue and queue[0].future.cancelled():
+                    queue.popleft()
+                if not queue:
+                    del users[user_id]
+                    self._deficits.pop(key, None)
+                    continue
+
+                # 差额轮询：轮到该用户时补充配额，配额足够才出队，否则移到队尾
+                deficit = self._deficits.get(key, 0.0)
+                if deficit < queue[0].cost:
+                    deficit += self.QUANTUM
+                    self._deficits[key] = deficit
+                    if deficit < queue[0].cost:
+                        users.move_to_end(user_id)
+                        continue
+
+                waiter = queue.popleft()
+                self._deficits[key] = deficit - waiter.cost
+                if not queue:
+                    del users[user_id]
+                    self._deficits.pop(key, None)
+                elif self._deficits[key] < queue[0].cost:
+                    users.move_to_end(user_id)
+                self._record(priority, now - waiter.enqueued_at)
+                return waiter
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "waiting": self.waiting,
+            "served": {Priority(p).name: n for p, n in self._served.items()} if self.policy == "fair" else self._served,
+            "avg_wait_seconds": {
+                Priority(p).name if self.policy == "fair" else p: round(self._wait_seconds[p] / n, 3)
+                for p, n in self._served.items() if n
+            },
+        }
+
+    def game_load(self, game_id: str) -> Dict[str, int]:
+        """游戏当前排队与进行中的调用数"""
+        queued = sum(
+            1 for users in self._queues.values() for queue in users.values()
+            for waiter in queue if waiter.game_id == game_id and not waiter.future.done()
+        )
+        return {"queued": queued, "running": self._running.get(game_id, 0)}
+
+    @classmethod
+    def game_snapshot(cls, game_id: str) -> Dict[str, Dict[str, int]]:
+        """游戏在各服务商调度器中排队与进行中的调用数"""
+        with cls._registry_lock:
+            schedulers = list(cls._registry.items())
+        return {name: scheduler.game_load(str(game_id)) for name, scheduler in schedulers}
+
+    def _count_cancelled(self, game_id: Optional[str], state: str) -> None:
+        counts = self._cancelled.get(game_id) if game_id else None
+        if counts is not None:
+            load = counts.setdefault(self.name, {"queued": 0, "running": 0})
+            load[state] += 1
+
+    @classmethod
+    def watch_cancelled(cls, game_id: str) -> None:
+        """开始统计游戏被取消的服务商调用（取消游戏生成前调用）"""
+        cls._cancelled.setdefault(str(game_id), {})
+
+    @classmethod
+    def pop_cancelled(cls, game_id: str) -> Dict[str, Dict[str, int]]:
+        """结束统计并返回游戏在各服务商被取消的排队中与进行中的调用数"""
+        return cls._cancelled.pop(str(game_id), {})
+
+    @classmethod
+    def total_waiting(cls) -> int:
+        """所有调度器中排队的请求总数"""
+        with cls._registry_lock:
+            return sum(scheduler.waiting for scheduler in cls._registry.values())
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, object]]:
+        """获取所有调度器的统计"""
+        with cls._registry_lock:
+            return {name: scheduler.stats() for name, scheduler in cls._registry.items()}
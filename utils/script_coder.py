@@ -1,6 +1,8 @@
 from typing import Dict, List, Optional
 from pathlib import Path
 import json
+import logging
+import re
 from dataclasses import asdict
 import sys
 import os
@@ -27,6 +29,8 @@ from schemas.script_commands import (
     StructureError
 )
 
+logger = logging.getLogger(__name__)
+
 
 class ScriptEncoder(json.JSONEncoder):
     """自定义JSON编码器，处理枚举和数据类"""
@@ -37,138 +41,140 @@ class ScriptEncoder(json.JSONEncoder):
             return asdict(obj)
         return super().default(obj)
 
-def _parse_narration(line: str, line_number: int) -> NarrationCommand:
+# 单一编译后的行分词器：一次匹配同时完成关键字识别与注释剔除（// # """ 之后的内容视为注释）
+# 空白使用 \s，与 str.strip() 一致，包括中文脚本中常见的全角空格（U+3000）
+_LINE_PATTERN = re.compile(
+    r'^\s*(branch|narration|dialogue|choice|jump|bgm|bg)\s+((?:(?!//|#|""").)*)'
+)
+
+def _parse_narration(payload: str, line_number: int) -> NarrationCommand:
     """解析旁白指令"""
-    text = line[10:].strip()
-    if not text:
+    if not payload:
         raise CommandError(f"第 {line_number+1} 行：旁白内容不能为空")
-    return NarrationCommand(text=text)
+    return NarrationCommand(text=payload)
 
-def _parse_dialogue(line: str, line_number: int) -> DialogueCommand:
+def _parse_dialogue(payload: str, line_number: int) -> DialogueCommand:
     """解析对话指令"""
-    parts = [p.strip() for p in line[9:].split("->")]
-    main_part = parts[0].rsplit(',', 2)
-    if len(main_part) != 3:
+    main_part, arrow, target = payload.partition("->")
+    parts = main_part.rsplit(',', 2)
+    if len(parts) != 3:
         raise CommandError(f"第 {line_number+1} 行：对话格式错误，应为'角色,情绪,对话内容'")
     
-    char, emotion, text = [p.strip() for p in main_part]
-    target = parts[1].strip() if len(parts) > 1 else None
+    char, emotion, text = parts
+    target = target.split("->")[0].strip() if arrow else None
     
+    # 角色与情绪的取值很少，驻留后同一章节内的大量对话共享同一字符串对象
     return DialogueCommand(
-        character=char,
-        emotion=emotion,
-        text=text,
-        target=target
+        character=sys.intern(char.strip()),
+        emotion=sys.intern(emotion.strip()),
+        text=text.strip(),
+        target=sys.intern(target) if target else None
     )
 
-def _parse_choice(line: str, line_number: int) -> ChoiceCommand:
+def _parse_choice(payload: str, line_number: int) -> ChoiceCommand:
     """解析选项指令"""
-    parts = line[6:].split(',', 1)
-    if len(parts) != 2:
+    text, comma, target = payload.partition(',')
+    text, target = text.strip(), target.strip()
+    if not comma:
         raise CommandError(f"第 {line_number+1} 行：选项格式错误，应为'选项文本,目标分支'")
-    
-    text, target = [p.strip() for p in parts]
     if not text or not target:
         raise CommandError(f"第 {line_number+1} 行：选项文本和目标分支不能为空")
     
-    return ChoiceCommand(text=text, target=target)
+    return ChoiceCommand(text=text, target=sys.intern(target))
 
-def _parse_jump(line: str, line_number: int) -> JumpCommand:
+def _parse_jump(payload: str, line_number: int) -> JumpCommand:
     """解析跳转指令"""
-    target = line[5:].strip()
-    if not target:
+    if not payload:
         raise CommandError(f"第 {line_number+1} 行：跳转目标不能为空")
     
-    return JumpCommand(target=target)
+    return JumpCommand(target=sys.intern(payload))
 
-def _parse_bg(line: str, line_number: int) -> BackgroundCommand:
+def _parse_bg(payload: str, line_number: int) -> BackgroundCommand:
     """解析背景指令"""
-    parts = line[3:].split(' ', 1)
-    if len(parts) != 2:
-        raise CommandError(f"第 {line_number+1} 行：背景格式错误，应为'背景名称,SD提示词'")
-    
-    name, prompt = [p.strip() for p in parts]
+    name, _, prompt = payload.partition(' ')
+    name, prompt = name.strip(), prompt.strip()
     if not name or not prompt:
         raise CommandError(f"第 {line_number+1} 行：背景名称和SD提示词不能为空")
     
-    return BackgroundCommand(name=name, prompt=prompt)
+    return BackgroundCommand(name=sys.intern(name), prompt=prompt)
 
-def _parse_bgm(line: str, line_number: int) -> Command:
+def _parse_bgm(payload: str, line_number: int) -> BGMCommand:
     """解析背景音乐指令"""
-    parts = line[4:].split(' ', 1)
-    if len(parts) != 2:
-        raise CommandError(f"第 {line_number+1} 行：背景音乐格式错误，应为'背景音乐名称,SD提示词'")
-    
-    name, prompt = [p.strip() for p in parts]
+    name, _, prompt = payload.partition(' ')
+    name, prompt = name.strip(), prompt.strip()
     if not name or not prompt:
         raise CommandError(f"第 {line_number+1} 行：背景音乐名称和提示词不能为空")
     
-    return BGMCommand(name=name, prompt=prompt)
-
-def _parse_command(line: str, line_number: int) -> Optional[Command]:
-    """返回None表示忽略无关行"""
-    line = _strip_comment(line)
-    if not line:
-        return None
-
-    parsers = {
-        "narration": _parse_narration,
-        "dialogue": _parse_dialogue,
-        "choice": _parse_choice,
-        "jump": _parse_jump,
-        "bg": _parse_bg,
-        "bgm": _parse_bgm
-    }
-
-    for prefix, parser in parsers.items():
-        if line.startswith(prefix + " "):
-            return parser(line, line_number)
-    
-    return None
+    return BGMCommand(name=sys.intern(name), prompt=prompt)
 
-def _parse_branch_declaration(line: str, line_number: int) -> str:
-    """解析分支声明，返回分支名称"""
-    branch_name = line[6:].strip()
-    if not branch_name:
-        raise BranchError(f"第 {line_number+1} 行：分支名称不能为空")
-    return branch_name
+_COMMAND_PARSERS = {
+    "narration": _parse_narration,
+    "dialogue": _parse_dialogue,
+    "choice": _parse_choice,
+    "jump": _parse_jump,
+    "bg": _parse_bg,
+    "bgm": _parse_bgm,
+}
 
-def _strip_comment(line: str) -> str:
-    """去除行内注释，支持双斜杠和三引号注释"""
-    line = line.split('//')[0].split('#')[0].strip()
-    return line.split('"""')[0].strip()
+def _parse_script_structure(content: str, errors: Optional[List[str]] = None) -> List[Branch]:
+    """单遍解析脚本结构
 
-def _parse_script_structure(content: str) -> List[Branch]:
-    branches: Dict[str, List[Command]] = {}
-    current_branch = None
+    逐行匹配编译后的分词正则，以当前分支为状态；格式错误的行会被跳过并记录，
+    不会导致整章解析失败。
 
-    for line_number, raw_line in enumerate(content.split('\n')):
-        line = _strip_comment(raw_line.strip())
-        if not line:
-            continue
+    Args:
+        content: 脚本文本
+        errors: 可选，用于收集被跳过的错误行信息
 
-        # 分支声明处理
-        if line.startswith("branch "):
-            current_branch = _parse_branch_declaration(line, line_number)
-            branches.setdefault(current_branch, [])
-            continue
+    Returns:
+        List[Branch]: 分支列表
+    """
+    branches: Dict[str, List[Command]] = {}
+    current_commands: Optional[List[Command]] = None
+    match_line = _LINE_PATTERN.match
 
-        # 命令处理
-        if current_branch is None:
-            continue  # 忽略分支外的指令
+    for line_number, raw_line in enumerate(content.split('\n')):
+        match = match_line(raw_line)
+        if match is None:
+            continue  # 空行、注释及无关行
 
+        keyword = match.group(1)
+        payload = match.group(2).strip()
         try:
-            if (command := _parse_command(line, line_number)) is not None:
-                branches[current_branch].append(command)
-        except CommandError as e:
-            warnings.warn(str(e))  # 非致命错误仅警告
+            # 分支声明处理
+            if keyword == "branch":
+                if not payload:
+                    current_commands = None  # 丢弃后续指令，直到出现合法的分支声明
+                    raise BranchError(f"第 {line_number+1} 行：分支名称不能为空")
+                current_commands = branches.setdefault(sys.intern(payload), [])
+                continue
+
+            # 忽略分支外的指令
+            if current_commands is None:
+                continue
+
+            current_commands.append(_COMMAND_PARSERS[keyword](payload, line_number))
+        except ScriptValidationError as e:
+            # 非致命错误仅警告，跳过该行
+            logger.warning(str(e))
+            if errors is not None:
+                errors.append(str(e))
 
     return [Branch(name=name, commands=cmds) for name, cmds in branches.items()]
 
-def parse_script(content: str) -> List[Branch]:
+def parse_script(content: str, errors: Optional[List[str]] = None) -> List[Branch]:
+    """解析脚本文本
+
+    Args:
+        content: 脚本文本
+        errors: 可选，用于收集被跳过的错误行信息
+
+    Returns:
+        List[Branch]: 分支列表
+    """
     try:
         # 第一阶段：解析基础结构
-        branches = _parse_script_structure(content)
+        branches = _parse_script_structure(content, errors)
         #TODO 先关闭测试
         # branches_dict = {branch.name: branch.commands for branch in branches}
 
@@ -206,6 +212,25 @@ def parse_script(content: str) -> List[Branch]:
     except Exception as e:
         raise ScriptValidationError(f"脚本解析出现未知错误：{str(e)}") from e
 
+def _serialize_command(cmd: Command) -> Optional[str]:
+    """将单条指令序列化为脚本行，未知指令返回None"""
+    if isinstance(cmd, NarrationCommand):
+        return f"narration {cmd.text}"
+    elif isinstance(cmd, DialogueCommand):
+        dialogue_line = f"dialogue {cmd.character}, {cmd.emotion}, {cmd.text}"
+        if cmd.target:
+            dialogue_line += f" -> {cmd.target}"
+        return dialogue_line
+    elif isinstance(cmd, BackgroundCommand):
+        return f"bg {cmd.name} {cmd.prompt.strip()}"
+    elif isinstance(cmd, ChoiceCommand):
+        return f"choice {cmd.text}, {cmd.target}"
+    elif isinstance(cmd, JumpCommand):
+        return f"jump {cmd.target}"
+    elif isinstance(cmd, BGMCommand):
+        return f"bgm {cmd.name} {cmd.prompt.strip()}"
+    return None
+
 def serialize_script(branches: List[Branch]) -> str:
     """将分支列表序列化为脚本文本格式
 
@@ -230,27 +255,37 @@ def serialize_script(branches: List[Branch]) -> str:
         
         # 添加命令
         for cmd in branch.commands:
-            if isinstance(cmd, NarrationCommand):
-                script_lines.append(f"narration {cmd.text}")
-            elif isinstance(cmd, DialogueCommand):
-                dialogue_line = f"dialogue {cmd.character}, {cmd.emotion}, {cmd.text}"
-                if cmd.target:
-                    dialogue_line += f" -> {cmd.target}"
-                script_lines.append(dialogue_line)
-            elif isinstance(cmd, BackgroundCommand):
-                script_lines.append(f"bg {cmd.name} {cmd.prompt.strip()}")
-            elif isinstance(cmd, ChoiceCommand):
-                script_lines.append(f"choice {cmd.text}, {cmd.target}")
-            elif isinstance(cmd, JumpCommand):
-                script_lines.append(f"jump {cmd.target}")
-            elif isinstance(cmd, BGMCommand):
-                script_lines.append(f"bgm {cmd.name} {cmd.prompt.strip()}")
+            line = _serialize_command(cmd)
+            if line is not None:
+                script_lines.append(line)
         
         # 添加空行分隔不同分支
         script_lines.append("")
     
     return "\n".join(script_lines).rstrip()
 
+def serialize_script_numbered(branches: List[Branch]) -> str:
+    """将分支列表序列化为带指令序号的脚本文本，供大模型标注插入位置
+
+    每条指令前加上其在所属分支中的序号，如 "[0] narration ..."
+
+    Args:
+        branches: Branch对象列表
+
+    Returns:
+        str: 带序号的脚本文本
+    """
+    script_lines = []
+    for branch in branches:
+        script_lines.append(f"branch {branch.name}")
+        for index, cmd in enumerate(branch.commands):
+            line = _serialize_command(cmd)
+            if line is not None:
+                script_lines.append(f"[{index}] {line}")
+        script_lines.append(f"[{len(branch.commands)}] (分支末尾)")
+        script_lines.append("")
+    return "\n".join(script_lines).rstrip()
+
 # 使用示例
 if __name__ == "__main__":
     sample_script = """
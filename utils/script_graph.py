@@ -0,0 +1,206 @@
+from typing import Dict, List, Set, Tuple
+from dataclasses import dataclass, field
+
+from schemas.script_commands import (
+    CommandType,
+    ChoiceCommand,
+    JumpCommand,
+    Branch,
+    Command,
+)
+
+ENTRY_BRANCH = "main"
+END_BRANCH = "end"
+
+
+@dataclass
+class BranchGraph:
+    """章节分支跳转图，边来自 choice/jump 指令的目标分支"""
+    edges: Dict[str, List[str]]
+    dangling: List[Tuple[str, str]] = field(default_factory=list)  # (所在分支, 不存在的目标分支)
+
+    @classmethod
+    def from_branches(cls, branches: List[Branch]) -> "BranchGraph":
+        names = {branch.name for branch in branches}
+        edges: Dict[str, List[str]] = {}
+        dangling: List[Tuple[str, str]] = []
+        for branch in branches:
+            targets = edges.setdefault(branch.name, [])
+            for cmd in branch.commands:
+                if not isinstance(cmd, (ChoiceCommand, JumpCommand)):
+                    continue
+                if cmd.target in names:
+                    if cmd.target not in targets:
+                        targets.append(cmd.target)
+                elif (branch.name, cmd.target) not in dangling:
+                    dangling.append((branch.name, cmd.target))
+        return cls(edges=edges, dangling=dangling)
+
+    def reachable_from(self, start: str) -> Set[str]:
+        """从指定分支出发可到达的分支集合（含自身）"""
+        if start not in self.edges:
+            return set()
+        seen = {start}
+        stack = [start]
+        while stack:
+            for target in self.edges[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    def can_reach(self, target: str) -> Set[str]:
+        """可以到达指定分支的分支集合（含自身）"""
+        reverse: Dict[str, List[str]] = {name: [] for name in self.edges}
+        for source, targets in self.edges.items():
+            for t in targets:
+                reverse[t].append(source)
+        if target not in reverse:
+            return set()
+        seen = {target}
+        stack = [target]
+        while stack:
+            for source in reverse[stack.pop()]:
+                if source not in seen:
+                    seen.add(source)
+                    stack.append(source)
+        return seen
+
+    def cycles(self) -> List[List[str]]:
+        """
+        查找环（强连通分量，Tarjan 算法的迭代实现）
+
+        end 分支指向自身的 "jump end" 是常见的结束写法，不视为环。
+        """
+        index_of: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        result: List[List[str]] = []
+        counter = 0
+
+        for root in self.edges:
+            if root in index_of:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, child_index = work.pop()
+                if child_index == 0:
+                    index_of[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                targets = self.edges[node]
+                if child_index < len(targets):
+                    work.append((node, child_index + 1))
+                    target = targets[child_index]
+                    if target not in index_of:
+                        work.append((target, 0))
+                    elif target in on_stack:
+                        low[node] = min(low[node], index_of[target])
+                    continue
+                if low[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    is_self_loop = len(component) == 1 and node in self.edges[node]
+                    if len(component) > 1 or (is_self_loop and node != END_BRANCH):
+                        result.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return result
+
+
+@dataclass
+class GraphRepairResult:
+    """分支图分析与修复结果"""
+    branches: List[Branch]
+    unreachable_branches: List[str]
+    dangling_targets: List[str]
+    cycles: List[List[str]]
+    trapped_branches: List[str]
+    skipped_scene_images: int = 0
+    skipped_dialogue_lines: int = 0
+    skipped_bgm: int = 0
+
+
+def _repair_dangling(branch: Branch, valid_names: Set[str]) -> Branch:
+    """将指向不存在分支的跳转重定向到 end 分支，没有 end 分支时删除该指令"""
+    commands: List[Command] = []
+    for cmd in branch.commands:
+        if isinstance(cmd, (ChoiceCommand, JumpCommand)) and cmd.target not in valid_names:
+            if END_BRANCH not in valid_names:
+                continue
+            cmd = (
+                ChoiceCommand(text=cmd.text, target=END_BRANCH)
+                if isinstance(cmd, ChoiceCommand)
+                else JumpCommand(target=END_BRANCH)
+            )
+        commands.append(cmd)
+    return Branch(name=branch.name, commands=commands)
+
+
+def analyze_and_repair(branches: List[Branch]) -> GraphRepairResult:
+    """
+    分析章节分支图：从 main 出发计算可达性，检测环与悬空跳转，
+    裁剪不可达分支并修复悬空跳转，统计因此跳过的媒体生成数量
+
+    Args:
+        branches: 章节分支列表
+
+    Returns:
+        GraphRepairResult: 修复后的分支及分析报告
+    """
+    graph = BranchGraph.from_branches(branches)
+    names = {branch.name for branch in branches}
+
+    # 缺少 main 分支时无法判断可达性，保留全部分支
+    reachable = graph.reachable_from(ENTRY_BRANCH) if ENTRY_BRANCH in names else set(names)
+    # end 分支是结局，即便不可达也保留
+    keep = reachable | ({END_BRANCH} & names)
+
+    kept_branches: List[Branch] = []
+    pruned_branches: List[Branch] = []
+    for branch in branches:
+        if branch.name in keep:
+            kept_branches.append(_repair_dangling(branch, keep))
+        else:
+            pruned_branches.append(branch)
+
+    # 环与无法结束的分支基于修复后的图计算
+    repaired_graph = BranchGraph.from_branches(kept_branches)
+    reaches_end = repaired_graph.can_reach(END_BRANCH)
+
+    # 被裁剪分支中仍被保留分支使用的背景/音乐不计入跳过数量
+    kept_media = {
+        (cmd.type, cmd.name)
+        for branch in kept_branches
+        for cmd in branch.commands
+        if cmd.type in (CommandType.BG, CommandType.BGM)
+    }
+    skipped_media: Set[Tuple[CommandType, str]] = set()
+    skipped_dialogue_lines = 0
+    for branch in pruned_branches:
+        for cmd in branch.commands:
+            if cmd.type == CommandType.DIALOGUE:
+                skipped_dialogue_lines += 1
+            elif cmd.type in (CommandType.BG, CommandType.BGM) and (cmd.type, cmd.name) not in kept_media:
+                skipped_media.add((cmd.type, cmd.name))
+
+    return GraphRepairResult(
+        branches=kept_branches,
+        unreachable_branches=[branch.name for branch in pruned_branches],
+        dangling_targets=[f"{source}->{target}" for source, target in graph.dangling],
+        cycles=repaired_graph.cycles(),
+        trapped_branches=sorted(
+            name for name in reachable if END_BRANCH in names and name not in reaches_end
+        ),
+        skipped_scene_images=sum(1 for kind, _ in skipped_media if kind == CommandType.BG),
+        skipped_dialogue_lines=skipped_dialogue_lines,
+        skipped_bgm=sum(1 for kind, _ in skipped_media if kind == CommandType.BGM),
+    )
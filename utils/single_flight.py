@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化提示词等文本：合并空白并去除首尾空白"""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def make_key(**params: Any) -> str:
+    """
+    根据请求参数生成去重键
+
+    字符串参数会先规范化，参数顺序不影响结果
+    """
+    normalized = {
+        name: normalize_text(value) if isinstance(value, str) else value
+        for name, value in params.items()
+    }
+    raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SingleFlightStats:
+    """单飞去重统计"""
+    calls: int = 0       # 发起的请求总数
+    executions: int = 0  # 实际调用服务商的次数
+    saved: int = 0       # 被合并而节省的调用次数
+    in_flight: int = 0   # 当前进行中的调用数
+    cancelled: int = 0   # 所有等待者都被取消而中止的调用数
+
+
+@dataclass
+class _Call:
+    """进行中的调用及其等待者数量"""
+    future: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    单飞去重：相同键的并发请求只执行一次，其余请求共享同一结果（或异常）
+
+    调用在独立任务中执行，某个等待者被取消不会影响其他等待者；所有等待者都被取消时
+    （如游戏生成被取消）中止调用，释放调度器槽位，不再轮询服务商。
+    每个服务商一个实例，通过名称注册，便于统一查看节省的调用次数。
+    """
+    _registry: Dict[str, "SingleFlight"] = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, name: str):
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = super().__new__(cls)
+            return cls._registry[name]
+
+    def __init__(self, name: str):
+        if not hasattr(self, '_initialized'):
+            self._name = name
+            self._calls: Dict[str, _Call] = {}
+            self._stats = SingleFlightStats()
+            self._initialized = True
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行或加入一个进行中的调用
+
+        Args:
+            key: 去重键，一般由 make_key 生成
+            fn: 无参协程函数，真正调用服务商的逻辑
+
+        Returns:
+            调用结果
+        """
+        self._stats.calls += 1
+        call = self._calls.get(key)
+        if call is not None:
+            self._stats.saved += 1
+            return await self._wait(key, call)
+
+        call = _Call(asyncio.ensure_future(fn()))
+        self._calls[key] = call
+        self._stats.executions += 1
+        self._stats.in_flight += 1
+
+        def _done(future: asyncio.Future) -> None:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            self._stats.in_flight -= 1
+            # 无人等待时取出异常，避免 "exception was never retrieved" 警告
+            if not future.cancelled():
+                future.exception()
+
+        call.future.add_done_callback(_done)
+        return await self._wait(key, call)
+
+    async def _wait(self, key: str, call: _Call) -> T:
+        """等待调用结果，最后一个等待者被取消时中止调用"""
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.future)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.future.done():
+                # 之后的相同请求重新发起调用，不加入正在中止的调用
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.future.cancel()
+                self._stats.cancelled += 1
+                # 等待调用退出并归还调度器槽位后再向上传递取消
+                await asyncio.wait({call.future})
+
+    def stats(self) -> Dict[str, int]:
+        return asdict(self._stats)
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, int]]:
+        """获取所有单飞实例的统计"""
+        with cls._registry_lock:
+            return {name: instance.stats() for name, instance in cls._registry.items()}
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculationRegistry:
+    """
+    预生成任务登记表（单例模式）
+
+    记录每个游戏在后台进行的下一章预生成任务：
+    - 每个用户同时进行的预生成数量受 SPECULATIVE_MAX_PER_USER 限制
+    - 用户发起真正的生成请求时可随时取消（抢占）其预生成任务
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            # game_id -> (user_id, task)
+            self._tasks: Dict[str, Tuple[str, asyncio.Task]] = {}
+            self._started = 0
+            self._preempted = 0
+            self._initialized = True
+
+    def running_for_user(self, user_id: str) -> int:
+        """用户当前进行中的预生成数量"""
+        return sum(1 for owner, _ in self._tasks.values() if owner == str(user_id))
+
+    def start(self, user_id: str, game_id: str, factory: Callable[[], Awaitable[None]]) -> bool:
+        """
+        启动预生成任务
+
+        Args:
+            user_id: 用户ID
+            game_id: 游戏ID
+            factory: 无参协程函数，执行实际的预生成
+
+        Returns:
+            bool: 是否启动（已在进行或超过用户上限时不启动）
+        """
+        user_id, game_id = str(user_id), str(game_id)
+        if game_id in self._tasks:
+            return False
+        if self.running_for_user(user_id) >= get_settings().SPECULATIVE_MAX_PER_USER:
+            logger.info(f"用户 {user_id} 预生成数量已达上限，跳过游戏 {game_id}")
+            return False
+
+        task = asyncio.create_task(factory())
+        self._tasks[game_id] = (user_id, task)
+        self._started += 1
+
+        def _done(_: asyncio.Task) -> None:
+            if self._tasks.get(game_id, (None, None))[1] is task:
+                del self._tasks[game_id]
+
+        task.add_done_callback(_done)
+        return True
+
+    async def cancel(self, game_id: str) -> bool:
+        """
+        取消游戏的预生成任务并等待其退出
+
+        调用方自身被取消时（如生成锁续期任务随锁释放或服务关闭被取消）照常抛出 CancelledError，
+        只有预生成任务的取消与异常在这里处理。
+
+        Returns:
+            bool: 是否有任务被取消
+        """
+        entry = self._tasks.pop(str(game_id), None)
+        if entry is None:
+            return False
+        _, task = entry
+        if task.done():
+            return False
+        task.cancel()
+        # asyncio.wait 不抛出任务的结果，CancelledError 只来自调用方自身被取消
+        await asyncio.wait({task})
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"预生成任务退出时出错 {game_id}: {str(task.exception())}")
+        self._preempted += 1
+        logger.info(f"已取消游戏 {game_id} 的预生成任务")
+        return True
+
+    async def preempt_user(self, user_id: str) -> int:
+        """取消用户的所有预生成任务，为前台生成让出资源"""
+        game_ids: List[str] = [
+            game_id for game_id, (owner, _) in self._tasks.items() if owner == str(user_id)
+        ]
+        cancelled = 0
+        for game_id in game_ids:
+            if await self.cancel(game_id):
+                cancelled += 1
+        return cancelled
+
+    def snapshot(self) -> Dict[str, object]:
+        """预生成统计"""
+        return {
+            "running": {game_id: owner for game_id, (owner, _) in self._tasks.items()},
+            "started": self._started,
+            "preempted": self._preempted,
+        }
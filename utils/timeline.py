@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from config import get_settings
+from models.types import PyObjectId
+from utils.metrics import GENERATION_SPAN_DURATION
+from utils.scheduler import current_job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """生成过程中的一个时间段"""
+    kind: str  # workflow / chapter / item / llm / upload
+    name: str  # 工作流名称、重试统计名称、提示词名称或上传类型
+    chapter_index: Optional[int] = None
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    duration_seconds: float = 0.0
+    queue_wait_seconds: float = 0.0  # 等待服务商调度槽位的时间
+    provider_seconds: float = 0.0  # 占用调度槽位（实际调用服务商）的时间
+    retries: int = 0
+    bytes: int = 0
+    succeeded: bool = True
+    error: Optional[str] = None
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("timeline_span", default=None)
+
+
+class GenerationTimeline:
+    """
+    游戏生成时间线收集器（单例模式）
+
+    span() 记录一个时间段，嵌套时排队等待、服务商耗时、重试与上传字节计入最内层的时间段。
+    时间段按当前任务的游戏缓存，游戏生成结束、缓存达到 TIMELINE_FLUSH_SIZE 条或最早的时间段缓存超过
+    TIMELINE_FLUSH_SECONDS 秒时批量写入 game_timelines 集合，长时间生成的游戏在进程退出时最多丢失这段时间的记录。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_initialized'):
+            self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+            # game_id -> 缓存中最早的时间段记录时间（time.monotonic）
+            self._buffered_at: Dict[str, float] = {}
+            # 进行中的写入任务，保留引用避免任务被回收
+            self._flush_tasks: Set[asyncio.Task] = set()
+            self._flusher: Optional[asyncio.Task] = None
+            self._repository = None
+            self._recorded = 0
+            self._written = 0
+            self._initialized = True
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from core.container import get_timeline_repository
+            self._repository = get_timeline_repository()
+        return self._repository
+
+    @contextmanager
+    def span(self, kind: str, name: str, chapter_index: Optional[int] = None) -> Iterator[Span]:
+        """
+        记录代码块的时间段，代码块抛出异常时标记为失败
+
+        用法:
+            with GenerationTimeline().span("workflow", "chapter_split") as span:
+                result = await workflow.execute(game)
+                span.succeeded = result.success
+        """
+        span = Span(kind=kind, name=name, chapter_index=chapter_index)
+        game_id = current_job().game_id
+        started = time.monotonic()
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.succeeded = False
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration_seconds = time.monotonic() - started
+            GENERATION_SPAN_DURATION.observe(span.duration_seconds, kind, name, "success" if span.succeeded else "error")
+            if game_id and get_settings().TIMELINE_ENABLED:
+                self._record(game_id, span)
+
+    def add(self, name: str, amount: float) -> None:
+        """为当前时间段累加排队等待、服务商耗时、重试次数或上传字节数"""
+        span = _current_span.get()
+        if span is not None:
+            setattr(span, name, getattr(span, name) + amount)
+
+    def _record(self, game_id: str, span: Span) -> None:
+        settings = get_settings()
+        doc = asdict(span)
+        doc.update({
+            "game_id": PyObjectId(game_id),
+            "user_id": current_job().user_id,
+            "ended_at": span.started_at + timedelta(seconds=span.duration_seconds),
+            "expires_at": span.started_at + timedelta(days=settings.TIMELINE_TTL_DAYS),
+        })
+        buffer = self._buffers.setdefault(game_id, [])
+        buffer.append(doc)
+        self._buffered_at.setdefault(game_id, time.monotonic())
+        self._recorded += 1
+        if len(buffer) >= settings.TIMELINE_FLUSH_SIZE:
+            self._flush_in_background(game_id)
+        self._ensure_flusher()
+
+    def _flush_in_background(self, game_id: str) -> None:
+        task = asyncio.ensure_future(self.flush(game_id))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _ensure_flusher(self) -> None:
+        """有缓存的时间段时启动按时间写入的任务"""
+        if get_settings().TIMELINE_FLUSH_SECONDS <= 0:
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        """写入缓存超过 TIMELINE_FLUSH_SECONDS 秒的游戏，缓存清空后结束，下次记录时重新启动"""
+        max_age = get_settings().TIMELINE_FLUSH_SECONDS
+        while self._buffered_at:
+            await asyncio.sleep(max_age / 2)
+            expired_before = time.monotonic() - max_age
+            for game_id, buffered_at in list(self._buffered_at.items()):
+                if buffered_at <= expired_before:
+                    self._flush_in_background(game_id)
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    async def flush(self, game_id: Any) -> None:
+        """写入游戏缓存的时间段"""
+        self._buffered_at.pop(str(game_id), None)
+        spans = self._buffers.pop(str(game_id), None)
+        if spans and await self.repository.insert_spans(spans):
+            self._written += len(spans)
+
+    def snapshot(self) -> Dict[str, object]:
+        """时间段记录与写入数量"""
+        return {
+            "recorded": self._recorded,
+            "written": self._written,
+            "buffered_games": len(self._buffers),
+            "buffered_spans": sum(len(spans) for spans in self._buffers.values()),
+            "flushing": len(self._flush_tasks),
+        }
@@ -5,7 +5,9 @@ from schemas.script_commands import BGMCommand, CommandType
 from workflows.base_workflow import Workflow, WorkflowResult
 from models.game import DBGame, BackgroundMusicResource, GameChapter, GameGenerationProgress, ChapterGenerationStatus
 from utils.music_generator import MusicGenerator, MusicTaskStatus
+from utils.music_library import MusicLibrary
 from utils.ali_upload import upload_from_url
+from utils.retry import PermanentError, RetryableError, failed_item, merge_failed_items, retry_async, within_failure_tolerance
 from repositories.base_repository import BaseRepository
 import logging
 import asyncio
@@ -50,38 +52,66 @@ class BackgroundMusicWorkflow(Workflow[DBGame]):
                 )
             
             self.music_generator: MusicGenerator = await MusicGenerator.get_instance()
+            music_library = await MusicLibrary.get_instance()
+
+            async def generate_music(prompt: str):
+                result = await self.music_generator.generate_music(prompt=prompt)
+                if result and result.status == MusicTaskStatus.SUCCESS and result.oss_audio_url:
+                    return result
+                status = result.status if result else None
+                error = result.error_message if result and result.error_message else "Failed to generate background music"
+                # 提示词含敏感词时重试也不会成功
+                if status == MusicTaskStatus.SENSITIVE_WORD_ERROR:
+                    raise PermanentError(error)
+                raise RetryableError(error)
 
             async def generate_background_music(chapter: GameChapter, bgm_command: BGMCommand):
                 try:
-                    # 生成背景音乐
-                    result = await self.music_generator.generate_music(
-                        prompt=bgm_command.prompt
-                    )
-
-                    if result and result.status == MusicTaskStatus.SUCCESS and result.oss_audio_url:
+                    # 曲库中有足够相似的曲目时直接复用
+                    track = await music_library.find(bgm_command.prompt)
+                    if track:
                         return {
                             "data": BackgroundMusicResource(
                                 chapter_index=chapter.index,
                                 bgm_name=bgm_command.name,
-                                audio_url=result.oss_audio_url,
+                                audio_url=track.audio_url,
                                 prompt=bgm_command.prompt,
                             ),
                             "success": True
                         }
-                    
+
+                    # 生成背景音乐，暂时性错误按退避重试
+                    result = await retry_async(
+                        lambda: generate_music(bgm_command.prompt),
+                        name="background_music"
+                    )
+                    await music_library.add(
+                        prompt=bgm_command.prompt,
+                        audio_url=result.oss_audio_url,
+                        title=result.title,
+                        duration=result.duration
+                    )
                     return {
-                        "success": False,
-                        "error": "Failed to generate background music"
+                        "data": BackgroundMusicResource(
+                            chapter_index=chapter.index,
+                            bgm_name=bgm_command.name,
+                            audio_url=result.oss_audio_url,
+                            prompt=bgm_command.prompt,
+                        ),
+                        "success": True
                     }
                 except Exception as e:
                     logger.error(f"Failed to generate background music for chapter {chapter.index}: {str(e)}")
                     return {
                         "success": False,
-                        "error": str(e)
+                        "chapter_index": chapter.index,
+                        "error": str(e),
+                        "item": failed_item("background_music", chapter.index, bgm_command.name, e)
                     }
 
-            # 并发生成所有背景音乐
+            # 并发生成所有背景音乐，同一章节重复的BGM只生成一次
             tasks = []
+            queued = set()
             for chapter in chapters_to_generate:
                 if not chapter.branches:
                     continue
@@ -95,9 +125,10 @@ class BackgroundMusicWorkflow(Workflow[DBGame]):
                                 resource.chapter_index == chapter.index
                                 and resource.bgm_name == bgm_command.name
                                 for resource in game.background_music_resources
-                            ):
+                            ) or (chapter.index, bgm_command.name) in queued:
                                 continue
-                            
+
+                            queued.add((chapter.index, bgm_command.name))
                             tasks.append(generate_background_music(chapter, bgm_command))
 
             successful_resources = []
@@ -123,10 +154,19 @@ class BackgroundMusicWorkflow(Workflow[DBGame]):
                     for failed in failed_resources:
                         logger.warning(f"Chapter {failed['chapter_index']}: {failed.get('error', 'Unknown error')}")
 
+            # 重试后仍失败的条目记入死信列表，重新生成时只重新提交这些条目
+            game.failed_items = merge_failed_items(
+                game.failed_items,
+                "background_music",
+                queued,
+                [failed["item"] for failed in failed_resources]
+            )
+            stage_succeeded = within_failure_tolerance(len(failed_resources), len(tasks))
+
             # 更新进度
             generate_progress = GameGenerationProgress(
-                current_workflow="background_music" if not failed_resources else game.progress.current_workflow,
-                progress=80 if not failed_resources else game.progress.progress
+                current_workflow="background_music" if stage_succeeded else game.progress.current_workflow,
+                progress=80 if stage_succeeded else game.progress.progress
             )
 
             # 更新游戏对象
@@ -137,6 +177,7 @@ class BackgroundMusicWorkflow(Workflow[DBGame]):
                 id=game.id,
                 fields={
                     "background_music_resources": game.background_music_resources,
+                    "failed_items": game.failed_items,
                     "progress": generate_progress
                 }
             )
@@ -148,9 +189,12 @@ class BackgroundMusicWorkflow(Workflow[DBGame]):
                 )
 
             return WorkflowResult(
-                success=True if not failed_resources else False,
+                success=stage_succeeded,
                 data=game,
-                error="Some background music failed to generate" if failed_resources else None
+                error=None if stage_succeeded else "Some background music failed to generate",
+                error_details=None if stage_succeeded else {
+                    "failed_items": [failed["item"].model_dump(mode="json") for failed in failed_resources]
+                }
             )
 
         except Exception as e:
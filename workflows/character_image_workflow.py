@@ -1,16 +1,24 @@
 from workflows.base_workflow import Workflow, WorkflowResult
-from models.game import DBGame, GameGenerationProgress, CharacterResource
+from models.game import DBGame, GameGenerationProgress, CharacterResource, Character
 from utils.llm_tool import LLMTool
 from utils.image_tool import ImageText2ImageTool
+from utils.image_cache import ImageCache
+from utils.single_flight import normalize_text
 from repositories.base_repository import BaseRepository
+from config import get_settings
 import logging
 import json
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+# 角色立繪尺寸
+CHARACTER_IMAGE_WIDTH = 512
+CHARACTER_IMAGE_HEIGHT = 768
+CHARACTER_NEGATIVE_PROMPT = "bad quality, blurry, distorted, deformed"
+
 class CharacterImageWorkflow(Workflow[DBGame]):
     """角色圖片生成工作流，處理角色立繪的生成"""
 
@@ -63,43 +71,89 @@ class CharacterImageWorkflow(Workflow[DBGame]):
             if characters_to_generate:
                 # 获取 ImageTool 实例
                 image_tool = await ImageText2ImageTool.get_instance()
-                
-                # 建立圖片生成任務
-                image_tasks = []
+                settings = get_settings()
+                image_cache = ImageCache(scope=settings.CHARACTER_IMAGE_CACHE_SCOPE)
+
+                # 提示詞相同的角色歸為一組，共用緩存並合併到同一個生成任務中
+                prompt_groups: Dict[str, List[Character]] = {}
                 for character in characters_to_generate:
-                    # 創建圖片生成任務
-                    task = image_tool.async_text2img(
-                        prompt=character.image_prompt,
-                        negative_prompt="bad quality, blurry, distorted, deformed",
-                        width=512,
-                        height=768,
-                        upload_to_oss=True,
-                        oss_type="character"
+                    key = normalize_text(character.image_prompt).lower()
+                    prompt_groups.setdefault(key, []).append(character)
+
+                async def generate_group(characters: List[Character]) -> List[Tuple[Character, Optional[str]]]:
+                    prompt = characters[0].image_prompt
+                    # 先取已有的變體，每個角色分配一個
+                    urls = await image_cache.lookup_many(
+                        kind="character",
+                        prompt=prompt,
+                        width=CHARACTER_IMAGE_WIDTH,
+                        height=CHARACTER_IMAGE_HEIGHT,
+                        game_id=game.id,
+                        count=len(characters)
                     )
-                    image_tasks.append((character, task))
-                
-                # 並行執行所有圖片生成任務並等待完成
-                results = await asyncio.gather(
-                    *[task for _, task in image_tasks],
-                    return_exceptions=True
+
+                    # 剩餘的角色按服務商允許的最大數量批量生成
+                    missing = len(characters) - len(urls)
+                    batch_sizes = []
+                    while missing > 0:
+                        batch_sizes.append(min(missing, settings.IMAGE_MAX_BATCH_COUNT))
+                        missing -= batch_sizes[-1]
+                    results = await asyncio.gather(
+                        *[
+                            image_tool.async_text2img(
+                                prompt=prompt,
+                                negativePrompts=[{"text": CHARACTER_NEGATIVE_PROMPT}],
+                                width=CHARACTER_IMAGE_WIDTH,
+                                height=CHARACTER_IMAGE_HEIGHT,
+                                count=batch_size,
+                                upload_to_oss=True,
+                                oss_type="character"
+                            )
+                            for batch_size in batch_sizes
+                        ],
+                        return_exceptions=True
+                    )
+
+                    new_urls = []
+                    for result in results:
+                        if isinstance(result, Exception):
+                            logger.error(f"圖片生成失敗，角色 {[c.name for c in characters]}: {str(result)}")
+                        elif result:
+                            new_urls.extend(result.get("oss_urls", []))
+                    if new_urls:
+                        await image_cache.store_many(
+                            kind="character",
+                            prompt=prompt,
+                            width=CHARACTER_IMAGE_WIDTH,
+                            height=CHARACTER_IMAGE_HEIGHT,
+                            urls=new_urls,
+                            game_id=game.id
+                        )
+
+                    urls = urls + new_urls
+                    return [
+                        (character, urls[i] if i < len(urls) else None)
+                        for i, character in enumerate(characters)
+                    ]
+
+                # 並行執行所有分組並等待完成
+                group_results = await asyncio.gather(
+                    *[generate_group(characters) for characters in prompt_groups.values()]
                 )
-                
+
                 # 處理生成結果
                 is_success = True
-                for (character, _), result in zip(image_tasks, results):
-                    if isinstance(result, Exception):
-                        is_success = False
-                        logger.error(f"圖片生成失敗，角色 {character.name}: {str(result)}")
-                    elif result and "oss_url" in result:
-                        # 創建角色資源記錄
-                        resource = CharacterResource(
-                            character_name=character.name,
-                            image_url=result["oss_url"]
-                        )
-                        new_resources.append(resource)
-                    else:
-                        is_success = False
-                        logger.error(f"圖片生成失敗，角色 {character.name}")
+                for group in group_results:
+                    for character, image_url in group:
+                        if image_url:
+                            # 創建角色資源記錄
+                            new_resources.append(CharacterResource(
+                                character_name=character.name,
+                                image_url=image_url
+                            ))
+                        else:
+                            is_success = False
+                            logger.error(f"圖片生成失敗，角色 {character.name}")
                 
                 # 更新進度
                 generate_progress = GameGenerationProgress(
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Set
 import uuid
 
 import httpx
@@ -6,6 +6,11 @@ from workflows.base_workflow import Workflow, WorkflowResult
 from models.game import Character, DBGame, DialogueTTSResource, GameChapter, GameGenerationProgress, ChapterGenerationStatus, StoryCharacterInfo
 from utils.voice_generator import VoiceGenerator
 from utils.ali_upload import upload_from_url
+from utils.single_flight import SingleFlight, make_key
+from utils.circuit_breaker import call_provider
+from utils.hedging import Hedger
+from utils.rate_limiter import AdaptiveRateLimiter
+from utils.retry import RetryableError, failed_item, merge_failed_items, retry_async, within_failure_tolerance
 from repositories.base_repository import BaseRepository
 from schemas.script_commands import CommandType, DialogueCommand
 import logging
@@ -14,13 +19,21 @@ from config import get_settings
 
 logger = logging.getLogger(__name__)
 
-TTS_API_URL = "https://gsv.ai-lab.top/infer_single"
+# 对话语音生成模式
+TTS_MODE_EAGER = "eager"  # 生成阶段为所有对话合成语音
+TTS_MODE_LAZY = "lazy"  # 发布时不含语音，游玩时按需合成
+
+def get_tts_mode(game: DBGame) -> str:
+    """获取游戏的语音生成模式，游戏设置 tts_mode 优先于全局配置"""
+    return game.settings.get("tts_mode") or get_settings().DIALOGUE_TTS_MODE
 
 class DialogueTTSWorkflow(Workflow[DBGame]):
     """对话TTS生成工作流，处理游戏对话的语音生成"""
 
-    def __init__(self, game_repository: BaseRepository[DBGame]):
+    def __init__(self, game_repository: BaseRepository[DBGame], chapter_indexes: Optional[Set[int]] = None):
         self.game_repository = game_repository
+        # 指定时只处理这些章节，用于逐章生成并发布
+        self.chapter_indexes = chapter_indexes
 
     def _find_character(self, character_name: str, story_character_info: StoryCharacterInfo) -> Optional[Character]:
         """
@@ -119,32 +132,90 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
         }
         if extra_headers:
             headers.update(extra_headers)
+
+        # 相同音色与文本的并发请求只合成、上传一次
+        key = make_key(**{name: value for name, value in payload.items() if name != "access_token"})
+        return await SingleFlight("tts").do(
+            key,
+            lambda: call_provider("tts", lambda: self._request_tts(payload, headers))
+        )
+
+    async def _post_tts(
+        self,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        rate_limiter: AdaptiveRateLimiter
+    ) -> Dict[str, Any]:
+        """发出一次TTS合成请求"""
         async with httpx.AsyncClient() as client:
-            resp = await client.post(TTS_API_URL, json=payload, headers=headers, timeout=60.0)
+            resp = await client.post(get_settings().TTS_API_URL, json=payload, headers=headers, timeout=60.0)
+            rate_limiter.observe(resp)
             resp.raise_for_status()
-            result = resp.json()
+            return resp.json()
+
+    async def _request_tts(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """调用TTS接口并将音频上传到OSS"""
+        rate_limiter = AdaptiveRateLimiter("tts")
+        await rate_limiter.acquire()
+        # 开启对冲时只对冲合成请求本身：限速等待与上传不计入耗时样本，也不会触发重复合成
+        result = await Hedger("tts").run(lambda: self._post_tts(payload, headers, rate_limiter))
+        # 上传音频文件到OSS（只上传胜出的结果）
+        if result and "audio_url" in result:
+            # 生成唯一的文件名
+            file_ext = result["audio_url"].split(".")[-1]
+            unique_filename = f"{uuid.uuid4()}.{file_ext}"
+            oss_path = f"gal-test/tts/{unique_filename}"
             
-            # 上传音频文件到OSS
-            if result and "audio_url" in result:
-                # 生成唯一的文件名
-                file_ext = result["audio_url"].split(".")[-1]
-                unique_filename = f"{uuid.uuid4()}.{file_ext}"
-                oss_path = f"gal-test/tts/{unique_filename}"
-                
-                # 上传到OSS
-                upload_success = await upload_from_url(
-                    url=result["audio_url"],
-                    type="audio",
-                    oss_object_path=oss_path
-                )
-                
-                if upload_success:
-                    # 替换URL为OSS地址
-                    settings = get_settings()
-                    oss_url = f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT.replace('https://', '')}/{oss_path}"
-                    result["audio_url"] = oss_url
-                
-            return result
+            # 上传到OSS
+            upload_success = await upload_from_url(
+                url=result["audio_url"],
+                type="audio",
+                oss_object_path=oss_path
+            )
+            
+            if upload_success:
+                # 替换URL为OSS地址
+                settings = get_settings()
+                oss_url = f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT.replace('https://', '')}/{oss_path}"
+                result["audio_url"] = oss_url
+            
+        return result
+
+    async def synthesize_line(
+        self,
+        chapter_index: int,
+        dialogue_command: DialogueCommand,
+        character: Character
+    ) -> Optional[DialogueTTSResource]:
+        """
+        为单句对话合成语音
+
+        Args:
+            chapter_index: 章节索引
+            dialogue_command: 对话指令
+            character: 说话角色
+
+        Returns:
+            Optional[DialogueTTSResource]: 合成成功时返回语音资源
+        """
+        # 处理可能带有匹配度的情况，如 "巴多里奥（匹配度90%）"
+        speaker_name = character.voice_match.split("（")[0].strip() if character.voice_match else None
+
+        logger.info(f"开始为章节生成tts {chapter_index}, character {dialogue_command.character}, speaker_name {speaker_name}, text {dialogue_command.text}")
+        result = await self.call_tts_api(
+            text=dialogue_command.text,
+            speaker_name=speaker_name,
+        )
+        logger.info(f"生成tts {dialogue_command.text} ,结果 {result}")
+
+        if result and result.get("audio_url"):
+            return DialogueTTSResource(
+                chapter_index=chapter_index,
+                character_name=dialogue_command.character,
+                audio_url=result["audio_url"],
+                text=dialogue_command.text,
+            )
+        return None
 
     async def execute(self, game: DBGame) -> WorkflowResult[DBGame]:
         """
@@ -168,6 +239,7 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                 chapter for chapter in game.chapters
                 if chapter.generation_status == ChapterGenerationStatus.BGM_GENERATED
                 and chapter.index < game.generate_chapter_index
+                and (self.chapter_indexes is None or chapter.index in self.chapter_indexes)
             ]
 
             if not chapters_to_generate:
@@ -176,45 +248,51 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                     error="No chapters need to generate dialogue TTS"
                 )
 
+            # 按需合成模式下跳过预生成，游玩时再合成
+            if get_tts_mode(game) == TTS_MODE_LAZY:
+                logger.info(f"游戏 {game.id} 使用按需语音合成，跳过预生成")
+                game.progress = GameGenerationProgress(
+                    current_workflow="dialogue_tts",
+                    progress=80
+                )
+                await self.game_repository.update(
+                    id=game.id,
+                    fields={"progress": game.progress}
+                )
+                return WorkflowResult(
+                    success=True,
+                    data=game
+                )
+
+            async def synthesize(chapter: GameChapter, dialogue_command: DialogueCommand, character: Character) -> DialogueTTSResource:
+                resource = await self.synthesize_line(chapter.index, dialogue_command, character)
+                if not resource:
+                    raise RetryableError("Failed to generate or upload voice")
+                return resource
+
             async def generate_dialogue_tts(chapter: GameChapter, dialogue_command: DialogueCommand, character: Character):
                 try:
-                    if character.voice_match:
-                        # 处理可能带有匹配度的情况，如 "巴多里奥（匹配度90%）"
-                        speaker_name = character.voice_match.split("（")[0].strip()
-
-                    #打印信息
-                    logger.info(f"开始为章节生成tts {chapter.index}, character {dialogue_command.character}, speaker_name {speaker_name}, text {dialogue_command.text}")
-                    # 使用语音生成器生成语音
-                    result = await self.call_tts_api(
-                        text=dialogue_command.text,
-                        speaker_name=speaker_name,
+                    # 暂时性错误按退避重试
+                    resource = await retry_async(
+                        lambda: synthesize(chapter, dialogue_command, character),
+                        name="dialogue_tts"
                     )
-                    logger.info(f"生成tts {dialogue_command.text} ,结果 {result}")
-
-                    if result and result.get("audio_url"):
-                        return {
-                            "data": DialogueTTSResource(
-                                chapter_index=chapter.index,
-                                character_name=dialogue_command.character,
-                                audio_url=result["audio_url"],  
-                                text=dialogue_command.text,
-                            ),
-                            "success": True
-                        }
-                    
                     return {
-                        "success": False,
-                        "error": "Failed to generate or upload voice"
+                        "data": resource,
+                        "success": True
                     }
                 except Exception as e:
                     logger.error(f"Failed to generate dialogue TTS for chapter {chapter.index}: {str(e)}")
                     return {
                         "success": False,
-                        "error": str(e)
+                        "chapter_index": chapter.index,
+                        "error": str(e),
+                        "item": failed_item("dialogue_tts", chapter.index, dialogue_command.text, e)
                     }
 
-            # 并发生成所有对话语音
+            # 并发生成所有对话语音，同一章节重复的台词只生成一次
             tasks = []
+            queued = set()
             for chapter in chapters_to_generate:
                 if not chapter.branches:
                     continue
@@ -232,9 +310,10 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                                     resource.chapter_index == chapter.index and
                                     resource.text == dialogue_command.text
                                     for resource in game.dialogue_tts_resources
-                                ):
+                                ) or (chapter.index, dialogue_command.text) in queued:
                                     continue
-                                    
+
+                                queued.add((chapter.index, dialogue_command.text))
                                 tasks.append(generate_dialogue_tts(chapter, dialogue_command, character))
 
             successful_resources = []
@@ -260,10 +339,19 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                     for failed in failed_resources:
                         logger.warning(f"Chapter {failed['chapter_index']}: {failed.get('error', 'Unknown error')}")
 
+            # 重试后仍失败的条目记入死信列表，重新生成时只重新提交这些条目
+            game.failed_items = merge_failed_items(
+                game.failed_items,
+                "dialogue_tts",
+                queued,
+                [failed["item"] for failed in failed_resources]
+            )
+            stage_succeeded = within_failure_tolerance(len(failed_resources), len(tasks))
+
             # 更新进度
             generate_progress = GameGenerationProgress(
-                current_workflow="dialogue_tts" if not failed_resources else game.progress.current_workflow,
-                progress=80 if not failed_resources else game.progress.progress
+                current_workflow="dialogue_tts" if stage_succeeded else game.progress.current_workflow,
+                progress=80 if stage_succeeded else game.progress.progress
             )
 
             # 更新游戏对象
@@ -274,6 +362,7 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                 id=game.id,
                 fields={
                     "dialogue_tts_resources": game.dialogue_tts_resources,
+                    "failed_items": game.failed_items,
                     "progress": generate_progress
                 }
             )
@@ -285,9 +374,12 @@ class DialogueTTSWorkflow(Workflow[DBGame]):
                 )
 
             return WorkflowResult(
-                success=True if not failed_resources else False,
+                success=stage_succeeded,
                 data=game,
-                error="Some dialogue TTS failed to generate" if failed_resources else None
+                error=None if stage_succeeded else "Some dialogue TTS failed to generate",
+                error_details=None if stage_succeeded else {
+                    "failed_items": [failed["item"].model_dump(mode="json") for failed in failed_resources]
+                }
             )
 
         except Exception as e:
@@ -1,21 +1,56 @@
 from models.db_runtime_game import DBRuntimeGame
 from workflows.base_workflow import Workflow, WorkflowResult
-from models.game import DBGame, GameGenerationProgress, GameStatus
+from models.game import DBGame, GameGenerationProgress, GameStatus, ChapterGenerationStatus
 from workflows.story_character_info_workflow import StoryCharacterInfoWorkflow
 from workflows.chapter_workflows import ChapterSplitWorkflow
 from workflows.script_generation_workflow import ScriptGenerationWorkflow
-from workflows.script_background_workflow import ScriptBackgroundWorkflow
-from workflows.script_bgm_workflow import ScriptBGMWorkflow
+from workflows.script_annotation_workflow import ScriptAnnotationWorkflow
+from workflows.script_graph_workflow import ScriptGraphWorkflow
 from workflows.character_image_workflow import CharacterImageWorkflow
 from workflows.scene_image_workflow import SceneImageWorkflow
 from workflows.dialogue_tts_workflow import DialogueTTSWorkflow
 from workflows.background_music_workflow import BackgroundMusicWorkflow
 from repositories.base_repository import BaseRepository
+from utils.speculation import SpeculationRegistry
+from utils.admission import AdmissionController
+from utils.cancellation import CancellationRegistry, GenerationCancelled
+from utils.circuit_breaker import CircuitBreaker, ParkingLot
+from utils.generation_lock import GenerationLocks
+from utils.progress_bus import ProgressBus
+from utils.timeline import GenerationTimeline
+from utils.scheduler import Priority, set_job_context, set_priority
+from config import get_settings
+import asyncio
 import logging
-from typing import Dict, Type
+from datetime import datetime
+from typing import Dict, Optional, Type
 
 logger = logging.getLogger(__name__)
 
+# 已合并的旧工作流名称 -> 恢复时视为已完成的工作流
+LEGACY_WORKFLOW_NAMES = {
+    # 背景已生成但BGM未生成，由 script_annotation 继续补充BGM
+    "script_background": "script_generation",
+    "script_bgm": "script_annotation",
+}
+
+# 逐章执行的工作流：每个章节完成这些工作流后即标记为可游玩并发布
+CHAPTER_STAGES = ("scene_image", "dialogue_tts")
+
+# 下一章预生成时执行的脚本工作流（只依赖章节原文与角色名）
+SPECULATIVE_SCRIPT_STAGES = ("script_generation", "script_annotation", "script_graph")
+
+# 各媒体工作流调用的服务商，服务商熔断导致失败时暂停游戏而不是标记失败
+STAGE_PROVIDERS = {
+    "character_image": ("image",),
+    "scene_image": ("image",),
+    "dialogue_tts": ("tts",),
+    "background_music": ("music",),
+}
+
+# 发布时每次都会覆盖的运行时游戏字段，其余字段（计数、创建时间等）只在首次发布时写入
+RUNTIME_GAME_PUBLISH_FIELDS = {"title", "user_info", "tags", "total_chapters", "chapters"}
+
 class GameGenerationWorkflow:
     """游戏生成主工作流，协调所有子工作流的执行"""
 
@@ -26,20 +61,56 @@ class GameGenerationWorkflow:
             "story_character_info": StoryCharacterInfoWorkflow,
             "chapter_split": ChapterSplitWorkflow,
             "script_generation": ScriptGenerationWorkflow,
-            "script_background": ScriptBackgroundWorkflow,
-            "script_bgm": ScriptBGMWorkflow,
+            "script_annotation": ScriptAnnotationWorkflow,
+            "script_graph": ScriptGraphWorkflow,
             "character_image": CharacterImageWorkflow,
             "scene_image": SceneImageWorkflow,
             "dialogue_tts": DialogueTTSWorkflow,
             "background_music": BackgroundMusicWorkflow,
         }
 
-    async def generate_game(self, game: DBGame):
-        """从上次失败的地方重新开始游戏生成流程"""
+    async def generate_game(self, game: DBGame, lock_token: Optional[str] = None):
+        """
+        从上次失败的地方重新开始游戏生成流程
+
+        Args:
+            game: 游戏
+            lock_token: 接口提交时已获取的生成锁持有者标识；为空时（暂停后恢复等）由流水线自行获取
+        """
+        # 同一游戏只允许一条生成流水线
+        locks = GenerationLocks()
+        if lock_token is None:
+            lock_token = await locks.acquire(game.id)
+        if not locks.owns(game.id, lock_token):
+            logger.warning(f"游戏 {game.id} 已有生成流水线在运行或生成锁已失效，跳过本次生成")
+            return
+
+        speculate = False
+        # 暂停时生成锁交给恢复后的流水线，不在此释放
+        parked = False
+        cancellation = CancellationRegistry()
+        cancellation.register(
+            game.id,
+            list(self._workflow_types.keys()),
+            deadline_seconds=game.settings.get("deadline_seconds")
+        )
         try:
+            # 服务商调用按用户公平排队；还没有可玩章节时按首章优先级调度
+            set_job_context(game.user_id, game.id, self._foreground_priority(game))
+            ProgressBus().track(game.id, game.user_id)
+
+            # 排队或暂停的游戏开始（继续）生成
+            if game.status in (GameStatus.QUEUED, GameStatus.PARKED):
+                game.status = GameStatus.GENERATING
+                game.error = None
+                await self.game_repository.update(
+                    id=game.id,
+                    fields={"status": GameStatus.GENERATING, "error": None}
+                )
 
             # 获取当前工作流索引
             current_workflow = game.progress.current_workflow
+            current_workflow = LEGACY_WORKFLOW_NAMES.get(current_workflow, current_workflow)
             try:
                 workflow_index = list(self._workflow_types.keys()).index(current_workflow)
             except ValueError:
@@ -50,17 +121,36 @@ class GameGenerationWorkflow:
             # 从当前工作流开始执行
             workflow_names = list(self._workflow_types.keys())
             for i, workflow_name in enumerate(workflow_names):
-                if i <= workflow_index:
-                    logger.info(f"跳过已完成的工作流: {workflow_name}")
-                    continue
+                # 同时读取其他进程（删除、管理员取消）记录在生成锁上的取消请求
+                await cancellation.refresh(game.id, workflow_name)
+                if workflow_name in CHAPTER_STAGES:
+                    # 逐章工作流按章节的可游玩状态续跑，不依赖进度中的工作流名称
+                    if workflow_name != CHAPTER_STAGES[0]:
+                        continue
+                    result = await self._generate_chapters(game)
+                else:
+                    if i <= workflow_index:
+                        logger.info(f"跳过已完成的工作流: {workflow_name}")
+                        continue
 
-                workflow_type = self._workflow_types[workflow_name]
-                workflow = workflow_type(self.game_repository)
-                logger.info(f"开始执行工作流: {workflow_name}")
-                result = await workflow.execute(game)
-                logger.info(f"工作流 {workflow_name} 执行完成")
+                    if workflow_name == "background_music":
+                        # 章节已可游玩，背景音乐只是补充
+                        set_priority(Priority.BACKFILL)
+                    workflow_type = self._workflow_types[workflow_name]
+                    workflow = workflow_type(self.game_repository)
+                    logger.info(f"开始执行工作流: {workflow_name}")
+                    with GenerationTimeline().span("workflow", workflow_name) as span:
+                        result = await workflow.execute(game)
+                        span.succeeded = result.success
+                    logger.info(f"工作流 {workflow_name} 执行完成")
 
                 if not result.success:
+                    provider = self._tripped_provider(workflow_name)
+                    if provider:
+                        await self._park(game, provider, lock_token)
+                        parked = True
+                        return
+
                     # 更新失败状态和错误信息
                     await self.game_repository.update(
                         id=game.id,
@@ -74,23 +164,36 @@ class GameGenerationWorkflow:
 
                 game = result.data
 
-            # 最后更新所有章节数据并创建运行时游戏
-            runtime_game = DBRuntimeGame.convert_to_runtime_game(game)
-
-            # 将运行时游戏保存到数据库
-            runtime_game = await self.runtime_game_repository.create(
-                runtime_game
-            )
+            # 最后带上背景音乐重新发布运行时游戏
+            cancellation.check(game.id)
+            if not await self._publish(game):
+                raise RuntimeError("Failed to publish runtime game")
 
             # 更新原始游戏状态
             await self.game_repository.update(
                 id=game.id,
                 fields={
-                    "runtime_id": runtime_game.id,
+                    "runtime_id": game.id,
                     "status": GameStatus.COMPLETED,
                 }
             )
             logger.info("游戏重新生成完成")
+            speculate = self._should_speculate(game)
+        except (GenerationCancelled, asyncio.CancelledError):
+            reason = cancellation.reason(game.id)
+            if reason is None:
+                # 不是通过取消登记表取消的（如服务关闭），继续向上传递
+                raise
+            logger.info(f"游戏 {game.id} 的生成已取消: {reason}")
+            # 已删除的游戏无需更新状态；其他原因标记为失败，可重新生成
+            if reason != "deleted":
+                await self.game_repository.update(
+                    id=game.id,
+                    fields={
+                        "status": GameStatus.FAILED,
+                        "error": f"生成已取消: {reason}"
+                    }
+                )
         except Exception as e:
             logger.error(f"游戏重新生成失败: {str(e)}")
             await self.game_repository.update(
@@ -100,3 +203,215 @@ class GameGenerationWorkflow:
                     "error": str(e)
                 }
             )
+        finally:
+            cancellation.unregister(game.id)
+            if not parked:
+                await locks.release(game.id, lock_token)
+            await GenerationTimeline().flush(game.id)
+
+        # 空闲时预生成下一章（释放生成锁之后，预生成需要自行获取），用户确认后只需扣除次数并发布
+        if speculate:
+            SpeculationRegistry().start(
+                game.user_id,
+                game.id,
+                lambda: self.speculate_next_chapter(game)
+            )
+
+    @staticmethod
+    def _tripped_provider(workflow_name: str) -> Optional[str]:
+        """工作流所用服务商中处于熔断状态的一个，没有时返回None"""
+        stages = CHAPTER_STAGES if workflow_name in CHAPTER_STAGES else (workflow_name,)
+        for stage in stages:
+            for provider in STAGE_PROVIDERS.get(stage, ()):
+                if not CircuitBreaker(provider).is_closed:
+                    return provider
+        return None
+
+    async def _park(self, game: DBGame, provider: str, lock_token: str) -> None:
+        """
+        服务商熔断时暂停游戏，服务商恢复后从数据库重新读取并继续生成
+
+        暂停期间本进程继续持有并续期生成锁，其他进程（GenerationRecovery）不会重复生成；
+        进程退出后锁过期，游戏由获取到锁的进程重新提交。
+        """
+        await self.game_repository.update(
+            id=game.id,
+            fields={
+                "status": GameStatus.PARKED,
+                "error": f"服务商 {provider} 暂时不可用，恢复后自动继续生成",
+                "updated_at": datetime.now()
+            }
+        )
+
+        async def resume() -> None:
+            latest = await self.game_repository.get(game.id)
+            if latest and latest.status == GameStatus.PARKED and not latest.is_deleted:
+                await self.generate_game(latest, lock_token=lock_token)
+            else:
+                await GenerationLocks().release(game.id, lock_token)
+
+        ParkingLot().park(game.id, provider, resume)
+
+    async def _generate_chapters(self, game: DBGame) -> WorkflowResult[DBGame]:
+        """
+        按章节顺序逐章生成场景图与语音，每完成一章即标记为可游玩并发布，
+        玩家无需等待后续章节即可开始游玩
+        """
+        pending_chapters = sorted(
+            (
+                chapter for chapter in game.chapters
+                if chapter.index < game.generate_chapter_index
+                and chapter.generation_status == ChapterGenerationStatus.BGM_GENERATED
+                and not chapter.is_playable
+            ),
+            key=lambda chapter: chapter.index
+        )
+
+        for chapter in pending_chapters:
+            set_priority(self._foreground_priority(game))
+            for workflow_name in CHAPTER_STAGES:
+                CancellationRegistry().check(game.id, workflow_name)
+                workflow = self._workflow_types[workflow_name](
+                    self.game_repository,
+                    chapter_indexes={chapter.index}
+                )
+                logger.info(f"开始执行工作流: {workflow_name}, 章节 {chapter.index}")
+                with GenerationTimeline().span("chapter", workflow_name, chapter_index=chapter.index) as span:
+                    result = await workflow.execute(game)
+                    span.succeeded = result.success
+                if not result.success:
+                    return result
+                game = result.data
+
+            # 章节已可游玩，立即发布
+            CancellationRegistry().check(game.id)
+            for game_chapter in game.chapters:
+                if game_chapter.index == chapter.index:
+                    game_chapter.is_playable = True
+            await self.game_repository.update(
+                id=game.id,
+                fields={"chapters": game.chapters}
+            )
+            if await self._publish(game):
+                logger.info(f"章节 {chapter.index} 已发布为可游玩")
+                AdmissionController().record_first_playable(game.id)
+
+        return WorkflowResult(
+            success=True,
+            data=game
+        )
+
+    async def _publish(self, game: DBGame) -> bool:
+        """
+        将游戏转换为运行时游戏并写入数据库（存在时更新，不存在时创建）
+
+        Returns:
+            bool: 是否发布成功
+        """
+        # 合并按需合成模式下游玩时写入的语音资源
+        latest = await self.game_repository.get(game.id)
+        if latest:
+            game.dialogue_tts_resources = latest.dialogue_tts_resources
+
+        runtime_game = DBRuntimeGame.convert_to_runtime_game(game)
+        fields = {
+            name: getattr(runtime_game, name)
+            for name in RUNTIME_GAME_PUBLISH_FIELDS
+        }
+        fields["updated_at"] = datetime.now()
+        insert_fields = runtime_game.model_dump(
+            by_alias=True,
+            exclude=RUNTIME_GAME_PUBLISH_FIELDS | {"id", "updated_at"}
+        )
+        if not await self.runtime_game_repository.upsert(game.id, fields, insert_fields):
+            return False
+
+        if game.runtime_id != game.id:
+            game.runtime_id = game.id
+            await self.game_repository.update(
+                id=game.id,
+                fields={"runtime_id": game.id}
+            )
+        return True
+
+    async def publish_clone(self, game: DBGame) -> bool:
+        """发布复用生成结果的游戏（中间产物已齐全），成功后直接标记为已完成"""
+        if not await self._publish(game):
+            return False
+        game.status = GameStatus.COMPLETED
+        await self.game_repository.update(
+            id=game.id,
+            fields={"status": GameStatus.COMPLETED}
+        )
+        return True
+
+    @staticmethod
+    def _foreground_priority(game: DBGame) -> Priority:
+        """前台生成的优先级：玩家尚无可玩章节时为首章，否则为后续章节"""
+        if any(chapter.is_playable for chapter in game.chapters):
+            return Priority.NEXT_CHAPTER
+        return Priority.FIRST_CHAPTER
+
+    @staticmethod
+    def _should_speculate(game: DBGame) -> bool:
+        """是否为游戏预生成下一章，游戏设置 speculative 优先于全局配置"""
+        enabled = game.settings.get("speculative", get_settings().SPECULATIVE_NEXT_CHAPTER)
+        return bool(enabled) and game.generate_chapter_index < len(game.chapters)
+
+    async def speculate_next_chapter(self, game: DBGame) -> None:
+        """
+        在后台预生成下一章的脚本（可选包括场景图与语音）
+
+        预生成的章节不会标记为可游玩，也不会发布；用户确认生成下一章时，
+        已完成的部分会被各工作流按状态跳过。预生成持有游戏的可抢占生成锁，
+        确认生成下一章的请求（任一 worker）通过锁抢占，预生成停止并释放锁后才开始真正的生成。
+        """
+        locks = GenerationLocks()
+        lock_token = await locks.acquire(
+            game.id,
+            preemptible=True,
+            on_lost=lambda: SpeculationRegistry().cancel(game.id)
+        )
+        if lock_token is None:
+            logger.info(f"游戏 {game.id} 的生成锁已被持有，跳过预生成")
+            return
+
+        next_index = game.generate_chapter_index
+        speculative_game = game.model_copy(deep=True)
+        speculative_game.generate_chapter_index = next_index + 1
+        original_progress = game.progress
+        stages = list(SPECULATIVE_SCRIPT_STAGES)
+        if get_settings().SPECULATIVE_INCLUDE_MEDIA:
+            stages.extend(CHAPTER_STAGES)
+        set_job_context(game.user_id, game.id, Priority.SPECULATIVE)
+        try:
+            logger.info(f"开始预生成游戏 {game.id} 第 {next_index} 章")
+            for workflow_name in stages:
+                if not locks.owns(game.id, lock_token):
+                    logger.info(f"游戏 {game.id} 的预生成锁已失效，停止预生成")
+                    return
+                workflow_type = self._workflow_types[workflow_name]
+                if workflow_name in CHAPTER_STAGES:
+                    workflow = workflow_type(self.game_repository, chapter_indexes={next_index})
+                else:
+                    workflow = workflow_type(self.game_repository)
+                with GenerationTimeline().span("speculative", workflow_name, chapter_index=next_index) as span:
+                    result = await workflow.execute(speculative_game)
+                    span.succeeded = result.success
+                if not result.success:
+                    logger.warning(f"预生成游戏 {game.id} 第 {next_index} 章失败于 {workflow_name}: {result.error}")
+                    return
+                speculative_game = result.data
+            logger.info(f"游戏 {game.id} 第 {next_index} 章预生成完成")
+        finally:
+            # 预生成不改变游戏对外显示的进度；游戏已开始真正的生成时进度属于该流水线，不再恢复
+            await self.game_repository.update_if(
+                id=game.id,
+                conditions={
+                    "status": GameStatus.COMPLETED,
+                    "progress.current_workflow": {"$in": stages},
+                },
+                fields={"progress": original_progress}
+            )
+            await locks.release(game.id, lock_token)
+            await GenerationTimeline().flush(game.id)
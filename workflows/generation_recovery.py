@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import Optional
+
+from config import get_settings
+from models.db_runtime_game import DBRuntimeGame
+from models.game import DBGame
+from repositories.base_repository import BaseRepository
+from repositories.game_repository import GameRepository
+from utils.admission import AdmissionController
+from utils.generation_lock import GenerationLocks
+from workflows.game_generation import GameGenerationWorkflow
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRecovery:
+    """
+    重新提交无人处理的排队与暂停游戏
+
+    等待队列与暂停列表只保存在进程内，进程重启后其中的游戏会一直停留在排队或暂停状态。
+    启动时以及之后每 ADMISSION_RECOVERY_INTERVAL_SECONDS 秒检查一次排队与暂停中的游戏：
+    排队与暂停期间所在进程持有并续期生成锁，能获取到锁说明所在进程已退出、无人处理。
+    获取到锁的游戏经 AdmissionController 重新提交，流水线沿用该锁。
+    """
+
+    def __init__(self, game_repository: GameRepository, runtime_game_repository: BaseRepository[DBRuntimeGame]):
+        self.game_repository = game_repository
+        self.runtime_game_repository = runtime_game_repository
+        self._task: Optional[asyncio.Task] = None
+        self._recovered = 0
+
+    def start(self) -> None:
+        """启动定期检查"""
+        if get_settings().ADMISSION_RECOVERY_INTERVAL_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"恢复排队与暂停的游戏失败: {str(e)}")
+            await asyncio.sleep(get_settings().ADMISSION_RECOVERY_INTERVAL_SECONDS)
+
+    async def recover(self) -> int:
+        """
+        检查一次并重新提交无人处理的游戏
+
+        Returns:
+            int: 重新提交的游戏数量
+        """
+        recovered = 0
+        for game in await self.game_repository.find_waiting():
+            lock_token = await GenerationLocks().acquire(game.id)
+            if lock_token is None:
+                continue
+            self._submit(game, lock_token)
+            recovered += 1
+        if recovered:
+            self._recovered += recovered
+            logger.info(f"重新提交了 {recovered} 个无人处理的排队或暂停游戏")
+        return recovered
+
+    def _submit(self, game: DBGame, lock_token: str) -> None:
+        workflow = GameGenerationWorkflow(self.game_repository, self.runtime_game_repository)
+        AdmissionController().submit(game.id, lambda: workflow.generate_game(game, lock_token=lock_token))
@@ -2,19 +2,28 @@ from schemas.script_commands import BackgroundCommand, CommandType
 from workflows.base_workflow import Workflow, WorkflowResult
 from models.game import DBGame, GameChapter, GameGenerationProgress, ChapterGenerationStatus, SceneImageResource
 from utils.image_tool import ImageText2ImageTool
+from utils.image_cache import ImageCache
+from utils.retry import RetryableError, failed_item, merge_failed_items, retry_async, within_failure_tolerance
 from repositories.base_repository import BaseRepository
 import logging
 import json
 import re
 import asyncio
+from typing import Optional, Set
 
 logger = logging.getLogger(__name__)
 
+# 场景图尺寸，宽高比 16:9
+SCENE_IMAGE_WIDTH = 1024
+SCENE_IMAGE_HEIGHT = 576
+
 class SceneImageWorkflow(Workflow[DBGame]):
     """场景图片生成工作流，处理游戏场景的图片生成"""
 
-    def __init__(self, game_repository: BaseRepository[DBGame]):
+    def __init__(self, game_repository: BaseRepository[DBGame], chapter_indexes: Optional[Set[int]] = None):
         self.game_repository = game_repository
+        # 指定时只处理这些章节，用于逐章生成并发布
+        self.chapter_indexes = chapter_indexes
 
     async def execute(self, game: DBGame) -> WorkflowResult[DBGame]:
         """
@@ -38,6 +47,7 @@ class SceneImageWorkflow(Workflow[DBGame]):
                 chapter for chapter in game.chapters
                 if chapter.generation_status == ChapterGenerationStatus.BGM_GENERATED
                 and chapter.index < game.generate_chapter_index
+                and (self.chapter_indexes is None or chapter.index in self.chapter_indexes)
             ]
 
             if not chapters_to_generate:
@@ -48,40 +58,66 @@ class SceneImageWorkflow(Workflow[DBGame]):
 
             # 获取 ImageTool 实例
             image_tool = await ImageText2ImageTool.get_instance()
+            image_cache = ImageCache()
+
+            async def text2img(prompt: str) -> str:
+                result = await image_tool.async_text2img(
+                    prompt=prompt,
+                    width=SCENE_IMAGE_WIDTH,
+                    height=SCENE_IMAGE_HEIGHT,
+                    upload_to_oss=True,
+                    oss_type="scene"
+                )
+                if not result.get("oss_url"):
+                    raise RetryableError("No image URL returned")
+                return result["oss_url"]
 
             async def generate_scene_image(chapter: GameChapter, background_command: BackgroundCommand):
                 try:
-                    # 使用背景命令的 prompt 直接生成图片 宽高比 16:9
-                    result = await image_tool.async_text2img(
+                    # 优先复用提示词与尺寸相同的已生成图片
+                    image_url = await image_cache.lookup(
+                        kind="scene",
                         prompt=background_command.prompt,
-                        width=1024,
-                        height=576,
-                        upload_to_oss=True,
-                        oss_type="scene"
+                        width=SCENE_IMAGE_WIDTH,
+                        height=SCENE_IMAGE_HEIGHT,
+                        game_id=game.id
                     )
-                    
-                    if result.get("oss_url"):
-                        return {
-                            "data": SceneImageResource(
-                                chapter_index=chapter.index,
-                                scene_name=background_command.name,
-                                image_url=result["oss_url"],
-                            ),
-                            "success": True
-                        }
+
+                    if not image_url:
+                        # 使用背景命令的 prompt 直接生成图片，暂时性错误按退避重试
+                        image_url = await retry_async(
+                            lambda: text2img(background_command.prompt),
+                            name="scene_image"
+                        )
+                        await image_cache.store(
+                            kind="scene",
+                            prompt=background_command.prompt,
+                            width=SCENE_IMAGE_WIDTH,
+                            height=SCENE_IMAGE_HEIGHT,
+                            url=image_url,
+                            game_id=game.id
+                        )
+
                     return {
-                        "success": False,
-                        "error": "No image URL returned"
+                        "data": SceneImageResource(
+                            chapter_index=chapter.index,
+                            scene_name=background_command.name,
+                            image_url=image_url,
+                        ),
+                        "success": True
                     }
                 except Exception as e:
                     logger.error(f"Failed to generate scene image for chapter {chapter.index}: {str(e)}")
                     return {
                         "success": False,
-                        "error": str(e)
+                        "chapter_index": chapter.index,
+                        "error": str(e),
+                        "item": failed_item("scene_image", chapter.index, background_command.name, e)
                     }
 
-            # 并发生成所有场景图
+            # 并发生成所有场景图，同一章节多个分支中重复的场景只生成一次
             tasks = []
+            queued = set()
             for chapter in chapters_to_generate:
                 if not chapter.branches:
                     continue
@@ -95,9 +131,10 @@ class SceneImageWorkflow(Workflow[DBGame]):
                                 resource.chapter_index == chapter.index and
                                 resource.scene_name == background_command.name
                                 for resource in game.scene_image_resources
-                            ):
+                            ) or (chapter.index, background_command.name) in queued:
                                 continue
-                                
+
+                            queued.add((chapter.index, background_command.name))
                             tasks.append(generate_scene_image(chapter, background_command))
 
             successful_resources = []
@@ -119,12 +156,21 @@ class SceneImageWorkflow(Workflow[DBGame]):
                 if failed_resources:
                     logger.warning(f"Failed to generate {len(failed_resources)} scene images")
                     for failed in failed_resources:
-                        logger.warning(f"Chapter {failed.get('chapter_index', 'Unknown chapter')}: {failed.get('error', 'Unknown error')}")
+                        logger.warning(f"Chapter {failed['chapter_index']}: {failed.get('error', 'Unknown error')}")
+
+            # 重试后仍失败的条目记入死信列表，重新生成时只重新提交这些条目
+            game.failed_items = merge_failed_items(
+                game.failed_items,
+                "scene_image",
+                queued,
+                [failed["item"] for failed in failed_resources]
+            )
+            stage_succeeded = within_failure_tolerance(len(failed_resources), len(tasks))
 
             # 更新进度
             generate_progress = GameGenerationProgress(
-                current_workflow="scene_image" if not failed_resources else game.progress.current_workflow,
-                progress=70 if not failed_resources else game.progress.progress
+                current_workflow="scene_image" if stage_succeeded else game.progress.current_workflow,
+                progress=70 if stage_succeeded else game.progress.progress
             )
 
             # 更新游戏对象
@@ -135,6 +181,7 @@ class SceneImageWorkflow(Workflow[DBGame]):
                 id=game.id,
                 fields={
                     "scene_image_resources": game.scene_image_resources,
+                    "failed_items": game.failed_items,
                     "progress": generate_progress
                 }
             )
@@ -146,9 +193,12 @@ class SceneImageWorkflow(Workflow[DBGame]):
                 )
 
             return WorkflowResult(
-                success=True if not failed_resources else False,
+                success=stage_succeeded,
                 data=game,
-                error="Some scene images failed to generate" if failed_resources else None
+                error=None if stage_succeeded else "Some scene images failed to generate",
+                error_details=None if stage_succeeded else {
+                    "failed_items": [failed["item"].model_dump(mode="json") for failed in failed_resources]
+                }
             )
 
         except Exception as e:
@@ -0,0 +1,276 @@
+from workflows.base_workflow import Workflow, WorkflowResult
+from models.game import DBGame, GameGenerationProgress, GameChapter, ChapterGenerationStatus
+from utils.llm_tool import LLMTool
+from repositories.base_repository import BaseRepository
+from utils.script_coder import parse_script, ScriptValidationError, serialize_script, serialize_script_numbered
+from schemas.script_commands import BackgroundCommand, BGMCommand, Branch, Command, CommandType
+from config import get_settings
+from typing import Dict, List, Set, Tuple
+from dataclasses import dataclass
+import logging
+import json
+import re
+import asyncio
+
+logger = logging.getLogger(__name__)
+
+# 整段重写模式下各标注类型对应的提示词及完成后的章节状态，按执行顺序排列
+REWRITE_STAGES = [
+    (CommandType.BG, "novel_script_background_system", "novel_script_background_user", ChapterGenerationStatus.BACKGROUND_GENERATED),
+    (CommandType.BGM, "novel_script_bgm_system", "novel_script_bgm_user", ChapterGenerationStatus.BGM_GENERATED),
+]
+
+
+class AnnotationParseError(ScriptValidationError):
+    """标注结果解析错误"""
+    pass
+
+
+@dataclass
+class Insertion:
+    """单个bg/bgm插入点"""
+    branch: str
+    index: int
+    type: CommandType
+    name: str
+    prompt: str
+
+
+def parse_insertions(completion: str, branches: List[Branch], kinds: Set[CommandType]) -> List[Insertion]:
+    """解析大模型返回的插入点列表
+
+    Args:
+        completion: 大模型返回内容
+        branches: 章节当前的分支列表
+        kinds: 本次允许的标注类型
+
+    Returns:
+        合法的插入点列表，非法条目会被丢弃
+
+    Raises:
+        AnnotationParseError: 返回内容无法解析为插入点列表
+    """
+    json_match = re.search(r'```json\s*(.*?)\s*```', completion, re.DOTALL)
+    json_str = json_match.group(1) if json_match else completion
+    try:
+        data = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        raise AnnotationParseError(f"标注结果不是合法的JSON: {str(e)}") from e
+
+    raw_insertions = data.get("insertions") if isinstance(data, dict) else data
+    if not isinstance(raw_insertions, list):
+        raise AnnotationParseError("标注结果缺少insertions列表")
+
+    branch_sizes = {branch.name: len(branch.commands) for branch in branches}
+    insertions = []
+    for item in raw_insertions:
+        try:
+            insertion = Insertion(
+                branch=str(item["branch"]).strip(),
+                index=int(item["index"]),
+                type=CommandType(str(item["type"]).strip()),
+                name=str(item["name"]).strip(),
+                prompt=str(item["prompt"]).strip(),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"忽略非法的标注条目 {item}: {str(e)}")
+            continue
+
+        if (
+            insertion.type not in kinds
+            or insertion.branch not in branch_sizes
+            or not 0 <= insertion.index <= branch_sizes[insertion.branch]
+            or not insertion.name
+            or not insertion.prompt
+        ):
+            logger.warning(f"忽略无效的标注条目 {item}")
+            continue
+        insertions.append(insertion)
+
+    # 模型声称有插入点但全部无效时视为解析失败，交由整段重写兜底
+    if raw_insertions and not insertions:
+        raise AnnotationParseError("标注结果中没有有效的插入点")
+    return insertions
+
+
+def merge_insertions(branches: List[Branch], insertions: List[Insertion]) -> List[Branch]:
+    """将插入点合并到分支指令中，同一位置按bg、bgm的顺序插入
+
+    Args:
+        branches: 原分支列表
+        insertions: 插入点列表
+
+    Returns:
+        合并后的新分支列表
+    """
+    order = {CommandType.BG: 0, CommandType.BGM: 1}
+    by_position: Dict[Tuple[str, int], List[Insertion]] = {}
+    for insertion in sorted(insertions, key=lambda item: order[item.type]):
+        by_position.setdefault((insertion.branch, insertion.index), []).append(insertion)
+
+    merged = []
+    for branch in branches:
+        commands: List[Command] = []
+        for index in range(len(branch.commands) + 1):
+            for insertion in by_position.get((branch.name, index), []):
+                if insertion.type == CommandType.BG:
+                    commands.append(BackgroundCommand(name=insertion.name, prompt=insertion.prompt))
+                else:
+                    commands.append(BGMCommand(name=insertion.name, prompt=insertion.prompt))
+            if index < len(branch.commands):
+                commands.append(branch.commands[index])
+        merged.append(Branch(name=branch.name, commands=commands))
+    return merged
+
+
+class ScriptAnnotationWorkflow(Workflow[DBGame]):
+    """脚本标注工作流，一次大模型调用同时为章节标注背景图与背景音乐插入点"""
+
+    def __init__(self, game_repository: BaseRepository[DBGame]):
+        self.game_repository = game_repository
+
+    @staticmethod
+    def _pending_kinds(chapter: GameChapter) -> Set[CommandType]:
+        """根据章节状态获取尚需标注的类型"""
+        if chapter.generation_status == ChapterGenerationStatus.SCRIPT_GENERATED:
+            return {CommandType.BG, CommandType.BGM}
+        if chapter.generation_status == ChapterGenerationStatus.BACKGROUND_GENERATED:
+            return {CommandType.BGM}
+        return set()
+
+    async def _annotate_chapter(self, llm_tool: LLMTool, chapter: GameChapter, kinds: Set[CommandType]) -> None:
+        """增量标注模式：模型只返回插入点，在本地合并进分支"""
+        completion = await llm_tool.generate(
+            system_prompt="novel_script_annotation_system",
+            user_prompt="novel_script_annotation_user",
+            prompt_replacements={
+                "script": serialize_script_numbered(chapter.branches)
+            },
+            static_replacements={
+                "annotation_types": ", ".join(sorted(kind.value for kind in kinds))
+            }
+        )
+        insertions = parse_insertions(completion, chapter.branches, kinds)
+        chapter.branches = merge_insertions(chapter.branches, insertions)
+        chapter.generation_status = ChapterGenerationStatus.BGM_GENERATED
+
+    async def _rewrite_chapter(self, llm_tool: LLMTool, chapter: GameChapter, kinds: Set[CommandType]) -> None:
+        """整段重写模式：模型返回插入了bg/bgm的完整脚本，重新解析"""
+        for kind, system_prompt, user_prompt, status in REWRITE_STAGES:
+            if kind not in kinds:
+                continue
+            completion = await llm_tool.generate(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                prompt_replacements={
+                    "script": serialize_script(chapter.branches)
+                }
+            )
+            chapter.branches = parse_script(completion)
+            chapter.generation_status = status
+
+    async def execute(self, game: DBGame) -> WorkflowResult[DBGame]:
+        """
+        为游戏脚本标注场景背景与背景音乐并更新数据库
+
+        Args:
+            game: 游戏数据对象
+
+        Returns:
+            WorkflowResult[DBGame]: 工作流执行结果，包含更新后的game对象或错误信息
+        """
+        try:
+            if not game.chapters:
+                return WorkflowResult(
+                    success=False,
+                    error="No chapters found in game"
+                )
+
+            llm_tool = LLMTool()
+            rewrite_mode = get_settings().SCRIPT_ANNOTATION_MODE == "rewrite"
+
+            # 过滤出需要标注的章节
+            chapters_to_generate = [
+                chapter for chapter in game.chapters
+                if chapter.index < game.generate_chapter_index
+                and self._pending_kinds(chapter)
+            ]
+
+            if not chapters_to_generate:
+                return WorkflowResult(
+                    success=True,
+                    data=game
+                )
+
+            async def annotate_chapter(chapter: GameChapter) -> tuple[GameChapter, bool]:
+                kinds = self._pending_kinds(chapter)
+                try:
+                    if not rewrite_mode:
+                        try:
+                            await self._annotate_chapter(llm_tool, chapter, kinds)
+                            return chapter, True
+                        except ScriptValidationError as e:
+                            logger.warning(f"Annotation failed for chapter {chapter.index}, falling back to rewrite: {str(e)}")
+                    await self._rewrite_chapter(llm_tool, chapter, kinds)
+                    return chapter, True
+                except ScriptValidationError as e:
+                    logger.error(f"Failed to parse annotation for chapter {chapter.index}: {str(e)}")
+                    return chapter, False
+                except Exception as e:
+                    logger.error(f"Annotation failed for chapter {chapter.index}: {str(e)}")
+                    return chapter, False
+
+            # 并发执行所有章节的标注
+            results = await asyncio.gather(
+                *[annotate_chapter(chapter) for chapter in chapters_to_generate]
+            )
+
+            # 处理结果
+            is_success = True
+            chapter_map = {chapter.index: chapter for chapter in game.chapters}  # 保存所有章节的映射
+
+            for chapter, success in results:
+                if not success:
+                    is_success = False
+                chapter_map[chapter.index] = chapter  # 更新或添加生成的章节
+
+            # 重建章节列表，保持原有顺序
+            updated_chapters = [chapter_map[i] for i in range(0, len(chapter_map))]
+
+            # 更新进度
+            generate_progress = GameGenerationProgress(
+                current_workflow="script_annotation",
+                progress=50
+            ) if is_success else game.progress
+
+            # 更新游戏对象
+            game.chapters = updated_chapters
+            game.progress = generate_progress
+
+            # 使用数据仓库更新数据库
+            update_success = await self.game_repository.update(
+                id=game.id,
+                fields={
+                    "chapters": game.chapters,
+                    "progress": game.progress
+                }
+            )
+
+            if not update_success:
+                return WorkflowResult(
+                    success=False,
+                    error="Failed to update game data"
+                )
+
+            return WorkflowResult(
+                success=is_success,
+                data=game,
+                error="Some chapters failed to annotate background and BGM" if not is_success else None
+            )
+
+        except Exception as e:
+            logger.error(f"Script annotation failed: {str(e)}")
+            return WorkflowResult(
+                success=False,
+                error=f"Script annotation failed: {str(e)}"
+            )
@@ -76,7 +76,9 @@ class ScriptGenerationWorkflow(Workflow[DBGame]):
                         system_prompt="novel_chapter_script_system",
                         user_prompt="novel_chapter_script_user",
                         prompt_replacements={
-                            "content": chapter.content,
+                            "content": chapter.content
+                        },
+                        static_replacements={
                             "role_names": role_names
                         }
                     )
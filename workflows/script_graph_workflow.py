@@ -0,0 +1,101 @@
+from workflows.base_workflow import Workflow, WorkflowResult
+from models.game import DBGame, GameGenerationProgress, ChapterGenerationStatus, ScriptGraphReport
+from repositories.base_repository import BaseRepository
+from utils.script_graph import analyze_and_repair
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ScriptGraphWorkflow(Workflow[DBGame]):
+    """分支图检查工作流，在生成媒体前裁剪不可达分支并修复悬空跳转"""
+
+    def __init__(self, game_repository: BaseRepository[DBGame]):
+        self.game_repository = game_repository
+
+    async def execute(self, game: DBGame) -> WorkflowResult[DBGame]:
+        """
+        分析章节分支图，裁剪从 main 不可达的分支，避免为无人能到达的内容生成媒体
+
+        Args:
+            game: 游戏数据对象
+
+        Returns:
+            WorkflowResult[DBGame]: 工作流执行结果，包含更新后的game对象或错误信息
+        """
+        try:
+            if not game.chapters:
+                return WorkflowResult(
+                    success=False,
+                    error="No chapters found in game"
+                )
+
+            # 过滤出已完成脚本标注但尚未检查的章节
+            chapters_to_check = [
+                chapter for chapter in game.chapters
+                if chapter.index < game.generate_chapter_index
+                and chapter.generation_status == ChapterGenerationStatus.BGM_GENERATED
+                and chapter.graph_report is None
+            ]
+
+            if not chapters_to_check:
+                return WorkflowResult(
+                    success=True,
+                    data=game
+                )
+
+            for chapter in chapters_to_check:
+                result = analyze_and_repair(chapter.branches)
+                chapter.branches = result.branches
+                chapter.graph_report = ScriptGraphReport(
+                    unreachable_branches=result.unreachable_branches,
+                    dangling_targets=result.dangling_targets,
+                    cycles=result.cycles,
+                    trapped_branches=result.trapped_branches,
+                    skipped_scene_images=result.skipped_scene_images,
+                    skipped_dialogue_lines=result.skipped_dialogue_lines,
+                    skipped_bgm=result.skipped_bgm,
+                )
+                if result.unreachable_branches or result.dangling_targets:
+                    logger.info(
+                        f"章节 {chapter.index} 分支图修复: 裁剪分支 {result.unreachable_branches}, "
+                        f"修复跳转 {result.dangling_targets}, 跳过场景图 {result.skipped_scene_images} 张, "
+                        f"语音 {result.skipped_dialogue_lines} 条, BGM {result.skipped_bgm} 首"
+                    )
+                if result.cycles or result.trapped_branches:
+                    logger.warning(
+                        f"章节 {chapter.index} 存在分支环 {result.cycles}, 无法到达end的分支 {result.trapped_branches}"
+                    )
+
+            # 更新进度
+            generate_progress = GameGenerationProgress(
+                current_workflow="script_graph",
+                progress=55
+            )
+            game.progress = generate_progress
+
+            # 使用数据仓库更新数据库
+            update_success = await self.game_repository.update(
+                id=game.id,
+                fields={
+                    "chapters": game.chapters,
+                    "progress": game.progress
+                }
+            )
+
+            if not update_success:
+                return WorkflowResult(
+                    success=False,
+                    error="Failed to update game data"
+                )
+
+            return WorkflowResult(
+                success=True,
+                data=game
+            )
+
+        except Exception as e:
+            logger.error(f"Script graph check failed: {str(e)}")
+            return WorkflowResult(
+                success=False,
+                error=f"Script graph check failed: {str(e)}"
+            )
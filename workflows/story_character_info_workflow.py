@@ -32,7 +32,8 @@ class StoryCharacterInfoWorkflow(Workflow[DBGame]):
             completion = await llm_tool.generate(
                 system_prompt="story_character_analysis_system",
                 user_prompt="story_character_analysis_user",
-                prompt_replacements={"content": game.novel_text, "voice_library": format_voice_styles(speaker_voice_style)}
+                prompt_replacements={"content": game.novel_text},
+                static_replacements={"voice_library": format_voice_styles(speaker_voice_style)}
             )
 
             # 解析角色信息